@@ -1,45 +1,73 @@
-from datetime import datetime
-import pandas as pd
-import meteostat as ms
+#!/usr/bin/env python3
+"""
+Refresca e imprime el índice de cobertura de las estaciones (ver
+other_utils/station_coverage.py).
 
-# STATIONS = ["07156", "07147", "07149", "07150", "07157"]
-STATIONS = ["08222", "08221", "LEMM0", "08223"]
+Solo descarga los meses cerrados que el índice todavía no tiene (y que tampoco
+estén en la caché de Meteostat), así que repetirlo es barato.
 
-def df_from_ts(ts):
-    # ts es TimeSeries en tu build
-    df = ts.fetch(fill=True)  # fill=True suele ayudar mucho
-    if df is None:
-        return pd.DataFrame()
-    return df
+  python check_station_coverage.py --start 1985-01-01 --end 2024-12-31
+  python check_station_coverage.py --city MADRID --stations 08222 08223
+"""
+import argparse
+from datetime import date, datetime, time
 
-def check_one(station_id: str, start: datetime, end: datetime) -> tuple[int, int, int]:
-    ts = ms.hourly(station_id, start, end)
-    df = df_from_ts(ts)
+import requests
 
-    if df.empty:
-        return 0, 0, 0
+from other_utils.humidity_meteostat import (
+    CITY_STATIONS, EVENING_HOURS, MeteostatDataError, fetch_hourly, months_between, year_ranges,
+)
+from other_utils.station_coverage import get_coverage
+
+
+def refresh_station(cov, station_id: str, start: date, end: date) -> int:
+    """Anota los meses que faltan de la estación; devuelve cuántos había pendientes."""
+    pending = [ym for ym in months_between(start, end) if not cov.known(station_id, *ym)]
+    if not pending:
+        return 0
+    for lo, hi in year_ranges(start, end):
+        if not any(ym in pending for ym in months_between(lo, hi)):
+            continue
+        try:
+            fetch_hourly(station_id, datetime.combine(lo, time(0, 0)), datetime.combine(hi, time(23, 59)))
+        except MeteostatDataError:
+            pass  # año sin datos (o descarga fallida): no se anota, se reintentará
+    return len(pending)
 
-    n_rows = len(df)
-    n_temp = int(df["temp"].notna().sum()) if "temp" in df.columns else 0
-    n_rhum = int(df["rhum"].notna().sum()) if "rhum" in df.columns else 0
-    return n_rows, n_temp, n_rhum
 
 def main():
-    # ventana corta en 1985
-    start_1985 = datetime(1985, 1, 1, 0, 0, 0)
-    end_1985   = datetime(1985, 1, 8, 0, 0, 0)
-
-    # ventana corta reciente
-    start_recent = datetime(2024, 1, 1, 0, 0, 0)
-    end_recent   = datetime(2024, 1, 8, 0, 0, 0)
-
-    for sid in STATIONS:
-        r85 = check_one(sid, start_1985, end_1985)
-        r24 = check_one(sid, start_recent, end_recent)
-        print(
-            f"{sid} | 1985 rows/temp/rhum: {r85[0]}/{r85[1]}/{r85[2]} "
-            f"| 2024 rows/temp/rhum: {r24[0]}/{r24[1]}/{r24[2]}"
-        )
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", type=date.fromisoformat, default=date(1985, 1, 1))
+    ap.add_argument("--end", type=date.fromisoformat, default=date.today())
+    ap.add_argument("--city", choices=sorted(CITY_STATIONS), default=None)
+    ap.add_argument("--stations", nargs="*", default=None, help="por defecto, las de CITY_STATIONS")
+    args = ap.parse_args()
+
+    cov = get_coverage(EVENING_HOURS)
+    if cov is None:
+        raise SystemExit("La caché de Meteostat está desactivada (SANTILOTO_WEATHER_CACHE=0)")
+
+    if args.stations:
+        stations = args.stations
+    else:
+        cities = [args.city] if args.city else list(CITY_STATIONS)
+        stations = [sid for c in cities for sid in CITY_STATIONS[c]]
+
+    for sid in stations:
+        try:
+            n = refresh_station(cov, sid, args.start, args.end)
+        except (requests.RequestException, OSError) as e:
+            # error de red: se sigue con la siguiente; lo ya anotado de esta se guarda
+            print(f"{sid} | error descargando: {e!r}")
+            continue
+        finally:
+            cov.save()
+        ranges = [(a, b) for a, b in cov.ranges(sid) if b >= args.start and a <= args.end]
+        days = sum((min(b, args.end) - max(a, args.start)).days + 1 for a, b in ranges)
+        print(f"{sid} | meses nuevos: {n} | días con temp/rhum: {days} | rangos: {len(ranges)}")
+        for a, b in ranges:
+            print(f"    {max(a, args.start)} .. {min(b, args.end)}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UPSERT por lotes común a todos los escritores de DBManager.
+
+  - el texto SQL se genera una vez por (tabla, columnas, clave de conflicto) y se
+    reutiliza; al ser idéntico, sqlite3 también reutiliza la sentencia preparada
+  - las filas van en trozos de `chunk_size` con executemany, todo bajo un SAVEPOINT:
+    la llamada es atómica por sí sola y, dentro de una transacción más grande
+    (DBManager.transaccion), un fallo solo deshace lo suyo
+  - devuelve cuántas filas eran nuevas y cuántas actualizaron una existente
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Sequence, Tuple
+
+CHUNK_SIZE = 250
+
+
+@dataclass(frozen=True)
+class UpsertResult:
+    inserted: int = 0
+    updated: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated
+
+    def __add__(self, other: UpsertResult) -> UpsertResult:
+        return UpsertResult(self.inserted + other.inserted, self.updated + other.updated)
+
+
+@lru_cache(maxsize=64)
+def upsert_sql(
+        table: str,
+        columns: Tuple[str, ...],
+        conflict: Tuple[str, ...],
+        touch: Tuple[str, ...] = (),
+) -> str:
+    """
+    INSERT ... ON CONFLICT(conflict) DO UPDATE de todas las columnas que no son clave.
+    touch: asignaciones extra en el UPDATE (p.ej. "ingested_at = datetime('now')").
+    """
+    update = [f"{c}=excluded.{c}" for c in columns if c not in conflict]
+    update.extend(touch)
+    if not update:
+        raise ValueError(f"No hay columnas a actualizar en {table} (solo {', '.join(conflict)})")
+    return f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" * len(columns))})
+        ON CONFLICT({", ".join(conflict)}) DO UPDATE SET
+          {", ".join(update)};"""
+
+
+@lru_cache(maxsize=64)
+def _existing_sql(table: str, conflict: Tuple[str, ...], n: int) -> str:
+    """Cuántas de n claves (distintas) ya existen en la tabla."""
+    if len(conflict) == 1:
+        return f"SELECT COUNT(*) FROM {table} WHERE {conflict[0]} IN ({', '.join('?' * n)})"
+    row = f"({', '.join('?' * len(conflict))})"
+    return (
+        f"SELECT COUNT(*) FROM {table} "
+        f"WHERE ({', '.join(conflict)}) IN (VALUES {', '.join([row] * n)})"
+    )
+
+
+def bulk_upsert(
+        conn: sqlite3.Connection,
+        table: str,
+        rows: Sequence[Dict[str, Any]],
+        conflict: Tuple[str, ...],
+        *,
+        touch: Tuple[str, ...] = (),
+        chunk_size: int = CHUNK_SIZE,
+) -> UpsertResult:
+    """
+    UPSERT de `rows` (dicts con las mismas claves) en `table`.
+    Lanza ValueError si las filas no tienen la misma estructura o falta la clave de
+    conflicto, y sqlite3.Error si falla la escritura (tras deshacer el SAVEPOINT).
+    """
+    if not rows:
+        return UpsertResult()
+
+    columns = tuple(rows[0].keys())
+    missing = [c for c in conflict if c not in columns]
+    if missing:
+        raise ValueError(f"Falta la clave {missing} en las filas de {table}")
+    keyset = set(columns)
+    for i, r in enumerate(rows):
+        if r.keys() != keyset:
+            raise ValueError(f"Estructura inconsistente en {table}[{i}]")
+
+    sql = upsert_sql(table, columns, tuple(conflict), tuple(touch))
+    key_idx = [columns.index(c) for c in conflict]
+    result = UpsertResult()
+
+    conn.execute("SAVEPOINT bulk_upsert")
+    try:
+        for lo in range(0, len(rows), max(1, chunk_size)):
+            values = [tuple(r[c] for c in columns) for r in rows[lo:lo + chunk_size]]
+            keys = list(dict.fromkeys(tuple(v[i] for i in key_idx) for v in values))
+            existing = conn.execute(
+                _existing_sql(table, tuple(conflict), len(keys)),
+                [x for k in keys for x in k],
+            ).fetchone()[0]
+            conn.executemany(sql, values)
+            inserted = len(keys) - existing
+            result = result + UpsertResult(inserted, len(values) - inserted)
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO bulk_upsert")
+        conn.execute("RELEASE bulk_upsert")
+        raise
+    conn.execute("RELEASE bulk_upsert")
+    return result
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Conexiones SQLite de larga duración para DBManager.
+
+Una conexión por hilo y por (ruta, solo lectura, PRAGMAs):
+  - se abre la primera vez que el hilo la pide y se reutiliza después
+  - los PRAGMAs se aplican una sola vez, al abrirla
+  - no se comprueba en cada uso: solo tras un error (SELECT 1); si está rota
+    se descarta y la siguiente petición abre otra
+
+sqlite3 no permite usar una conexión desde otro hilo (check_same_thread), de ahí
+que el pool sea thread-local: cada hilo de FastAPI/uvicorn tiene la suya.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+PoolKey = Tuple[str, bool, Tuple[Tuple[str, Any], ...]]
+
+
+def pool_key(db_path, pragmas: Dict[str, Any], read_only: bool = False) -> PoolKey:
+    return str(db_path), read_only, tuple(pragmas.items())
+
+
+def _connect_reader(path: Path) -> sqlite3.Connection:
+    """
+    mode=ro: SQLite rechaza cualquier escritura y no crea el fichero si no existe.
+    En WAL el lector necesita el -shm (lo crea SQLite si puede); si falta y no se
+    puede crear, el fallo no sale al conectar sino en la primera consulta, así que
+    se prueba aquí para que sea al abrir la conexión y con la ruta en el mensaje.
+    """
+    conn = sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True)
+    try:
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+    except sqlite3.OperationalError as e:
+        conn.close()
+        raise sqlite3.OperationalError(f"No se puede abrir {path} en solo lectura: {e}") from e
+    return conn
+
+
+def _connect(key: PoolKey) -> sqlite3.Connection:
+    db_path, read_only, pragmas = key
+    if read_only:
+        conn = _connect_reader(Path(db_path))
+    else:
+        conn = sqlite3.connect(db_path)
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+    """Conexiones reutilizables, una por hilo y clave (ver pool_key)."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"connects": 0, "discards": 0}
+
+    def _conns(self) -> Dict[PoolKey, sqlite3.Connection]:
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        return conns
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key: PoolKey) -> sqlite3.Connection:
+        conns = self._conns()
+        conn = conns.get(key)
+        if conn is None:
+            conn = conns[key] = _connect(key)
+            self._count("connects")
+        return conn
+
+    def discard(self, key: PoolKey) -> None:
+        conn = self._conns().pop(key, None)
+        if conn is not None:
+            self._count("discards")
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def healthy(self, key: PoolKey, conn: sqlite3.Connection) -> bool:
+        """Comprobación tras un error: si `conn` no responde y es la del pool, se descarta."""
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            if self._conns().get(key) is conn:
+                self.discard(key)
+            return False
+
+    def close_thread(self) -> None:
+        """Cierra las conexiones del hilo actual (p.ej. al terminar un script)."""
+        for key in list(self._conns()):
+            self.discard(key)
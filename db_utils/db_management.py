@@ -4,40 +4,35 @@
 
 from __future__ import annotations
 import sqlite3
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, date
-from dataclasses import dataclass
 from typing import Any, Dict, List, Tuple, Optional, TYPE_CHECKING
 
 from other_utils.fase_lunar import obtener_fase_lunar, obtener_valor_fase_lunar
-from other_utils.humidity_meteostat import get_daily_atmospheric_state, City
-
+from other_utils.meteostat_cache import cache_stats as meteostat_cache_stats
+from other_utils.humidity_meteostat import (
+    get_evening_states, City, DailyAtmosphericState, MeteostatDataError, EVENING_METHOD,
+)
+
+from constants import PREMIADOSPRIMI, PREMIADOSEURO
+from db_utils.connection_pool import ConnectionPool, pool_key
+from db_utils.history_features import (
+    FEATURE_TABLES, VERSION_TABLE, create_sql, backfill_sql, load_sql, join_sql, version_sql,
+    draws_version_sql,
+)
+from db_utils import influencers_queue
+from db_utils.bulk_upsert import UpsertResult, bulk_upsert
+from db_utils.history_snapshot import snapshot_enabled, load_snapshot, save_snapshot
 from db_utils.santi_rows import santi_primitiva_row, santi_euromillones_row
+from db_utils.history_store import HistArraysPrimitiva, HistArraysEuro
 
 if TYPE_CHECKING:
     from other_utils.weekly.types import (Apuesta_Primitiva,
                                           Apuesta_Euromillones)
 
 
-@dataclass(frozen=True)
-class HistRowPrimitiva:
-    n: Tuple[int, int, int, int, int, int]
-    re: Optional[int]
-    temp: float
-    rh: float
-    ah: float
-    moon_val: float
-
-
-@dataclass(frozen=True)
-class HistRowEuro:
-    n: Tuple[int, int, int, int, int]
-    e: Tuple[int, int]
-    temp: float
-    rh: float
-    ah: float
-    moon_val: float
-
-
 def _to_date(value: Any) -> date:
     """
     Convierte un valor 'fecha' leído de SQLite a datetime.date.
@@ -61,94 +56,353 @@ def _to_date(value: Any) -> date:
     raise ValueError(f"Formato de fecha no soportado: {value!r}")
 
 
+# Mapeo ciudad_str (SorteoInfluencers) -> City del módulo clima
+CITY_MAP: Dict[str, City] = {
+    "Madrid": "MADRID",
+    "Paris": "PARIS",
+}
+
+
+def _fila_influencers(
+        juego: str,
+        d: date,
+        ciudad_str: str,
+        atmos: DailyAtmosphericState,
+        station_id: str,
+) -> Dict[str, Any]:
+    """Fila de SorteoInfluencers para un sorteo (luna + clima ya descargado)."""
+    # Luna: las funciones aceptan datetime, así que convierto date -> datetime
+    dt = datetime(d.year, d.month, d.day)
+    luna_phase_value = float(obtener_valor_fase_lunar(dt))
+    luna_fase = str(obtener_fase_lunar(dt))
+
+    if atmos.rh_pct is not None and not (0 <= atmos.rh_pct <= 100):
+        raise ValueError(f"rh_pct fuera de rango: {atmos.rh_pct}")
+    if atmos.abs_humidity_g_m3 is not None and atmos.abs_humidity_g_m3 < 0:
+        raise ValueError(f"abs_humidity_g_m3 negativa: {atmos.abs_humidity_g_m3}")
+
+    # Nota: en SQLite conviene guardar fecha como 'YYYY-MM-DD' (aunque el tipo sea DATE)
+    return {
+        "juego": juego,
+        "fecha": d.isoformat(),
+        "ciudad": ciudad_str,
+
+        "temp_media": float(atmos.temp_c),
+        "rhum_media": float(atmos.rh_pct),
+        "ahum_media": float(atmos.abs_humidity_g_m3),
+
+        "luna_phase_value": luna_phase_value,
+        "luna_fase": luna_fase,
+
+        # Trazabilidad
+        "source": "meteostat",
+        "station_id": station_id,
+        "method": EVENING_METHOD,
+    }
+
+
+def _tramos_influencers(pendientes: List[Tuple[str, date, str]]) -> Dict[Tuple[City, int], List[date]]:
+    """(city, año) -> fechas pendientes (sin repetir, ordenadas): una descarga por tramo y estación."""
+    tramos: Dict[Tuple[City, int], set] = {}
+    for _, d, ciudad_str in pendientes:
+        city = CITY_MAP.get(ciudad_str)
+        if city is None:
+            continue
+        tramos.setdefault((city, d.year), set()).add(d)
+    return {key: sorted(fechas) for key, fechas in tramos.items()}
+
+
+# Perfiles de conexión (los PRAGMAs se aplican una vez por conexión del pool):
+#   - writer: WAL, así los lectores no bloquean al sync/upserts semanales ni al revés;
+#     synchronous=NORMAL es seguro en WAL (solo se arriesga la última transacción ante
+#     un corte de luz, nunca la integridad)
+#   - reader: mode=ro + query_only, para la API; lee la última versión confirmada
+#     sin tomar locks de escritura
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "writer": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32000,        # KiB (negativo) -> ~32 MB
+        "mmap_size": 268435456,      # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "reader": {
+        "query_only": "ON",
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+DEFAULT_PROFILE = "writer"
+
+WEEKLY_CACHE_TABLE = "WeeklyResultCache"
+WEEKLY_CACHE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {WEEKLY_CACHE_TABLE} (
+      cache_key      TEXT PRIMARY KEY,
+      week_start     TEXT,
+      method_version TEXT,
+      payload        TEXT NOT NULL,
+      created_at     TEXT NOT NULL DEFAULT (datetime('now')),
+      last_used_at   REAL NOT NULL DEFAULT (julianday('now'))
+    );
+"""
+# Un acierto solo refresca last_used_at si lleva más de esto (días) sin refrescarse
+WEEKLY_CACHE_TOUCH_DAYS = 1 / 24
+
+_POOL = ConnectionPool()
+
+# (ruta, tabla) de las tablas creadas bajo demanda (HistoryFeatures, cola de
+# influencers, WeeklyResultCache) ya creadas en este proceso
+_FEATURES_READY: set[tuple[str, str]] = set()
+
+# Índice de premios (PrizeIndex) por (ruta, juego), con la huella de la tabla de
+# sorteos con que se construyó: se reconstruye solo si cambian los sorteos
+_PRIZE_INDEX: Dict[tuple[str, str], tuple[tuple, Any]] = {}
+
+# juego -> (k, columnas de la consulta de sorteos para PrizeIndex.from_records)
+PRIZE_GAMES: Dict[str, tuple[int, str]] = {
+    "Primitiva": (6, "n1, n2, n3, n4, n5, n6"),
+    "Euromillones": (5, "n1, n2, n3, n4, n5, e1, e2"),
+}
+
+
+def _sentencias(script: str):
+    """Sentencias de un script SQL (los triggers llevan ';' dentro de BEGIN ... END)."""
+    actual = ""
+    for trozo in script.split(";"):
+        actual += trozo + ";"
+        if sqlite3.complete_statement(actual):
+            if actual.strip(" \t\r\n;"):
+                yield actual.strip()
+            actual = ""
+
+
+def _crear_esquema(conn: sqlite3.Connection, scripts: List[str], backfill: Optional[str]) -> None:
+    """
+    Ejecuta los scripts de DDL (y la carga inicial) sentencia a sentencia bajo un
+    SAVEPOINT. No se usa executescript porque hace COMMIT antes de empezar: dentro
+    de transaccion() confirmaría lo que hubiera pendiente.
+    """
+    conn.execute("SAVEPOINT crear_esquema")
+    try:
+        for script in scripts:
+            for sql in _sentencias(script):
+                conn.execute(sql)
+        if backfill:
+            conn.execute(backfill)
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO crear_esquema")
+        conn.execute("RELEASE crear_esquema")
+        raise
+    conn.execute("RELEASE crear_esquema")
+
+
 class DBManager:
     """Clase para gestionar todas las consultas a la base de datos."""
 
-    def __init__(self, db_path):
-        """Inicializa el gestor con la ruta a la base de datos."""
+    def __init__(self, db_path, profile: str = DEFAULT_PROFILE, pragmas: Optional[Dict[str, Any]] = None):
+        """
+        Inicializa el gestor con la ruta a la base de datos.
+        Las conexiones salen de un pool thread-local (ver db_utils/connection_pool.py).
+        profile: 'writer' (por defecto) o 'reader' (solo lectura); ver PROFILES.
+        pragmas: se añaden a (o sustituyen) los del perfil.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Perfil de conexión desconocido: {profile!r}")
         self.db_path = db_path
+        self.profile = profile
+        self.pragmas = {**PROFILES[profile], **(pragmas or {})}
         self.conn = None
+        self._owns_tx = True
+        self._tx_depth = 0
+        # último resultado de _upsert por tabla (filas nuevas / actualizadas)
+        self.upsert_stats: Dict[str, UpsertResult] = {}
+
+    @property
+    def read_only(self) -> bool:
+        return self.profile == "reader"
+
+    @property
+    def _pool_key(self):
+        return pool_key(self.db_path, self.pragmas, read_only=self.read_only)
 
     def __enter__(self):
         # Este método se ejecuta al entrar en el bloque 'with'
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = _POOL.get(self._pool_key)
+        # La conexión del pool es compartida por todos los DBManager del hilo: si ya
+        # había una transacción abierta (transaccion() de otro DBManager) no es nuestra.
+        self._owns_tx = not self.conn.in_transaction
         return self  # Retorna el objeto DBManager para usarlo dentro del bloque
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         # Este método se ejecuta al salir del bloque 'with'
-        # Se asegura de que la conexión se cierre
-        if self.conn:
-            self.conn.close()
+        # La conexión vuelve al pool sin cerrarse; si hubo excepción se descarta
+        # lo que quedara sin confirmar, como pasaba al cerrarla, pero solo si la
+        # transacción empezó dentro de este bloque: la de fuera la decide quien la abrió.
+        if self.conn is not None and exc_type is not None and self._owns_tx:
+            try:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                    self._olvidar_indices_premios()
+            except sqlite3.Error:
+                _POOL.discard(self._pool_key)
         self.conn = None  # <- CRÍTICO
-        # Si la conexión se cierra, el retorno 'None' no suprime la excepción
+        # El retorno 'False' no suprime la excepción
         return False
 
     def _get_conn(self) -> sqlite3.Connection:
         """
         Devuelve una conexión abierta.
         - Si estamos dentro de 'with DBManager(...)', usa self.conn
-        - Si self.conn está cerrada por cualquier motivo, la reabre
+        - Si no, la conexión del pool para este hilo (se abre una vez y se reutiliza)
         """
         if self.conn is not None:
-            try:
-                # test barato: si está cerrada, esto lanza ProgrammingError
-                self.conn.execute("SELECT 1")
-                return self.conn
-            except sqlite3.ProgrammingError:
-                # estaba cerrada: la “olvidamos” y abrimos una nueva
-                self.conn = None
+            return self.conn
+        return _POOL.get(self._pool_key)
 
-        return sqlite3.connect(self.db_path)
+    def _ejecutar(self, fn):
+        """
+        Ejecuta fn(conn). Solo si falla se comprueba la conexión:
+        - si responde, el error era de la sentencia: se deshace lo pendiente y se relanza
+        - si está rota (p.ej. cerrada por fuera), se descarta y se reintenta una vez con otra
+        Dentro de transaccion() no se deshace ni se reintenta nada: decide transaccion().
+        """
+        conn = self._get_conn()
+        try:
+            return fn(conn)
+        except sqlite3.Error:
+            if self._tx_depth:
+                raise
+            if _POOL.healthy(self._pool_key, conn):
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            if self.conn is conn:
+                self.conn = _POOL.get(self._pool_key)
+            return fn(self._get_conn())
 
     def _ejecutar_consulta(self, query, params=()):
-        conn = None
-        conn_local = False
-        try:
-            conn_local = (self.conn is None)
-            conn = self._get_conn()
+        def consulta(conn: sqlite3.Connection):
             cur = conn.cursor()
             cur.execute(query, params)
             return cur.fetchall()
+
+        try:
+            return self._ejecutar(consulta)
         except sqlite3.Error as e:
             print(f"Error ejecutando consulta de base de datos: {e}")
             return None
-        finally:
-            if conn_local and conn is not None:
-                conn.close()
 
     def _ejecutar_modificacion(self, query, params=()):
-        conn = None
-        conn_local = False
-        try:
-            conn_local = (self.conn is None)
-            conn = self._get_conn()
+        def modificacion(conn: sqlite3.Connection):
             cur = conn.cursor()
             cur.execute(query, params)
-            conn.commit()
+            self._commit(conn)
             return True
+
+        try:
+            return self._ejecutar(modificacion)
         except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
             print(f"Error al modificar la base de datos: {e}")
             return False
-        finally:
-            if conn_local and conn is not None:
-                conn.close()
 
     def _ejecutar_many(self, query, values):
-        conn = None
-        conn_local = False
-        try:
-            conn_local = (self.conn is None)
-            conn = self._get_conn()
+        def many(conn: sqlite3.Connection):
             cur = conn.cursor()
             cur.executemany(query, values)
-            conn.commit()
+            self._commit(conn)
             return True
+
+        try:
+            return self._ejecutar(many)
         except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
             print(f"Error al ejecutar many: {e}")
             return False
-        finally:
-            if conn_local and conn is not None:
-                conn.close()
+
+    def _commit(self, conn: sqlite3.Connection) -> None:
+        """COMMIT, salvo dentro de transaccion(), que confirma todo junto al final."""
+        if not self._tx_depth:
+            conn.commit()
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Agrupa varias escrituras en un solo COMMIT:
+
+            with db.transaccion():
+                db.upsert_santi_primitiva(...)
+                db.upsert_santi_euromillones(...)
+
+        Si sale una excepción se deshace todo. Se puede anidar (solo la externa confirma).
+        Dentro, los métodos que fuera devuelven False ante un sqlite3.Error (o un
+        ValueError de validación) lo relanzan, para que no se confirme media escritura.
+
+        Si la conexión del hilo ya está en una transacción de otro DBManager, esta va en
+        un SAVEPOINT: un error solo deshace lo suyo y confirma quien abrió la de fuera.
+        """
+        conn = self._get_conn()
+        if self._tx_depth:
+            self._tx_depth += 1
+            try:
+                yield self
+            finally:
+                self._tx_depth -= 1
+            return
+
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT transaccion")
+            self._tx_depth = 1
+            try:
+                yield self
+            except BaseException:
+                self._tx_depth = 0
+                conn.execute("ROLLBACK TO transaccion")
+                conn.execute("RELEASE transaccion")
+                self._olvidar_indices_premios()
+                raise
+            self._tx_depth = 0
+            conn.execute("RELEASE transaccion")
+            return
+
+        conn.execute("BEGIN")
+        self._tx_depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth = 0
+            conn.rollback()
+            self._olvidar_indices_premios()
+            raise
+        self._tx_depth = 0
+        conn.commit()
+
+    def _upsert(
+            self,
+            tabla: str,
+            rows: List[Dict[str, Any]],
+            conflict: Tuple[str, ...],
+            touch: Tuple[str, ...] = (),
+    ) -> UpsertResult:
+        """
+        UPSERT por lotes (ver db_utils/bulk_upsert.py) con confirmación propia, o
+        diferida si estamos dentro de transaccion(). Lanza ValueError / sqlite3.Error.
+        """
+        def upsert(conn: sqlite3.Connection):
+            res = bulk_upsert(conn, tabla, rows, conflict, touch=touch)
+            if conn.in_transaction:
+                self._commit(conn)
+            return res
+
+        res = self._ejecutar(upsert)
+        self.upsert_stats[tabla] = res
+        return res
 
     def fecha_ultimo_resultado(self, nombre_tabla, nombre_columna_fecha):
         """
@@ -190,36 +444,21 @@ class DBManager:
             print("Error: Falta la clave 'fecha' en los datos.")
             return False
 
-        # Asegurar que todos los dicts tienen las mismas claves (importante para executemany)
-        claves = list(combinaciones[0].keys())
-        for i, r in enumerate(combinaciones[1:], start=1):
-            if list(r.keys()) != claves:
-                print(f"Error: Estructura inconsistente en el registro {i}.")
-                return False
-
-        columnas = ", ".join(claves)
-        placeholders = ", ".join(["?"] * len(claves))
-
-        # Columnas a actualizar: todas excepto 'fecha'
-        columnas_update = [c for c in claves if c != "fecha"]
-        if not columnas_update:
+        if len(combinaciones[0]) < 2:
             print("Error: No hay columnas a actualizar (solo existe 'fecha').")
             return False
 
-        set_clause = ", ".join([f"{c}=excluded.{c}" for c in columnas_update])
-
-        query = f"""
-            INSERT INTO {nombre_tabla} ({columnas})
-            VALUES ({placeholders})
-            ON CONFLICT(fecha) DO UPDATE SET
-              {set_clause};
-        """
-
-        lista_de_valores = [tuple(registro[c] for c in claves) for registro in combinaciones]
-
         try:
-            return self._ejecutar_many(query, lista_de_valores)
+            self._upsert(nombre_tabla, combinaciones, ("fecha",))
+            return True
+        except ValueError as e:
+            if self._tx_depth:
+                raise
+            print(f"Error: {e}")
+            return False
         except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
             print(f"Error al insertar/actualizar registros en {nombre_tabla}: {e}")
             return False
 
@@ -231,19 +470,14 @@ class DBManager:
         """
         Devuelve una lista de (juego, fecha_date, ciudad_str) para sorteos que existen en Primitiva/Euromillones
         pero aún no tienen fila en SorteoInfluencers.
+
+        Lee la cola InfluencersPendientes (ver db_utils/influencers_queue.py); si no se
+        puede crear (p.ej. en solo lectura) hace el cruce completo de siempre.
         """
-        sql = """
-        SELECT s.juego, s.fecha, s.ciudad
-        FROM (
-          SELECT 'Primitiva' AS juego, fecha, 'Madrid' AS ciudad FROM Primitiva
-          UNION ALL
-          SELECT 'Euromillones' AS juego, fecha, 'Paris'  AS ciudad FROM Euromillones
-        ) s
-        LEFT JOIN SorteoInfluencers si
-          ON si.juego = s.juego AND si.fecha = s.fecha
-        WHERE si.fecha IS NULL
-        ORDER BY s.fecha;
-        """
+        if self._asegurar_cola_influencers():
+            sql = influencers_queue.PENDING_SQL
+        else:
+            sql = influencers_queue.PENDING_JOIN_SQL
 
         pendientes: List[Tuple[str, date, str]] = []
         rows = self._ejecutar_consulta(sql) or []
@@ -251,6 +485,20 @@ class DBManager:
             pendientes.append((juego, _to_date(fecha_raw), ciudad))
         return pendientes
 
+    def obtener_fechas_influencers_a_recalcular(self) -> List[Tuple[str, date, str]]:
+        """
+        (juego, fecha_date, ciudad_str) de las filas de SorteoInfluencers calculadas con
+        otro método que el actual (humidity_meteostat.EVENING_METHOD), en el orden de
+        obtener_fechas_pendientes_influencers.
+        """
+        rows = self._ejecutar_consulta("""
+            SELECT juego, fecha, ciudad
+            FROM SorteoInfluencers
+            WHERE method IS NOT ?
+            ORDER BY fecha, juego DESC
+        """, (EVENING_METHOD,)) or []
+        return [(juego, _to_date(fecha_raw), ciudad) for juego, fecha_raw, ciudad in rows]
+
     def upsert_sorteo_influencers(self, influencers: List[Dict[str, Any]]) -> bool:
         """
         UPSERT en SorteoInfluencers. Requiere PK (juego, fecha).
@@ -258,113 +506,103 @@ class DBManager:
         if not influencers:
             return True
 
-        claves = list(influencers[0].keys())
-        for i, r in enumerate(influencers[1:], start=1):
-            if list(r.keys()) != claves:
-                print(f"Error: estructura inconsistente en influencers[{i}]")
-                return False
-
-        columnas = ", ".join(claves)
-        placeholders = ", ".join(["?"] * len(claves))
-
-        # actualizar todo excepto la clave compuesta
-        columnas_update = [c for c in claves if c not in ("juego", "fecha")]
-        set_clause = ", ".join([f"{c}=excluded.{c}" for c in columnas_update])
-
-        query = f"""
-            INSERT INTO SorteoInfluencers ({columnas})
-            VALUES ({placeholders})
-            ON CONFLICT(juego, fecha) DO UPDATE SET
-              {set_clause},
-              ingested_at = datetime('now');
-        """
-
-        valores = [tuple(r[c] for c in claves) for r in influencers]
-
         try:
-            return self._ejecutar_many(query, valores)
+            self._upsert(
+                "SorteoInfluencers", influencers, ("juego", "fecha"),
+                touch=("ingested_at = datetime('now')",),
+            )
+            return True
+        except ValueError as e:
+            if self._tx_depth:
+                raise
+            print(f"Error: {e}")
+            return False
         except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
             print(f"Error al upsert de SorteoInfluencers: {e}")
             return False
 
     def sync_sorteo_influencers(
             self,
-            station_limit: int = 6,
+            station_limit: Optional[int] = None,
             batch_size: int = 250,
+            max_workers: int = 8,
+            recalcular: bool = False,
     ) -> bool:
         """
         Rellena / actualiza SorteoInfluencers para todas las fechas que falten.
         Útil tanto para la carga histórica inicial como para el refresco semanal.
+        Con recalcular=True también rehace las filas guardadas con otro método (ver
+        humidity_meteostat.EVENING_METHOD); las que no se puedan recalcular se quedan
+        como estaban.
 
-        station_limit: se pasa a get_daily_atmospheric_state()
+        station_limit: obsoleto, no se usa (avisa con DeprecationWarning si se pasa)
         batch_size: inserciones por lotes (mejor rendimiento)
+        max_workers: hilos que descargan de Meteostat en paralelo (la concurrencia por
+                     estación la limita humidity_meteostat.STATION_CONCURRENCY)
+
+        El clima se pide por tramos (ciudad, año) con get_evening_states: una petición
+        por estación y año en lugar de una por sorteo. Las descargas van en paralelo,
+        pero este hilo es el único que escribe: recoge los resultados en el orden de
+        `pendientes`, así que lotes, avisos y contadores OK/FAIL salen igual que en una
+        pasada secuencial.
         """
+        if station_limit is not None:
+            warnings.warn(
+                "sync_sorteo_influencers(station_limit=...) no se usa y desaparecerá",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+
         try:
             pendientes = self.obtener_fechas_pendientes_influencers()
+            antiguas = self.obtener_fechas_influencers_a_recalcular()
+            if recalcular:
+                pendientes = sorted(
+                    set(pendientes) | set(antiguas),
+                    key=lambda p: (p[1], p[0] != "Primitiva"),
+                )
         except Exception as e:
             print(f"Error leyendo fechas pendientes: {e}")
             return False
 
+        if antiguas and not recalcular:
+            # el histórico mezcla las dos ventanas hasta que se recalculen
+            print(
+                f"[WARN] sync_sorteo_influencers: {len(antiguas)} filas de SorteoInfluencers con "
+                f"method distinto de {EVENING_METHOD!r}; recalcúlalas con "
+                f"sync_sorteo_influencers(recalcular=True) o scripts/backfill_influencers_method.py"
+            )
+
         if not pendientes:
             return True
 
-        # Mapeo ciudad_str -> City del módulo clima (ajusta nombres si difieren)
-        city_map: Dict[str, City] = {
-            "Madrid": "MADRID",
-            "Paris": "PARIS",
-        }
-
         ok_count = 0
         fail_count = 0
 
         batch: List[Dict[str, Any]] = []
-        for juego, d, ciudad_str in pendientes:
-            try:
-                city = city_map[ciudad_str]
-
-                # Luna: tus funciones aceptan datetime, así que convierto date -> datetime
-                dt = datetime(d.year, d.month, d.day)
-                luna_phase_value = float(obtener_valor_fase_lunar(dt))
-                luna_fase = str(obtener_fase_lunar(dt))
-
-                # Clima: tu función acepta date
-                # atmos, station_id = get_daily_atmospheric_state(d=d, city=city, station_limit=station_limit)
-                try_limits = (station_limit, max(station_limit, 12), max(station_limit, 24))
-                last_err = None
-                for lim in try_limits:
-                    try:
-                        atmos, station_id = get_daily_atmospheric_state(d=d, city=city, station_limit=lim)
-                        break
-                    except Exception as e:
-                        last_err = e
-                        # atmos = None
-                else:
-                    raise last_err  # no se pudo con ningún límite
-
-                if atmos.rh_pct is not None and not (0 <= atmos.rh_pct <= 100):
-                    raise ValueError(f"rh_pct fuera de rango: {atmos.rh_pct}")
-                if atmos.abs_humidity_g_m3 is not None and atmos.abs_humidity_g_m3 < 0:
-                    raise ValueError(f"abs_humidity_g_m3 negativa: {atmos.abs_humidity_g_m3}")
-
-                # Construir fila para SorteoInfluencers.
-                # Nota: en SQLite conviene guardar fecha como 'YYYY-MM-DD' (aunque el tipo sea DATE)
-                row = {
-                    "juego": juego,
-                    "fecha": d.isoformat(),
-                    "ciudad": ciudad_str,
-
-                    "temp_media": float(atmos.temp_c),
-                    "rhum_media": float(atmos.rh_pct),
-                    "ahum_media": float(atmos.abs_humidity_g_m3),
-
-                    "luna_phase_value": luna_phase_value,
-                    "luna_fase": luna_fase,
-
-                    # Trazabilidad (ajusta si tu módulo da station_id real)
-                    "source": "meteostat",
-                    "station_id": station_id,
-                    "method": "hourly_mean_18_23",
-                }
+        pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="influencers")
+        try:
+            tramos = {
+                key: pool.submit(get_evening_states, key[0], fechas)
+                for key, fechas in _tramos_influencers(pendientes).items()
+            }
+            for juego, d, ciudad_str in pendientes:
+                city = CITY_MAP.get(ciudad_str)
+                if city is None:
+                    print(f"Ciudad no soportada: {ciudad_str!r} (juego={juego}, fecha={d})")
+                    return False
+                try:
+                    estados = tramos[(city, d.year)].result()
+                    if d not in estados:
+                        raise MeteostatDataError(f"No usable station for {city} on {d.isoformat()}")
+                    atmos, station_id = estados[d]
+                    row = _fila_influencers(juego, d, ciudad_str, atmos, station_id)
+                except Exception as e:
+                    fail_count += 1
+                    print(f"[WARN] influencers falló (juego={juego}, fecha={d}, ciudad={ciudad_str}): {e}")
+                    continue
 
                 batch.append(row)
                 ok_count += 1
@@ -374,14 +612,9 @@ class DBManager:
                     if not self.upsert_sorteo_influencers(batch):
                         return False
                     batch.clear()
-
-            except KeyError:
-                print(f"Ciudad no soportada: {ciudad_str!r} (juego={juego}, fecha={d})")
-                return False
-            except Exception as e:
-                fail_count += 1
-                print(f"[WARN] influencers falló (juego={juego}, fecha={d}, ciudad={ciudad_str}): {e}")
-                continue
+        finally:
+            # si se sale antes de tiempo, no seguir descargando tramos que nadie va a escribir
+            pool.shutdown(wait=True, cancel_futures=True)
 
         # último lote
         if batch:
@@ -390,48 +623,225 @@ class DBManager:
             batch.clear()
 
         print(f"sync_sorteo_influencers: OK={ok_count}, FAIL={fail_count}")
+        print(f"sync_sorteo_influencers: caché meteostat {meteostat_cache_stats()}")
         return ok_count > 0
 
-    def load_history_primitiva(self) -> List[HistRowPrimitiva]:
-        sql = """
-        SELECT
-          p.n1, p.n2, p.n3, p.n4, p.n5, p.n6,
-          p.re,
-          si.temp_media, si.rhum_media, si.ahum_media, si.luna_phase_value
-        FROM Primitiva p
-        JOIN Sorteoinfluencers si
-          ON si.fecha = p.fecha AND si.juego = 'Primitiva'
+    # -----------------------------
+    # Histórico materializado (ver db_utils/history_features.py)
+    # -----------------------------
+
+    def _asegurar_history_features(self, juego: str) -> bool:
         """
-        rows = self._ejecutar_consulta(sql) or []
-        out: List[HistRowPrimitiva] = []
-
-        for r in rows:
-            n = (int(r[0]), int(r[1]), int(r[2]), int(r[3]), int(r[4]), int(r[5]))
-            # n = (n1, n2, n3, n4, n5, n6)
-            re_val = r[6]  # índice del reintegro
-            re = None if re_val is None else int(re_val)
-            temp, rh, ah, moonv = float(r[7]), float(r[8]), float(r[9]), float(r[10])
-            out.append(HistRowPrimitiva(n=n, re=re, temp=temp, rh=rh, ah=ah, moon_val=moonv))
-        return out
-
-    def load_history_euromillones(self) -> List[HistRowEuro]:
-        sql = """
-        SELECT
-          e.n1, e.n2, e.n3, e.n4, e.n5,
-          e.e1, e.e2,
-          si.temp_media, si.rhum_media, si.ahum_media, si.luna_phase_value
-        FROM Euromillones e
-        JOIN Sorteoinfluencers si
-          ON si.fecha = e.fecha AND si.juego = 'Euromillones'
+        Crea (una vez por proceso y base de datos) la tabla HistoryFeatures del juego
+        y sus triggers; si la tabla no existía, la rellena con el histórico actual.
+        En solo lectura solo comprueba que existan (features y versión).
         """
-        rows = self._ejecutar_consulta(sql) or []
-        out: List[HistRowEuro] = []
-        for r in rows:
-            n = (int(r[0]), int(r[1]), int(r[2]), int(r[3]), int(r[4]))
-            stars = (int(r[5]), int(r[6]))
-            temp, rh, ah, moonv = float(r[7]), float(r[8]), float(r[9]), float(r[10])
-            out.append(HistRowEuro(n=n, e=stars, temp=temp, rh=rh, ah=ah, moon_val=moonv))
-        return out
+        _, features, _ = FEATURE_TABLES[juego]
+        key = (str(self.db_path), features)
+        if key in _FEATURES_READY:
+            return True
+        if self.read_only:
+            return self._existe_tabla(features) and self._existe_tabla(VERSION_TABLE)
+
+        def crear(conn: sqlite3.Connection):
+            nueva = not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (features,)
+            ).fetchone()
+            _crear_esquema(conn, [create_sql(juego)], backfill_sql(juego) if nueva else None)
+            return True
+
+        try:
+            self._ejecutar(crear)
+        except sqlite3.Error as e:
+            print(f"Error creando {features}: {e}")
+            return False
+        if not self._tx_depth:  # dentro de transaccion() aún puede deshacerse
+            _FEATURES_READY.add(key)
+        return True
+
+    def _asegurar_cola_influencers(self) -> bool:
+        """
+        Crea (una vez por proceso y base de datos) la cola InfluencersPendientes y sus
+        triggers; si no existía, la rellena con los sorteos que aún no tienen influencers.
+        En solo lectura solo comprueba que exista.
+        """
+        tabla = influencers_queue.QUEUE_TABLE
+        key = (str(self.db_path), tabla)
+        if key in _FEATURES_READY:
+            return True
+        if self.read_only:
+            return self._existe_tabla(tabla)
+
+        def crear(conn: sqlite3.Connection):
+            nueva = not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+            ).fetchone()
+            _crear_esquema(
+                conn,
+                [influencers_queue.create_sql(juego) for juego in influencers_queue.QUEUE_GAMES],
+                influencers_queue.backfill_sql() if nueva else None,
+            )
+            return True
+
+        try:
+            self._ejecutar(crear)
+        except sqlite3.Error as e:
+            print(f"Error creando {tabla}: {e}")
+            return False
+        if not self._tx_depth:  # dentro de transaccion() aún puede deshacerse
+            _FEATURES_READY.add(key)
+        return True
+
+    def _load_history(self, juego: str, cls):
+        """
+        Histórico del juego: de la instantánea .npy si está al día (ver history_snapshot),
+        si no de HistoryFeatures (y se deja la instantánea escrita para la próxima vez).
+        Sin tabla de features (solo lectura sobre una base antigua) se usa el JOIN.
+        """
+        if not self._asegurar_history_features(juego):
+            return cls.from_records(self._ejecutar_consulta(join_sql(juego)) or [])
+
+        key = self.obtener_version_historico(juego) if snapshot_enabled() else None
+        if key is not None:
+            hist = load_snapshot(self.db_path, juego, key, cls)
+            if hist is not None:
+                return hist
+
+        hist = cls.from_records(self._ejecutar_consulta(load_sql(juego)) or [])
+        if key is not None:
+            save_snapshot(self.db_path, juego, key, hist)
+        return hist
+
+    def obtener_version_historico(self, juego: str) -> Optional[Tuple[Any, ...]]:
+        """
+        (versión, filas, última fecha) de HistoryFeatures del juego. La versión la suben
+        los triggers con cualquier alta, baja o corrección de sorteos o de
+        SorteoInfluencers. None si no hay tabla de features (solo lectura sobre una base antigua).
+        """
+        if not self._asegurar_history_features(juego):
+            return None
+        rows = self._ejecutar_consulta(version_sql(juego))
+        return tuple(rows[0]) if rows else None
+
+    def load_history_primitiva(self) -> HistArraysPrimitiva:
+        """
+        Histórico de Primitiva con sus influencers, en columnas (ver history_store),
+        ordenado por fecha. Sale de HistoryFeaturesPrimitiva (sin JOIN) o de su instantánea.
+        """
+        return self._load_history("Primitiva", HistArraysPrimitiva)
+
+    def load_history_euromillones(self) -> HistArraysEuro:
+        """
+        Histórico de Euromillones con sus influencers, en columnas, ordenado por fecha.
+        Sale de HistoryFeaturesEuromillones (sin JOIN) o de su instantánea.
+        """
+        return self._load_history("Euromillones", HistArraysEuro)
+
+    # -----------------------------
+    # Caché de WeeklyResult (ver other_utils/weekly/cache.py)
+    # -----------------------------
+
+    def _asegurar_tabla_weekly_cache(self) -> bool:
+        """
+        Crea (una vez por proceso y base de datos) la tabla WeeklyResultCache.
+        En solo lectura solo comprueba que exista.
+        """
+        key = (str(self.db_path), WEEKLY_CACHE_TABLE)
+        if key in _FEATURES_READY:
+            return True
+        if self.read_only:
+            return self._existe_tabla(WEEKLY_CACHE_TABLE)
+
+        def crear(conn: sqlite3.Connection):
+            _crear_esquema(conn, [WEEKLY_CACHE_SQL], None)
+            return True
+
+        try:
+            self._ejecutar(crear)
+        except sqlite3.Error as e:
+            print(f"Error creando {WEEKLY_CACHE_TABLE}: {e}")
+            return False
+        if not self._tx_depth:  # dentro de transaccion() aún puede deshacerse
+            _FEATURES_READY.add(key)
+        return True
+
+    def _existe_tabla(self, nombre_tabla: str) -> bool:
+        rows = self._ejecutar_consulta(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre_tabla,)
+        )
+        return bool(rows)
+
+    def obtener_weekly_cache(self, cache_key: str) -> Optional[str]:
+        """
+        Devuelve el WeeklyResult serializado para cache_key, o None si no está.
+        Un acierto no escribe, salvo para refrescar last_used_at (para el LRU de
+        guardar_weekly_cache) si lleva más de WEEKLY_CACHE_TOUCH_DAYS sin tocarse; eso
+        es best-effort y en solo lectura no se hace.
+        """
+        if not self._asegurar_tabla_weekly_cache():
+            return None
+        rows = self._ejecutar_consulta(
+            "SELECT payload, julianday('now') - last_used_at FROM WeeklyResultCache WHERE cache_key = ?",
+            (cache_key,),
+        )
+        if not rows:
+            return None
+        payload, idle_days = rows[0]
+        if not self.read_only and idle_days > WEEKLY_CACHE_TOUCH_DAYS:
+            self._tocar_weekly_cache(cache_key)
+        return payload
+
+    def _tocar_weekly_cache(self, cache_key: str) -> None:
+        def tocar(conn: sqlite3.Connection):
+            conn.execute(
+                "UPDATE WeeklyResultCache SET last_used_at = julianday('now') WHERE cache_key = ?",
+                (cache_key,),
+            )
+            self._commit(conn)
+
+        try:
+            self._ejecutar(tocar)
+        except sqlite3.Error:
+            pass  # p.ej. base bloqueada por otro escritor: el orden LRU es aproximado
+
+    def guardar_weekly_cache(
+            self,
+            cache_key: str,
+            payload: str,
+            *,
+            week_start: Optional[str],
+            method_version: str,
+            max_entries: int = 64,
+    ) -> bool:
+        """
+        Guarda un WeeklyResult serializado y elimina las entradas menos usadas
+        por encima de max_entries. En solo lectura no guarda nada.
+        """
+        if self.read_only or not self._asegurar_tabla_weekly_cache():
+            return False
+        ok = self._ejecutar_modificacion(
+            """
+            INSERT INTO WeeklyResultCache (cache_key, week_start, method_version, payload)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+              payload = excluded.payload,
+              last_used_at = julianday('now');
+            """,
+            (cache_key, week_start, method_version, payload),
+        )
+        if not ok:
+            return False
+        return self._ejecutar_modificacion(
+            """
+            DELETE FROM WeeklyResultCache
+            WHERE cache_key NOT IN (
+              SELECT cache_key FROM WeeklyResultCache
+              ORDER BY last_used_at DESC
+              LIMIT ?
+            );
+            """,
+            (max_entries,),
+        )
 
     def upsert_santi_primitiva(
             self,
@@ -469,11 +879,6 @@ class DBManager:
         if not rows:
             return True
 
-        cols = list(rows[0].keys())
-        for r in rows[1:]:
-            if list(r.keys()) != cols:
-                raise ValueError("Estructura inconsistente en upsert_santi_primitiva")
-
         # claves críticas siempre presentes
         for i, r in enumerate(rows):
             if not r.get("target_date"):
@@ -481,51 +886,18 @@ class DBManager:
             if not r.get("signature"):
                 raise ValueError(f"rows[{i}] sin signature")
 
-        conflict_cols = "target_date, signature"
-        assert conflict_cols == "target_date, signature"
-
-        columns = ", ".join(cols)
-        placeholders = ", ".join(["?"] * len(cols))
-
-        # actualiza todo excepto las columnas de la constraint
-        # Ajusta el ON CONFLICT a tu índice real:
-
-        update_cols = [c for c in cols if c not in ("target_date", "signature")]
-        set_clause = ", ".join([f"{c}=excluded.{c}" for c in update_cols])
-
-        sql = f"""
-        INSERT INTO SantiPrimitiva ({columns})
-        VALUES ({placeholders})
-        ON CONFLICT({conflict_cols}) DO UPDATE SET
-          {set_clause},
-          generated_at = datetime('now');
-        """
-
-        # chequeo
-        # required = {"week_start", "week_end", "target_date", "signature", "tol_frac", "method_version", "city", "re"}
-        #
-        # missing_required = [k for k in required if k not in cols]
-        # if missing_required:
-        #     raise ValueError(f"Faltan columnas requeridas en rows[0]: {missing_required}. cols={cols}")
-        #
-        # for i, r in enumerate(rows):
-        #     if not r.get("target_date"):
-        #         raise ValueError(f"rows[{i}] target_date vacío/None: {r}")
-        #     if not r.get("signature"):
-        #         raise ValueError(f"rows[{i}] signature vacía/None: {r}")
-
-        # generated_at lo rellena SQLite con DEFAULT datetime('now')
-        # notnull_cols = ["week_start", "week_end", "method_version", "tol_frac", "city", "re", "signature",
-        #                 "target_date"]
-        #
-        # for i, r in enumerate(rows):
-        #     bad = [c for c in notnull_cols if r.get(c) is None]
-        #     if bad:
-        #         raise ValueError(f"rows[{i}] tiene NULL en NOT NULL {bad}: {r}")
-
-        # ------------------------------------
-        values = [tuple(r[c] for c in cols) for r in rows]
-        return self._ejecutar_many(sql, values)
+        # generated_at lo rellena SQLite con DEFAULT datetime('now') al insertar
+        try:
+            self._upsert(
+                "SantiPrimitiva", rows, ("target_date", "signature"),
+                touch=("generated_at = datetime('now')",),
+            )
+        except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
+            print(f"Error al upsert de SantiPrimitiva: {e}")
+            return False
+        return self.registrar_premiados_primitiva(apuestas, [r["signature"] for r in rows])
 
     def upsert_santi_euromillones(
             self,
@@ -561,11 +933,6 @@ class DBManager:
         if not rows:
             return True
 
-        cols = list(rows[0].keys())
-        for r in rows[1:]:
-            if list(r.keys()) != cols:
-                raise ValueError("Estructura inconsistente en upsert_santi_euromillones")
-
         # claves críticas siempre presentes
         for i, r in enumerate(rows):
             if not r.get("target_date"):
@@ -573,22 +940,163 @@ class DBManager:
             if not r.get("signature"):
                 raise ValueError(f"rows[{i}] sin signature")
 
-        conflict_cols = "target_date, signature"
-        assert conflict_cols == "target_date, signature"
+        try:
+            self._upsert(
+                "SantiEuromillones", rows, ("target_date", "signature"),
+                touch=("generated_at = datetime('now')",),
+            )
+        except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
+            print(f"Error al upsert de SantiEuromillones: {e}")
+            return False
+        return self.registrar_premiados_euromillones(apuestas, [r["signature"] for r in rows])
+
+    # -----------------------------
+    # Apuestas que repiten un premio anterior (PremiadosPrimi / PremiadosEuro)
+    # -----------------------------
 
-        columns = ", ".join(cols)
-        placeholders = ", ".join(["?"] * len(cols))
+    def _asegurar_tablas_premiados(self) -> None:
+        """
+        Crea (una vez por proceso y base de datos) PremiadosPrimi / PremiadosEuro.
+        Lanza sqlite3.Error.
+        """
+        key = (str(self.db_path), PREMIADOSPRIMI)
+        if key in _FEATURES_READY:
+            return
+
+        # SorteosVersion y sus triggers (versión anterior del índice de premios): la
+        # huella sale ahora de HistoryFeaturesVersion (ver history_features.draws_version_sql)
+        obsoletos = "".join(
+            f"DROP TRIGGER IF EXISTS trg_{juego}_version_{op};\n"
+            for juego in PRIZE_GAMES
+            for op in ("i", "u", "d")
+        )
+        script = f"""
+            CREATE TABLE IF NOT EXISTS {PREMIADOSPRIMI} (
+              target_date  TEXT NOT NULL,
+              signature    TEXT NOT NULL,
+              combo_idx    INTEGER NOT NULL,
+              mask         INTEGER NOT NULL,
+              aciertos     INTEGER NOT NULL,
+              fecha_sorteo TEXT NOT NULL,
+              created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+              PRIMARY KEY (target_date, signature, combo_idx)
+            );
+
+            CREATE TABLE IF NOT EXISTS {PREMIADOSEURO} (
+              target_date  TEXT NOT NULL,
+              signature    TEXT NOT NULL,
+              combo_idx    INTEGER NOT NULL,
+              mask         INTEGER NOT NULL,
+              aciertos     INTEGER NOT NULL,
+              estrellas    INTEGER NOT NULL,
+              fecha_sorteo TEXT NOT NULL,
+              created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+              PRIMARY KEY (target_date, signature, combo_idx)
+            );
+
+{obsoletos}
+            DROP TABLE IF EXISTS SorteosVersion;
+        """
+
+        def crear(conn: sqlite3.Connection):
+            _crear_esquema(conn, [script], None)
+            return True
 
-        update_cols = [c for c in cols if c not in ("target_date", "signature")]
-        set_clause = ", ".join([f"{c}=excluded.{c}" for c in update_cols])
+        self._ejecutar(crear)
+        if not self._tx_depth:  # dentro de transaccion() aún puede deshacerse
+            _FEATURES_READY.add(key)
 
-        sql = f"""
-        INSERT INTO SantiEuromillones ({columns})
-        VALUES ({placeholders})
-        ON CONFLICT({conflict_cols}) DO UPDATE SET
-          {set_clause},
-          generated_at = datetime('now');
+    def _indice_premios(self, juego: str):
         """
+        PrizeIndex de todos los sorteos del juego. Se construye una vez por proceso y
+        base de datos y se reutiliza mientras no cambie la huella de la tabla de sorteos
+        (history_features.draws_version_sql). Lanza sqlite3.Error.
+        """
+        # import local: other_utils.weekly importa este módulo
+        from other_utils.weekly.prizes import PrizeIndex
+
+        k, columnas = PRIZE_GAMES[juego]
+        key = (str(self.db_path), juego)
+        con_huella = self._asegurar_history_features(juego)
+
+        def leer(conn: sqlite3.Connection):
+            huella = tuple(conn.execute(draws_version_sql(juego)).fetchone()) if con_huella else None
+            cached = _PRIZE_INDEX.get(key)
+            if huella is not None and cached is not None and cached[0] == huella:
+                return cached[1]
+            draws = conn.execute(f"SELECT fecha, {columnas} FROM {juego} ORDER BY fecha").fetchall()
+            index = PrizeIndex.from_records(draws, k=k)
+            if huella is not None:
+                _PRIZE_INDEX[key] = (huella, index)
+            return index
+
+        self._asegurar_tablas_premiados()
+        return self._ejecutar(leer)
+
+    def _olvidar_indices_premios(self) -> None:
+        """Tras un ROLLBACK: los índices pueden haberse construido con sorteos deshechos."""
+        for key in [key for key in _PRIZE_INDEX if key[0] == str(self.db_path)]:
+            _PRIZE_INDEX.pop(key, None)
+
+    def registrar_premiados_primitiva(
+            self,
+            apuestas: tuple[tuple[date, Apuesta_Primitiva], ...],
+            signatures: List[str],
+    ) -> bool:
+        """
+        Guarda en PremiadosPrimi las combinaciones de `apuestas` que ya salieron
+        con 6 o 5 aciertos en algún sorteo anterior (ver other_utils/weekly/prizes.py).
+        Dentro de transaccion() los errores se relanzan.
+        """
+        from other_utils.weekly.prizes import premiados_primitiva_rows
+
+        try:
+            rows = premiados_primitiva_rows(self._indice_premios("Primitiva"), apuestas, signatures)
+        except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
+            print(f"Error al registrar {PREMIADOSPRIMI}: {e}")
+            return False
+        if not rows:
+            return True
+        return self._ejecutar_many(f"""
+            INSERT INTO {PREMIADOSPRIMI}
+              (target_date, signature, combo_idx, mask, aciertos, fecha_sorteo)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(target_date, signature, combo_idx) DO UPDATE SET
+              aciertos = excluded.aciertos,
+              fecha_sorteo = excluded.fecha_sorteo;
+        """, rows)
+
+    def registrar_premiados_euromillones(
+            self,
+            apuestas: tuple[tuple[date, Apuesta_Euromillones], ...],
+            signatures: List[str],
+    ) -> bool:
+        """
+        Guarda en PremiadosEuro las combinaciones de `apuestas` cuyos números ya
+        salieron con 5 o 4 aciertos, con las estrellas acertadas (el mejor de esos
+        sorteos). Dentro de transaccion() los errores se relanzan.
+        """
+        from other_utils.weekly.prizes import premiados_euro_rows
 
-        values = [tuple(r[c] for c in cols) for r in rows]
-        return self._ejecutar_many(sql, values)
+        try:
+            rows = premiados_euro_rows(self._indice_premios("Euromillones"), apuestas, signatures)
+        except sqlite3.Error as e:
+            if self._tx_depth:
+                raise  # que transaccion() lo deshaga todo
+            print(f"Error al registrar {PREMIADOSEURO}: {e}")
+            return False
+        if not rows:
+            return True
+        return self._ejecutar_many(f"""
+            INSERT INTO {PREMIADOSEURO}
+              (target_date, signature, combo_idx, mask, aciertos, estrellas, fecha_sorteo)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(target_date, signature, combo_idx) DO UPDATE SET
+              aciertos = excluded.aciertos,
+              estrellas = excluded.estrellas,
+              fecha_sorteo = excluded.fecha_sorteo;
+        """, rows)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tablas HistoryFeatures* (una por juego): el JOIN sorteo + SorteoInfluencers
+ya hecho, con el bin lunar precalculado.
+
+  - clave primaria fecha y WITHOUT ROWID: la tabla está guardada en orden de fecha,
+    así que cargar el histórico es un recorrido secuencial sin ORDER BY ni JOIN
+  - la mantienen triggers sobre Primitiva / Euromillones / SorteoInfluencers
+    (INSERT, UPDATE y DELETE; los UPSERT disparan INSERT o UPDATE según el caso)
+  - solo hay fila cuando existen el sorteo y sus influencers (mismo criterio que el JOIN)
+
+DBManager crea tablas y triggers la primera vez (ver _asegurar_history_features) y
+rellena la tabla con el histórico existente si estaba recién creada.
+
+HistoryFeaturesVersion guarda un contador por juego que los triggers de la tabla de
+features incrementan en cada cambio: junto con COUNT(*) y MAX(fecha) identifica el
+contenido del histórico entre procesos (ver history_snapshot.py) y, con los sorteos
+que aún no tienen features, el de la tabla de sorteos (draws_version_sql, para el
+índice de premios). PRAGMA data_version no sirve para eso: es por conexión y no persiste.
+"""
+
+from __future__ import annotations
+
+from typing import Dict
+
+# juego -> (tabla de sorteos, tabla de features, columnas de números/extra)
+FEATURE_TABLES: Dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "Primitiva": (
+        "Primitiva", "HistoryFeaturesPrimitiva",
+        ("n1", "n2", "n3", "n4", "n5", "n6", "re"),
+    ),
+    "Euromillones": (
+        "Euromillones", "HistoryFeaturesEuromillones",
+        ("n1", "n2", "n3", "n4", "n5", "e1", "e2"),
+    ),
+}
+
+VERSION_TABLE = "HistoryFeaturesVersion"
+
+# mismo reparto que engine.moon_bin_8: 8 bins de 3.5, saturando en 0 y 7
+MOON_BIN_SQL = """
+  CASE
+    WHEN si.luna_phase_value IS NULL THEN NULL
+    WHEN si.luna_phase_value >= 28 THEN 7
+    WHEN si.luna_phase_value < 0 THEN 0
+    ELSE CAST(si.luna_phase_value / 3.5 AS INTEGER)
+  END
+"""
+
+
+def _select_sql(juego: str, where: str) -> str:
+    draws, _, cols = FEATURE_TABLES[juego]
+    cols_sql = ", ".join(f"d.{c}" for c in cols)
+    return f"""
+        SELECT d.fecha, {cols_sql},
+               si.temp_media, si.rhum_media, si.ahum_media, si.luna_phase_value,
+               {MOON_BIN_SQL}
+        FROM {draws} d
+        JOIN SorteoInfluencers si
+          ON si.fecha = d.fecha AND si.juego = '{juego}'
+        {where}"""
+
+
+def _insert_sql(juego: str, where: str) -> str:
+    _, features, cols = FEATURE_TABLES[juego]
+    return f"""
+        INSERT OR REPLACE INTO {features}
+          (fecha, {", ".join(cols)}, temp, rh, ah, luna, moon_bin)
+        {_select_sql(juego, where)};"""
+
+
+def create_sql(juego: str) -> str:
+    """Tabla + triggers de un juego (idempotente)."""
+    draws, features, cols = FEATURE_TABLES[juego]
+    cols_ddl = ", ".join(f"{c} INTEGER" for c in cols)
+    refresh = _insert_sql(juego, "WHERE d.fecha = NEW.fecha")
+    return f"""
+    CREATE TABLE IF NOT EXISTS {features} (
+      fecha    TEXT PRIMARY KEY,
+      {cols_ddl},
+      temp     REAL,
+      rh       REAL,
+      ah       REAL,
+      luna     REAL,
+      moon_bin INTEGER
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_draw_ai AFTER INSERT ON {draws}
+    BEGIN {refresh}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_draw_au AFTER UPDATE ON {draws}
+    BEGIN
+      DELETE FROM {features} WHERE fecha = OLD.fecha;{refresh}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_draw_ad AFTER DELETE ON {draws}
+    BEGIN
+      DELETE FROM {features} WHERE fecha = OLD.fecha;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_si_ai AFTER INSERT ON SorteoInfluencers
+    WHEN NEW.juego = '{juego}'
+    BEGIN {refresh}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_si_au AFTER UPDATE ON SorteoInfluencers
+    WHEN OLD.juego = '{juego}' OR NEW.juego = '{juego}'
+    BEGIN
+      DELETE FROM {features} WHERE fecha = OLD.fecha AND OLD.juego = '{juego}';{refresh}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_si_ad AFTER DELETE ON SorteoInfluencers
+    WHEN OLD.juego = '{juego}'
+    BEGIN
+      DELETE FROM {features} WHERE fecha = OLD.fecha;
+    END;
+
+    CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+      juego   TEXT PRIMARY KEY,
+      version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO {VERSION_TABLE} (juego, version) VALUES ('{juego}', 0);
+{_version_triggers(juego, features)}
+    """
+
+
+def _version_triggers(juego: str, features: str) -> str:
+    bump = f"UPDATE {VERSION_TABLE} SET version = version + 1 WHERE juego = '{juego}';"
+    return "".join(
+        f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{features}_version_{op[0].lower()} AFTER {op} ON {features}
+    BEGIN {bump} END;
+"""
+        for op in ("INSERT", "UPDATE", "DELETE")
+    )
+
+
+def backfill_sql(juego: str) -> str:
+    """Carga completa desde el JOIN (solo al crear la tabla)."""
+    return _insert_sql(juego, "")
+
+
+def load_sql(juego: str) -> str:
+    """Histórico en el orden de from_records: (fecha, números/extra, temp, rh, ah, luna, moon_bin)."""
+    _, features, cols = FEATURE_TABLES[juego]
+    return f"""
+        SELECT fecha, {", ".join(cols)}, temp, rh, ah, luna, moon_bin
+        FROM {features}
+        ORDER BY fecha"""
+
+
+def version_sql(juego: str) -> str:
+    """(version, filas, última fecha) de la tabla de features del juego."""
+    _, features, _ = FEATURE_TABLES[juego]
+    return f"""
+        SELECT v.version,
+               (SELECT COUNT(*) FROM {features}),
+               (SELECT MAX(fecha) FROM {features})
+        FROM {VERSION_TABLE} v
+        WHERE v.juego = '{juego}'"""
+
+
+def draws_version_sql(juego: str) -> str:
+    """
+    Huella de la tabla de sorteos del juego: (versión de features, filas, última fecha,
+    sorteos sin fila en features). Los sorteos con influencers ya los sigue la versión
+    (cualquier corrección rehace su fila de features); los que aún no los tienen (los
+    pendientes, pocos) van tal cual en la huella.
+    """
+    draws, features, cols = FEATURE_TABLES[juego]
+    row_sql = " || ',' || ".join(f"quote(d.{c})" for c in ("fecha", *cols))
+    return f"""
+        SELECT v.version,
+               (SELECT COUNT(*) FROM {draws}),
+               (SELECT MAX(fecha) FROM {draws}),
+               (SELECT group_concat({row_sql}, ';')
+                FROM {draws} d
+                WHERE NOT EXISTS (SELECT 1 FROM {features} f WHERE f.fecha = d.fecha))
+        FROM {VERSION_TABLE} v
+        WHERE v.juego = '{juego}'"""
+
+
+def join_sql(juego: str) -> str:
+    """Misma consulta sobre el JOIN, para bases de datos sin la tabla (p.ej. en solo lectura)."""
+    return _select_sql(juego, "ORDER BY d.fecha")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Instantánea binaria del histórico junto a la base de datos.
+
+  <db>.snapshot/<juego>-<clave>/<columna>.npy   (+ meta.json)
+
+La clave sale de (versión de HistoryFeatures, filas, MAX(fecha)) del juego: si el
+histórico cambia, cambia la clave y la instantánea vieja deja de encontrarse (y se
+borra al escribir la nueva). Las columnas se abren con np.load(mmap_mode='r'):
+arrancar la CLI o un worker de uvicorn mapea ficheros en lugar de parsear filas de
+SQLite, y todos los procesos comparten la misma caché de páginas del sistema.
+
+SANTILOTO_HISTORY_SNAPSHOT=0 la desactiva.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Optional, Sequence, Type
+
+import numpy as np
+
+from db_utils.history_store import HistArrays
+
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_enabled() -> bool:
+    return os.environ.get("SANTILOTO_HISTORY_SNAPSHOT", "1") != "0"
+
+
+def snapshot_dir(db_path) -> Path:
+    p = Path(db_path)
+    return p.with_name(p.name + ".snapshot")
+
+
+def _entry_name(juego: str, key: Sequence[Any]) -> str:
+    raw = json.dumps([SNAPSHOT_FORMAT, *key], default=str)
+    return f"{juego}-{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]}"
+
+
+def load_snapshot(db_path, juego: str, key: Sequence[Any], cls: Type[HistArrays]) -> Optional[HistArrays]:
+    """Histórico mapeado en memoria (solo lectura), o None si no hay instantánea para `key`."""
+    entry = snapshot_dir(db_path) / _entry_name(juego, key)
+    if not entry.is_dir():
+        return None
+    try:
+        return cls(**{f.name: np.load(entry / f"{f.name}.npy", mmap_mode="r") for f in fields(cls)})
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(db_path, juego: str, key: Sequence[Any], hist: HistArrays) -> bool:
+    """
+    Escribe la instantánea en un directorio temporal y lo renombra (atómico); después
+    borra las del mismo juego con otra clave. Los procesos que aún las tengan mapeadas
+    siguen leyendo sin problema (en POSIX el fichero vive hasta el último munmap).
+    """
+    if len(hist) == 0:
+        return False  # np.load no puede mapear un fichero vacío
+    base = snapshot_dir(db_path)
+    name = _entry_name(juego, key)
+    target = base / name
+    try:
+        base.mkdir(exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=base, prefix=f".{name}-"))
+        for f in fields(hist):
+            np.save(tmp / f"{f.name}.npy", np.ascontiguousarray(getattr(hist, f.name)))
+        (tmp / "meta.json").write_text(
+            json.dumps({"format": SNAPSHOT_FORMAT, "juego": juego, "key": list(key), "rows": len(hist)},
+                       default=str),
+            encoding="utf-8",
+        )
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # otro proceso la escribió antes: nos quedamos con la suya
+            shutil.rmtree(tmp, ignore_errors=True)
+    except OSError:
+        return False
+
+    for old in base.glob(f"{juego}-*"):
+        if old.name != name:
+            shutil.rmtree(old, ignore_errors=True)
+    return True
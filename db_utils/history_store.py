@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Histórico de sorteos + influencers en columnas (struct-of-arrays).
+
+Un único contenedor por juego, con arrays tipados en lugar de una dataclass por sorteo:
+  - fecha: datetime64[D]
+  - números/estrellas: uint8
+  - reintegro: int8 (-1 si el sorteo no tenía reintegro)
+  - meteo y luna: float32
+  - bin lunar (8 bins de 3.5): int8, -1 si no hay valor lunar
+
+Lo construye DBManager.load_history_* y lo consume directamente el motor semanal.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from typing import Any, Sequence, Union
+
+import numpy as np
+
+
+class _Columns:
+    """Operaciones comunes a los históricos en columnas."""
+
+    def __len__(self) -> int:
+        return len(self.fecha)
+
+    def select(self, sel):
+        """Nuevo histórico con las filas `sel` (slice -> vistas, índices -> copia)."""
+        return type(self)(**{f.name: getattr(self, f.name)[sel] for f in fields(self)})
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f.name).nbytes for f in fields(self))
+
+
+def _fechas(rows: Sequence[Sequence[Any]]) -> np.ndarray:
+    # SQLite devuelve 'YYYY-MM-DD' (o 'YYYY-MM-DD HH:MM:SS' si alguna vez se coló)
+    return np.array([str(r[0])[:10] for r in rows], dtype="datetime64[D]")
+
+
+def _matrix(rows: Sequence[Sequence[Any]], width: int) -> np.ndarray:
+    # resto de columnas numéricas en un solo bloque; los NULL quedan como NaN
+    if not rows:
+        return np.empty((0, width), dtype=np.float64)
+    return np.array([r[1:] for r in rows], dtype=np.float64).reshape(len(rows), -1)
+
+
+def _moon_bins(m: np.ndarray, luna_col: int) -> np.ndarray:
+    """
+    Columna moon_bin si viene en las filas (HistoryFeatures*); si no, se calcula
+    en float64 desde el valor lunar, igual que engine.moon_bin_8.
+    """
+    if m.shape[1] > luna_col + 1:
+        b = m[:, luna_col + 1]
+    else:
+        b = np.clip(np.floor_divide(m[:, luna_col], 3.5), 0, 7)
+    return np.where(np.isnan(b), -1, b).astype(np.int8)
+
+
+@dataclass(frozen=True, eq=False)
+class HistArraysPrimitiva(_Columns):
+    fecha: np.ndarray     # (N,) datetime64[D]
+    nums: np.ndarray      # (N, 6) uint8
+    re: np.ndarray        # (N,) int8, -1 si el sorteo no tenía reintegro
+    temp: np.ndarray      # (N,) float32
+    rh: np.ndarray        # (N,) float32
+    ah: np.ndarray        # (N,) float32
+    moon_val: np.ndarray  # (N,) float32
+    moon_bin: np.ndarray  # (N,) int8
+
+    @classmethod
+    def from_records(cls, rows: Sequence[Sequence[Any]]) -> HistArraysPrimitiva:
+        """
+        Filas (fecha, n1..n6, re, temp, rh, ah, luna[, moon_bin]) tal como salen de SQLite.
+        """
+        m = _matrix(rows, 11)
+        re = m[:, 6]
+        return cls(
+            fecha=_fechas(rows),
+            nums=m[:, 0:6].astype(np.uint8),
+            re=np.where(np.isnan(re), -1, re).astype(np.int8),
+            temp=m[:, 7].astype(np.float32),
+            rh=m[:, 8].astype(np.float32),
+            ah=m[:, 9].astype(np.float32),
+            moon_val=m[:, 10].astype(np.float32),
+            moon_bin=_moon_bins(m, 10),
+        )
+
+
+@dataclass(frozen=True, eq=False)
+class HistArraysEuro(_Columns):
+    fecha: np.ndarray     # (N,) datetime64[D]
+    nums: np.ndarray      # (N, 5) uint8
+    stars: np.ndarray     # (N, 2) uint8
+    temp: np.ndarray      # (N,) float32
+    rh: np.ndarray        # (N,) float32
+    ah: np.ndarray        # (N,) float32
+    moon_val: np.ndarray  # (N,) float32
+    moon_bin: np.ndarray  # (N,) int8
+
+    @classmethod
+    def from_records(cls, rows: Sequence[Sequence[Any]]) -> HistArraysEuro:
+        """
+        Filas (fecha, n1..n5, e1, e2, temp, rh, ah, luna[, moon_bin]) tal como salen de SQLite.
+        """
+        m = _matrix(rows, 11)
+        return cls(
+            fecha=_fechas(rows),
+            nums=m[:, 0:5].astype(np.uint8),
+            stars=m[:, 5:7].astype(np.uint8),
+            temp=m[:, 7].astype(np.float32),
+            rh=m[:, 8].astype(np.float32),
+            ah=m[:, 9].astype(np.float32),
+            moon_val=m[:, 10].astype(np.float32),
+            moon_bin=_moon_bins(m, 10),
+        )
+
+
+HistArrays = Union[HistArraysPrimitiva, HistArraysEuro]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cola de sorteos pendientes de SorteoInfluencers (tabla InfluencersPendientes).
+
+Una fila (juego, fecha, ciudad) por sorteo de Primitiva / Euromillones que todavía no
+tiene influencers. La mantienen triggers:
+  - alta de sorteo (o cambio de fecha)  -> entra en la cola si no tiene influencers
+  - alta de influencers                 -> sale de la cola
+  - baja de influencers / de sorteo     -> vuelve a la cola / sale de ella
+
+obtener_fechas_pendientes_influencers lee la cola en lugar de cruzar las dos tablas
+de sorteos con SorteoInfluencers: sin sorteos nuevos es una consulta sobre una tabla
+vacía. Las fechas cuyo clima no se pudo descargar siguen en la cola hasta que se
+consigan, igual que antes.
+
+DBManager crea tabla y triggers la primera vez (ver _asegurar_cola_influencers) y la
+rellena con la consulta de siempre si estaba recién creada.
+"""
+
+from __future__ import annotations
+
+from typing import Dict
+
+QUEUE_TABLE = "InfluencersPendientes"
+
+# juego -> (tabla de sorteos, ciudad de SorteoInfluencers)
+QUEUE_GAMES: Dict[str, tuple[str, str]] = {
+    "Primitiva": ("Primitiva", "Madrid"),
+    "Euromillones": ("Euromillones", "Paris"),
+}
+
+
+def _enqueue(juego: str, fecha: str) -> str:
+    draws, ciudad = QUEUE_GAMES[juego]
+    return f"""
+      INSERT OR IGNORE INTO {QUEUE_TABLE} (juego, fecha, ciudad)
+      SELECT '{juego}', d.fecha, '{ciudad}'
+      FROM {draws} d
+      WHERE d.fecha = {fecha}
+        AND NOT EXISTS (
+          SELECT 1 FROM SorteoInfluencers si WHERE si.juego = '{juego}' AND si.fecha = d.fecha
+        );"""
+
+
+def _dequeue(juego: str, fecha: str) -> str:
+    return f"""
+      DELETE FROM {QUEUE_TABLE} WHERE juego = '{juego}' AND fecha = {fecha};"""
+
+
+def create_sql(juego: str) -> str:
+    """Triggers de un juego (y la tabla, idempotente)."""
+    draws, _ = QUEUE_GAMES[juego]
+    t = f"trg_{QUEUE_TABLE}_{juego}"
+    return f"""
+    CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+      juego  TEXT NOT NULL,
+      fecha  DATE NOT NULL,
+      ciudad TEXT NOT NULL,
+      PRIMARY KEY (juego, fecha)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_draw_ai AFTER INSERT ON {draws}
+    BEGIN {_enqueue(juego, "NEW.fecha")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_draw_au AFTER UPDATE OF fecha ON {draws}
+    WHEN OLD.fecha IS NOT NEW.fecha
+    BEGIN {_dequeue(juego, "OLD.fecha")}{_enqueue(juego, "NEW.fecha")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_draw_ad AFTER DELETE ON {draws}
+    BEGIN {_dequeue(juego, "OLD.fecha")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_si_ai AFTER INSERT ON SorteoInfluencers
+    WHEN NEW.juego = '{juego}'
+    BEGIN {_dequeue(juego, "NEW.fecha")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_si_au AFTER UPDATE OF juego, fecha ON SorteoInfluencers
+    WHEN (OLD.juego = '{juego}' OR NEW.juego = '{juego}')
+     AND (OLD.juego IS NOT NEW.juego OR OLD.fecha IS NOT NEW.fecha)
+    BEGIN
+      DELETE FROM {QUEUE_TABLE} WHERE juego = NEW.juego AND fecha = NEW.fecha;{_enqueue(juego, "OLD.fecha")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS {t}_si_ad AFTER DELETE ON SorteoInfluencers
+    WHEN OLD.juego = '{juego}'
+    BEGIN {_enqueue(juego, "OLD.fecha")}
+    END;
+    """
+
+
+# La consulta de siempre: sorteos sin fila en SorteoInfluencers
+PENDING_JOIN_SQL = """
+    SELECT s.juego, s.fecha, s.ciudad
+    FROM (
+      SELECT 'Primitiva' AS juego, fecha, 'Madrid' AS ciudad FROM Primitiva
+      UNION ALL
+      SELECT 'Euromillones' AS juego, fecha, 'Paris'  AS ciudad FROM Euromillones
+    ) s
+    LEFT JOIN SorteoInfluencers si
+      ON si.juego = s.juego AND si.fecha = s.fecha
+    WHERE si.fecha IS NULL
+    ORDER BY s.fecha, s.juego DESC"""
+
+
+def backfill_sql() -> str:
+    """Carga inicial de la cola (solo al crear la tabla)."""
+    return f"INSERT OR IGNORE INTO {QUEUE_TABLE} (juego, fecha, ciudad) {PENDING_JOIN_SQL};"
+
+
+# Mismo orden que PENDING_JOIN_SQL (a igual fecha, Primitiva antes que Euromillones)
+PENDING_SQL = f"""
+    SELECT juego, fecha, ciudad
+    FROM {QUEUE_TABLE}
+    ORDER BY fecha, juego DESC"""
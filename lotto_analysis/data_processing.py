@@ -4,7 +4,7 @@
 # lotto_analysis/data_processing.py
 import pandas as pd
 from db_utils.db_management import DBManager
-from other_utils.fase_lunar import obtener_fase_lunar, get_whole_week_moon_phase
+from other_utils.fase_lunar import obtener_fases_lunares, get_whole_week_moon_phase
 from constants import PRIMITIVA, EUROMILLONES, Q_RESULTADOS
 
 def load_primitiva_data(db_manager: DBManager):
@@ -38,7 +38,9 @@ def load_primitiva_data(db_manager: DBManager):
             value_name='numero'
        )
         df_primitiva_largo['fecha'] = pd.to_datetime(df_primitiva_largo['fecha'])
-        df_primitiva_largo['fase_lunar'] = df_primitiva_largo['fecha'].apply(obtener_fase_lunar)
+        # texto, no Categorical: en pandas 2 los groupby por fase_lunar sacarían también
+        # las fases no observadas (observed=False)
+        df_primitiva_largo['fase_lunar'] = obtener_fases_lunares(df_primitiva_largo['fecha'])[1].astype(object)
         return df_primitiva_largo
 
     except Exception as e:
@@ -73,7 +75,8 @@ def load_euromillones_data(db_manager: DBManager):
                 value_name='numero'
             )
             df_numeros['fecha'] = pd.to_datetime(df_numeros['fecha'])
-            df_numeros['fase_lunar'] = df_numeros['fecha'].apply(obtener_fase_lunar)
+            # texto, no Categorical (ver load_primitiva_data)
+            df_numeros['fase_lunar'] = obtener_fases_lunares(df_numeros['fecha'])[1].astype(object)
 
             # # --- DataFrame para las estrellas ---
             # estrellas_cols = ['e1', 'e2']
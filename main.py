@@ -71,8 +71,8 @@ def main():
     print(format_weekly(apuestas_semanales))
     print("===WEEKLY_RESULT_END===")
 
-    with loto_db as db:
-        # weekly ya calculado
+    with loto_db as db, db.transaccion():
+        # weekly ya calculado: las dos tablas (y sus premiados) en un solo COMMIT
         db.upsert_santi_primitiva(
             apuestas_semanales.apuestas_primitiva,
             week_start=week_start, week_end=week_end,
@@ -84,6 +84,9 @@ def main():
             tol_frac=tol_e, method_version="v1", city="Paris"
         )
 
+    for tabla, res in loto_db.upsert_stats.items():
+        print(f"{tabla}: {res.inserted} nuevas, {res.updated} actualizadas")
+
     return 0
 
 
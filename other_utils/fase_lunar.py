@@ -1,6 +1,14 @@
 from datetime import datetime, timedelta
 
-from astral import moon
+import numpy as np
+import pandas as pd
+
+from other_utils.lunar_table import lunar_phase, lunar_phases, PHASE_LABELS
+
+# Categorías en orden alfabético: agrupar / ordenar por la columna da el mismo
+# resultado que con las cadenas de obtener_fase_lunar.
+FASES_CATEGORIAS = sorted(PHASE_LABELS)
+_CODIGO_FASE = np.array([FASES_CATEGORIAS.index(f) for f in PHASE_LABELS], dtype=np.int8)
 
 
 def obtener_valor_fase_lunar(fecha: datetime) -> float:
@@ -13,7 +21,8 @@ def obtener_valor_fase_lunar(fecha: datetime) -> float:
     Returns:
         str: El nombre de la fase lunar.
     """
-    moon_phase = moon.phase(fecha)
+    # astral.moon.phase, servido desde la tabla precalculada (ver lunar_table.py)
+    moon_phase = lunar_phase(fecha)
 
     return round(moon_phase, 3)
 
@@ -28,23 +37,47 @@ def obtener_fase_lunar(fecha: datetime) -> str:
     Returns:
         str: El nombre de la fase lunar.
     """
-    moon_phase = moon.phase(fecha)
+    moon_phase = lunar_phase(fecha)
 
 
     # Convertir la elongación en un nombre de fase
     if 0.0 <= moon_phase < 7.0:
-        return "Luna Nueva"
+        return PHASE_LABELS[0]
     elif 7.0 <= moon_phase < 14.0:
-        return "Cuarto Creciente"
+        return PHASE_LABELS[1]
     elif 14.0 <= moon_phase < 21.0:
-        return "Luna Llena"
+        return PHASE_LABELS[2]
     elif 21.0 <= moon_phase < 28.0:
-        return "Cuarto Menguante"
+        return PHASE_LABELS[3]
     else:  # Valor inesperado de moon.phase
         print(f"Error. No se ha podido obtener la fase de la luna. Moon.phase{fecha}: {moon_phase}")
         raise ValueError
 
 
+def obtener_fases_lunares(fechas) -> tuple[np.ndarray, pd.Categorical]:
+    """
+    Versión vectorizada de obtener_valor_fase_lunar / obtener_fase_lunar para un array
+    de fechas (datetime64, Series de pandas...).
+
+    Args:
+        fechas: Las fechas para las que se desea obtener la fase lunar.
+
+    Returns:
+        tuple: (valores de moon.phase sin redondear, nombres de la fase como
+        pd.Categorical). Las fechas nulas dan NaN.
+    """
+    fases = lunar_phases(fechas)
+    validas = ~np.isnan(fases)
+    fuera = validas & ~((fases >= 0.0) & (fases < 28.0))
+    if fuera.any():  # Valor inesperado de moon.phase
+        print(f"Error. No se ha podido obtener la fase de la luna. Moon.phase: {fases[fuera][:5]}")
+        raise ValueError
+
+    codigos = np.full(fases.shape, -1, dtype=np.int8)
+    codigos[validas] = _CODIGO_FASE[(fases[validas] // 7.0).astype(np.intp)]
+    return fases, pd.Categorical.from_codes(codigos, categories=FASES_CATEGORIAS)
+
+
 def get_whole_week_moon_phase(week_number:None | int=None, year:None | int=None) -> dict:
     """
     Devuelve un diccionario con la fase lunar de cada día de la semana correspondiente al año y número de semana
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import logging
+import threading
 from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta
-from typing import Literal #, Optional
+from typing import Iterable, Literal #, Optional
 
 import numpy as np
-# import pandas as pd
+import pandas as pd
 import meteostat as ms
 
+from other_utils.meteostat_cache import HourlyMonth, load_month, save_month, month_bounds, offline
+from other_utils.station_coverage import get_coverage
+
+log = logging.getLogger(__name__)
 
 City = Literal["MADRID", "PARIS"]
 
@@ -63,6 +69,26 @@ class MeteostatDataError(RuntimeError):
     pass
 
 
+# -----------------------------
+# Concurrencia por estación
+# -----------------------------
+# El sync de influencers pide muchas fechas en paralelo; casi todas van a la misma
+# estación principal. Se limita cuántas peticiones simultáneas recibe cada estación.
+STATION_CONCURRENCY = 2
+
+_station_slots: dict[str, threading.BoundedSemaphore] = {}
+_station_slots_lock = threading.Lock()
+
+
+def station_slot(station_id: str) -> threading.BoundedSemaphore:
+    """Semáforo (compartido por todos los hilos) de la estación `station_id`."""
+    with _station_slots_lock:
+        sem = _station_slots.get(station_id)
+        if sem is None:
+            sem = _station_slots[station_id] = threading.BoundedSemaphore(STATION_CONCURRENCY)
+        return sem
+
+
 # -----------------------------
 # Utilidades internas
 # -----------------------------
@@ -94,19 +120,207 @@ def _absolute_humidity_g_m3(temp_c: np.ndarray, rh_pct: np.ndarray) -> np.ndarra
     return 216.7 * e / (temp_c + 273.15)
 
 
+def _time_index(df: pd.DataFrame) -> pd.DatetimeIndex:
+    """Índice temporal de un DataFrame de Meteostat (con o sin nivel 'station')."""
+    if isinstance(df.index, pd.MultiIndex):
+        return pd.DatetimeIndex(df.index.get_level_values("time"))
+    return pd.DatetimeIndex(df.index)
+
+
+def _state(temp_c: float, rh_pct: float, abs_h: float) -> DailyAtmosphericState:
+    return DailyAtmosphericState(
+        temp_c=round(float(temp_c), 2),
+        rh_pct=round(float(rh_pct), 2),
+        abs_humidity_g_m3=round(float(abs_h), 3),
+    )
+
+
 # -----------------------------
-# API pública
+# Ventana de tarde (18:00–23:59)
 # -----------------------------
+EVENING_HOURS = (18, 23)   # horas (inclusive) que entran en la media del día
+
+# Valor de SorteoInfluencers.method para las medias de esta ventana. Las filas con
+# "hourly_mean_18_23" (sin sufijo) se calcularon con fin = día siguiente 00:00, y
+# Meteostat (fin inclusivo) metía también esa observación de medianoche en la media.
+# Para recalcularlas con la ventana actual: DBManager.sync_sorteo_influencers(recalcular=True)
+# (o scripts/backfill_influencers_method.py).
+EVENING_METHOD = "hourly_mean_18_23_v2"
+
+
 def _day_bounds_evening(d: date) -> tuple[datetime, datetime]:
     """
     Ventana 18:00..23:59 del día d.
-    En Meteostat usamos end exclusivo, así que ponemos end = día siguiente 00:00.
+    Meteostat filtra con end inclusivo (time <= end): con end = día siguiente 00:00 se
+    colaba la observación de medianoche, así que el fin es 23:59 (última hora: 23:00).
     """
-    start = datetime.combine(d, time(18, 0, 0))
-    end = datetime.combine(d + timedelta(days=1), time(0, 0, 0))
+    start = datetime.combine(d, time(EVENING_HOURS[0], 0, 0))
+    end = datetime.combine(d, time(EVENING_HOURS[1], 59, 0))
     return start, end
 
 
+def _download_hourly(station_id: str, start: datetime, end: datetime) -> HourlyMonth:
+    """Petición a Meteostat (temp, rhum); sin datos -> serie vacía."""
+    if offline():
+        raise MeteostatDataError(f"offline: {station_id} {start:%Y-%m-%d}..{end:%Y-%m-%d} no está en caché")
+
+    with station_slot(station_id):
+        df = ms.hourly(station_id, start, end).fetch(fill=True)
+
+    if df is None or df.empty:
+        return HourlyMonth.empty()
+    t = _time_index(df).values.astype("datetime64[h]")
+    nan = np.full(len(df), np.nan)
+    # Sin temp o sin rhum la estación no sirve: columnas a NaN
+    temp = df["temp"].to_numpy(dtype=np.float64) if "temp" in df.columns else nan
+    rhum = df["rhum"].to_numpy(dtype=np.float64) if "rhum" in df.columns else nan
+    return HourlyMonth(t, temp, rhum)
+
+
+def months_between(start: date, end: date) -> list[tuple[int, int]]:
+    """(año, mes) de cada mes entre start y end (inclusive)."""
+    out = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def _month_slice(data: HourlyMonth, year: int, month: int) -> HourlyMonth:
+    lo, hi = month_bounds(year, month)
+    sel = (data.time >= np.datetime64(lo, "h")) & (data.time < np.datetime64(hi + timedelta(days=1), "h"))
+    return HourlyMonth(data.time[sel], data.temp[sel], data.rhum[sel])
+
+
+def fetch_hourly(station_id: str, start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Serie horaria (temp, rhum) de una estación entre start y end (inclusive).
+    Va mes a mes por la caché en disco (ver meteostat_cache.py); los meses que faltan
+    se piden a Meteostat en una sola petición y se guardan completos.
+    """
+    months = months_between(start.date(), end.date())
+    parts: dict[tuple[int, int], HourlyMonth] = {}
+    for ym in months:
+        cached = load_month(station_id, *ym)
+        if cached is not None:
+            parts[ym] = cached
+
+    missing = [ym for ym in months if ym not in parts]
+    if missing:
+        lo = month_bounds(*missing[0])[0]
+        hi = month_bounds(*missing[-1])[1]
+        got = _download_hourly(station_id, datetime.combine(lo, time(0, 0)), datetime.combine(hi, time(23, 59)))
+        for ym in missing:
+            parts[ym] = _month_slice(got, *ym)
+            save_month(station_id, *ym, parts[ym])
+
+    cov = get_coverage(EVENING_HOURS)
+    if cov is not None:
+        for ym in months:
+            if not cov.known(station_id, *ym):
+                cov.record(station_id, *ym, parts[ym])
+
+    t = np.concatenate([parts[ym].time for ym in months])
+    sel = (t >= np.datetime64(start, "m")) & (t <= np.datetime64(end, "m"))
+    if not sel.any():
+        raise MeteostatDataError("Empty dataframe")
+    return pd.DataFrame(
+        {
+            "temp": np.concatenate([parts[ym].temp for ym in months])[sel],
+            "rhum": np.concatenate([parts[ym].rhum for ym in months])[sel],
+        },
+        index=pd.DatetimeIndex(t[sel], name="time"),
+    )
+
+
+def evening_means(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Medias de la ventana de tarde de cada día de una serie horaria, sin redondear.
+    Índice: date; columnas temp, rhum, ahum. Los días sin ninguna hora con temp y
+    rhum a la vez no aparecen.
+    """
+    t = _time_index(df)
+    hours = np.asarray(t.hour)
+    in_window = (hours >= EVENING_HOURS[0]) & (hours <= EVENING_HOURS[1])
+
+    # Alinear y limpiar conjuntamente (misma regla que la media diaria)
+    obs = pd.DataFrame(
+        {"temp": df["temp"].to_numpy(dtype=np.float64), "rhum": df["rhum"].to_numpy(dtype=np.float64)},
+        index=t,
+    )[in_window].dropna()
+    obs["ahum"] = _absolute_humidity_g_m3(obs["temp"].to_numpy(), obs["rhum"].to_numpy())
+
+    means = obs.groupby(obs.index.date).mean()
+    means.index.name = "date"
+    return means
+
+
+def year_ranges(start: date, end: date) -> list[tuple[date, date]]:
+    """Trozos [start, end] que no cruzan de año (una petición por estación y trozo)."""
+    out = []
+    y = start.year
+    while y <= end.year:
+        out.append((max(start, date(y, 1, 1)), min(end, date(y, 12, 31))))
+        y += 1
+    return out
+
+
+# -----------------------------
+# API pública
+# -----------------------------
+def get_evening_states(
+    city: City,
+    dates: Iterable[date],
+) -> dict[date, tuple[DailyAtmosphericState, str]]:
+    """
+    Versión por lotes de get_daily_atmospheric_state: estado atmosférico (18:00–23:59)
+    de cada fecha de `dates` (p.ej. los sorteos pendientes) con una petición por
+    estación y año.
+
+    Las estaciones se recorren en el orden de CITY_STATIONS y cada fecha se queda con
+    la primera que tenga datos, igual que en la consulta diaria. Solo se buscan las
+    fechas pedidas: un hueco en un día sin sorteo no hace bajar a la siguiente
+    estación. Las fechas sin ninguna estación útil no aparecen en el resultado. Las
+    estaciones que según el índice de cobertura no tienen datos para ninguna de las
+    fechas que faltan ni se piden.
+    """
+    if city not in CITY_STATIONS:
+        raise ValueError(f"city must be one of {list(CITY_STATIONS.keys())}")
+
+    por_anio: dict[int, set[date]] = {}
+    for d in dates:
+        por_anio.setdefault(d.year, set()).add(d)
+
+    cov = get_coverage(EVENING_HOURS)
+    out: dict[date, tuple[DailyAtmosphericState, str]] = {}
+    for year in sorted(por_anio):
+        missing = por_anio[year]
+        for station_id in CITY_STATIONS[city]:
+            wanted = [d for d in missing if cov is None or cov.covers(station_id, d) is not False]
+            if not wanted:
+                continue
+            first, last = min(wanted), max(wanted)
+            try:
+                df = fetch_hourly(station_id, _day_bounds_evening(first)[0], _day_bounds_evening(last)[1])
+            except MeteostatDataError as e:
+                log.info("Meteostat %s %s (%s): sin datos: %s", station_id, year, city, e)
+                continue
+            except Exception as e:
+                log.warning("Meteostat %s %s (%s) falló: %r", station_id, year, city, e)
+                continue
+            means = evening_means(df)
+            for d, temp_c, rh_pct, abs_h in zip(means.index, means["temp"], means["rhum"], means["ahum"]):
+                if d in missing:
+                    out[d] = (_state(temp_c, rh_pct, abs_h), station_id)
+                    missing.discard(d)
+            if not missing:
+                break
+    if cov is not None:
+        cov.save()
+    return dict(sorted(out.items()))
+
+
 def get_daily_atmospheric_state(
     d: date,
     city: City,
@@ -119,6 +333,7 @@ def get_daily_atmospheric_state(
       - humedad absoluta media (g/m³)
 
     Además devuelve el station_id finalmente utilizado.
+    Para muchas fechas seguidas es mucho más barato get_evening_states().
     """
     if city not in CITY_STATIONS:
         raise ValueError(f"city must be one of {list(CITY_STATIONS.keys())}")
@@ -126,41 +341,31 @@ def get_daily_atmospheric_state(
     start, end = _day_bounds_evening(d)
 
     last_err: Exception | None = None
+    cov = get_coverage(EVENING_HOURS)
 
     for station_id in CITY_STATIONS[city]:
+        if cov is not None and cov.covers(station_id, d) is False:
+            last_err = MeteostatDataError(f"{station_id} sin cobertura (índice)")
+            continue
         try:
-            ts = ms.hourly(station_id, start, end)
-            df = ts.fetch(fill=True)
-
-            if df is None or df.empty:
-                raise MeteostatDataError("Empty dataframe")
-
-            # Necesitamos temp y rhum
-            if "temp" not in df.columns or "rhum" not in df.columns:
-                raise MeteostatDataError("Missing temp/rhum")
-
-            # Alinear y limpiar conjuntamente para evitar broadcast
-            df2 = df[["temp", "rhum"]].dropna()
-            if df2.empty:
+            df = fetch_hourly(station_id, start, end)
+            means = evening_means(df)
+            if d not in means.index:
                 raise MeteostatDataError("No overlapping temp/rhum data")
 
-            temp_mean = float(df2["temp"].mean())
-            rh_mean = float(df2["rhum"].mean())
-
-            # humedad absoluta (vector) y media
-            abs_h = _absolute_humidity_g_m3(df2["temp"].to_numpy(), df2["rhum"].to_numpy())
-            abs_h_mean = float(np.mean(abs_h))
-
-            state = DailyAtmosphericState(
-                temp_c=round(temp_mean, 2),
-                rh_pct=round(rh_mean, 2),
-                abs_humidity_g_m3=round(abs_h_mean, 3),
-            )
-            return state, station_id
+            m = means.loc[d]
+            if cov is not None:
+                cov.save()
+            return _state(m["temp"], m["rhum"], m["ahum"]), station_id
 
+        except MeteostatDataError as e:
+            last_err = e
+            continue
         except Exception as e:
+            log.warning("Meteostat %s %s (%s) falló: %r", station_id, d.isoformat(), city, e)
             last_err = e
             continue
 
+    if cov is not None:
+        cov.save()
     raise MeteostatDataError(f"No usable station for {city} on {d.isoformat()}: {last_err}")
-
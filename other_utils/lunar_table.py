@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tabla precalculada de la fase lunar de astral (moon.phase) por día.
+
+astral calcula la elongación Sol-Luna, la trunca a grados enteros y de ahí saca la
+fase: phase = (elong + 6.43) / 360 * 28 (menos 28 si se pasa). La tabla guarda esa
+elongación entera (int16) de cada día a las 00:00 de LUNAR_SPAN y reconstruye la fase
+con las mismas operaciones, así que el resultado es idéntico bit a bit al de
+moon.phase (se comprueba contra astral al construirla).
+
+  <SANTILOTO_LUNAR_TABLE_DIR o ~/.cache/santiloto>/lunar-phase-<inicio>-<fin>-v1.npy
+
+Se calcula la primera vez que se usa y después se lee del fichero. Fechas fuera del
+rango, o datetimes con hora distinta de 00:00 (astral usa la fracción del día),
+se calculan al vuelo: una a una con astral (lunar_phase) o con astral_phases, el
+mismo algoritmo de astral escrito en NumPy para arrays de fechas.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from astral import moon
+
+LUNAR_TABLE_FORMAT = 1
+LUNAR_SPAN = (date(1980, 1, 1), date(2100, 12, 31))
+
+PHASE_LABELS = ("Luna Nueva", "Cuarto Creciente", "Luna Llena", "Cuarto Menguante")
+
+Fecha = Union[date, datetime]
+
+_table: Optional[np.ndarray] = None
+_phases: Optional[np.ndarray] = None          # fase float64 de cada día (de _table)
+_phases_list: Optional[list[float]] = None    # lo mismo como lista, para consultas sueltas
+_table_lock = threading.Lock()
+
+
+def _phase_from_elong(elong: np.ndarray) -> np.ndarray:
+    """Mismas operaciones (y en el mismo orden) que astral.moon._phase_asfloat + phase."""
+    p = ((elong.astype(np.float64) + 6.43) / 360) * 28
+    return np.where(p >= 28.0, p - 28.0, p)
+
+
+# -----------------------------
+# astral.moon.phase en NumPy
+# -----------------------------
+
+# Si la elongación cae a menos de esto de un grado entero, un seno que difiera en el
+# último bit podría cambiar el truncado: esas fechas (no sale ninguna entre 1900 y
+# 2200) se recalculan con astral.
+_ELONG_EDGE = 1e-9
+
+
+def _julianday(t: np.ndarray) -> np.ndarray:
+    """astral.julian.julianday (gregoriano) de un array datetime64[s]."""
+    year = t.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = (t.astype("datetime64[M]") - t.astype("datetime64[Y]")).astype(np.int64) + 1
+    day = (t.astype("datetime64[D]") - t.astype("datetime64[M]")).astype(np.int64) + 1
+    seconds = (t - t.astype("datetime64[D]")).astype(np.int64)
+
+    jan_feb = month <= 2
+    year = np.where(jan_feb, year - 1, year)
+    month = np.where(jan_feb, month + 12, month)
+    a = np.trunc(year / 100)
+    b = 2 - a + np.trunc(a / 4)
+    return (
+        np.trunc(365.25 * (year + 4716))
+        + np.trunc(30.6001 * (month + 1))
+        + day
+        + seconds / 86400
+        + b
+        - 1524.5
+    )
+
+
+def _elongation(jd: np.ndarray) -> np.ndarray:
+    """astral.moon._phase_asfloat hasta antes de truncar: elongación en [0, 360)."""
+    dt = np.power(jd - 2382148, 2) / (41048480 * 86400)
+    t = (jd + dt - 2451545.0) / 36525
+    t2 = np.power(t, 2)
+    t3 = np.power(t, 3.0)
+
+    d = np.radians((297.85 + (445267.1115 * t) - (0.0016300 * t2) + (t3 / 545868)) % 360.0)
+    m = np.radians((357.53 + (35999.0503 * t)) % 360.0)
+    m1 = np.radians((134.96 + (477198.8676 * t) + (0.0089970 * t2) + (t3 / 69699)) % 360.0)
+
+    elong = np.degrees(d) + 6.29 * np.sin(m1)
+    elong -= 2.10 * np.sin(m)
+    elong += 1.27 * np.sin(2 * d - m1)
+    elong += 0.66 * np.sin(2 * d)
+    return elong % 360.0
+
+
+def astral_phases(fechas) -> np.ndarray:
+    """
+    moon.phase de un array de fechas (datetime64 o convertible), float64 sin redondear,
+    con la misma aritmética que astral (resultado idéntico). NaT -> NaN.
+    """
+    t = np.asarray(fechas, dtype="datetime64[s]")
+    valid = ~np.isnat(t)
+    out = np.full(t.shape, np.nan)
+    if not valid.any():
+        return out
+
+    tv = t[valid]
+    elong = _elongation(_julianday(tv))
+    phases = _phase_from_elong(np.trunc(elong))
+
+    frac = elong - np.floor(elong)
+    edge = np.flatnonzero((frac < _ELONG_EDGE) | (frac > 1 - _ELONG_EDGE))
+    for i in edge.tolist():
+        phases[i] = moon.phase(tv[i].astype(datetime))
+
+    out[valid] = phases
+    return out
+
+
+# -----------------------------
+# Tabla
+# -----------------------------
+
+def build_phase_table(start: date, end: date) -> np.ndarray:
+    """
+    Elongación entera (int16) de cada día entre start y end (inclusive). Se calcula
+    con astral_phases y se comprueba día a día contra astral.moon.phase (una vez,
+    antes de guardarla: ~0.3 s para LUNAR_SPAN).
+    """
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + np.timedelta64(1, "D"))
+    elong = np.rint(astral_phases(days) * 360 / 28 - 6.43).astype(np.int64) % 360
+    expected = np.array([moon.phase(d) for d in days.astype(date).tolist()], dtype=np.float64)
+    if not np.array_equal(_phase_from_elong(elong), expected):
+        raise RuntimeError("La tabla lunar no reproduce astral.moon.phase")
+    return elong.astype(np.int16)
+
+
+def lunar_table_path(start: date = LUNAR_SPAN[0], end: date = LUNAR_SPAN[1]) -> Path:
+    raw = os.environ.get("SANTILOTO_LUNAR_TABLE_DIR")
+    base = Path(raw) if raw else Path.home() / ".cache" / "santiloto"
+    return base / f"lunar-phase-{start:%Y%m%d}-{end:%Y%m%d}-v{LUNAR_TABLE_FORMAT}.npy"
+
+
+def _load_or_build() -> np.ndarray:
+    start, end = LUNAR_SPAN
+    path = lunar_table_path(start, end)
+    n = (end - start).days + 1
+    try:
+        table = np.load(path)
+        if table.shape == (n,) and table.dtype == np.int16:
+            return table
+    except (OSError, ValueError):
+        pass
+
+    table = build_phase_table(start, end)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".lunar-", suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # sin caché en disco: la tabla vive solo en memoria
+    return table
+
+
+def phase_table() -> np.ndarray:
+    """Elongaciones de LUNAR_SPAN (se carga o calcula una vez por proceso)."""
+    global _table, _phases, _phases_list
+    with _table_lock:
+        if _table is None:
+            _table = _load_or_build()
+            _phases = _phase_from_elong(_table)
+            _phases_list = _phases.tolist()
+        return _table
+
+
+def _phase_values() -> tuple[np.ndarray, list[float]]:
+    if _phases_list is None:
+        phase_table()
+    return _phases, _phases_list
+
+
+# -----------------------------
+# Consultas
+# -----------------------------
+
+def _midnight(fecha: Fecha) -> bool:
+    if isinstance(fecha, datetime):
+        t = fecha.time()
+        return t.hour == 0 and t.minute == 0 and t.second == 0
+    return True
+
+
+def lunar_phase(fecha: Fecha) -> float:
+    """moon.phase(fecha), sin redondear: O(1) dentro de LUNAR_SPAN a las 00:00."""
+    start, end = LUNAR_SPAN
+    if _midnight(fecha):
+        i = fecha.toordinal() - start.toordinal()
+        if 0 <= i <= end.toordinal() - start.toordinal():
+            return _phase_values()[1][i]
+    return moon.phase(fecha)
+
+
+def lunar_phases(fechas) -> np.ndarray:
+    """
+    moon.phase de un array de fechas (datetime64 o convertible), float64 sin redondear.
+    Las que caen fuera de LUNAR_SPAN o no son de las 00:00 se calculan con
+    astral_phases; NaT -> NaN.
+    """
+    t = np.asarray(fechas, dtype="datetime64[s]")
+    day = t.astype("datetime64[D]")
+    start, end = (np.datetime64(d, "D") for d in LUNAR_SPAN)
+    idx = (day - start).astype(np.int64)
+    in_table = (t == day) & (day >= start) & (day <= end)
+
+    out = np.empty(t.shape, dtype=np.float64)
+    out[in_table] = _phase_values()[0][idx[in_table]]
+    if not in_table.all():
+        out[~in_table] = astral_phases(t[~in_table])
+    return out
+
+
+def phase_label(phase: float) -> str:
+    """Nombre de la fase (umbrales de obtener_fase_lunar sobre la fase sin redondear)."""
+    if not 0.0 <= phase < 28.0:
+        raise ValueError(f"Fase lunar fuera de rango: {phase}")
+    return PHASE_LABELS[int(phase // 7.0)]
+
+
+def phase_labels(phases: np.ndarray) -> np.ndarray:
+    """phase_label vectorizado: array de str (object)."""
+    phases = np.asarray(phases, dtype=np.float64)
+    if not np.all((phases >= 0.0) & (phases < 28.0)):
+        raise ValueError("Fase lunar fuera de rango")
+    return np.asarray(PHASE_LABELS, dtype=object)[(phases // 7.0).astype(np.intp)]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caché en disco de las observaciones horarias de Meteostat (datos crudos).
+
+  <dir>/<estación>/<YYYY-MM>.npz   time (datetime64[h], UTC), temp, rhum (float64)
+
+Se guarda el mes completo (las 24 horas), así que cambiar la ventana de tarde o la
+lista de estaciones y volver a sincronizar solo cuesta lectura local.
+
+Un mes sin datos también se guarda (vacío), pero solo vale EMPTY_RETRY_DAYS: Meteostat
+devuelve una serie vacía tanto si la estación no tiene datos como si falla la descarga
+(se traga los errores HTTP y de red), así que pasado ese tiempo se vuelve a pedir.
+
+Los meses recientes (terminados hace menos de FRESH_DAYS) no se guardan: Meteostat
+todavía puede completarlos.
+
+  SANTILOTO_WEATHER_CACHE_DIR   directorio (por defecto ~/.cache/santiloto/meteostat)
+  SANTILOTO_WEATHER_CACHE=0     desactiva la caché
+  SANTILOTO_WEATHER_OFFLINE=1   nunca va a la red: un fallo de caché es un error
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+FRESH_DAYS = 7
+EMPTY_RETRY_DAYS = 7
+
+_stats = {"hits": 0, "misses": 0, "writes": 0}
+_stats_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("SANTILOTO_WEATHER_CACHE", "1") != "0"
+
+
+def offline() -> bool:
+    return os.environ.get("SANTILOTO_WEATHER_OFFLINE", "0") == "1"
+
+
+def cache_dir() -> Path:
+    raw = os.environ.get("SANTILOTO_WEATHER_CACHE_DIR")
+    return Path(raw) if raw else Path.home() / ".cache" / "santiloto" / "meteostat"
+
+
+def cache_stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats() -> None:
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+@dataclass(frozen=True)
+class HourlyMonth:
+    time: np.ndarray   # (N,) datetime64[h], UTC, creciente
+    temp: np.ndarray   # (N,) float64 (NaN = sin dato)
+    rhum: np.ndarray   # (N,) float64
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def empty(cls) -> HourlyMonth:
+        return cls(np.zeros(0, dtype="datetime64[h]"), np.zeros(0), np.zeros(0))
+
+
+def month_bounds(year: int, month: int) -> tuple[date, date]:
+    """Primer y último día del mes."""
+    first = date(year, month, 1)
+    nxt = date(year + month // 12, month % 12 + 1, 1)
+    return first, nxt - timedelta(days=1)
+
+
+def cacheable(year: int, month: int, today: Optional[date] = None) -> bool:
+    """¿El mes está cerrado hace al menos FRESH_DAYS días?"""
+    today = today or date.today()
+    return month_bounds(year, month)[1] < today - timedelta(days=FRESH_DAYS)
+
+
+def _path(station_id: str, year: int, month: int) -> Path:
+    return cache_dir() / station_id / f"{year:04d}-{month:02d}.npz"
+
+
+def load_month(station_id: str, year: int, month: int) -> Optional[HourlyMonth]:
+    """
+    Mes cacheado, o None (cuenta como fallo) si no está, la caché está desactivada o
+    es un mes vacío guardado hace más de EMPTY_RETRY_DAYS.
+    """
+    if not cache_enabled():
+        return None
+    p = _path(station_id, year, month)
+    try:
+        with np.load(p) as z:
+            m = HourlyMonth(z["time"].astype("datetime64[h]"), z["temp"], z["rhum"])
+        if not len(m) and time.time() - p.stat().st_mtime > EMPTY_RETRY_DAYS * 86400:
+            m = None
+    except (OSError, KeyError, ValueError):
+        m = None
+    if m is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return m
+
+
+def save_month(station_id: str, year: int, month: int, data: HourlyMonth) -> bool:
+    """Guarda el mes (escritura atómica); los meses recientes no se guardan."""
+    if not cache_enabled() or not cacheable(year, month):
+        return False
+    p = _path(station_id, year, month)
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=f".{p.stem}-", suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, time=data.time, temp=data.temp, rhum=data.rhum)
+        os.replace(tmp, p)
+    except OSError:
+        return False
+    _count("writes")
+    return True
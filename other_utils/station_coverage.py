@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de cobertura de las estaciones de Meteostat.
+
+Para cada estación, los días en que tiene al menos una hora de la ventana de tarde
+con temp y rhum a la vez (es decir, los días en que get_evening_states puede sacar
+una media de ella), guardados como rangos de fechas en
+
+  <caché meteostat>/coverage.json
+
+Se rellena solo: cada mes cerrado que pasa por fetch_hourly (descargado o leído de
+la caché) se anota una vez. Los meses no anotados son "desconocidos" y se siguen
+pidiendo; solo se saltan las estaciones que se sabe que no cubren la fecha.
+
+Un mes sin ninguna observación no se anota: Meteostat devuelve lo mismo si la
+estación no tiene datos que si la descarga falla, y no se puede dar por "sin
+cobertura" una estación por un fallo de red.
+check_station_coverage.py lo refresca a mano para un rango de fechas.
+
+Si cambia la ventana de tarde, el índice guardado no vale y se empieza de cero.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from other_utils.meteostat_cache import HourlyMonth, cache_dir, cache_enabled, cacheable
+
+COVERAGE_FORMAT = 2  # 2: los meses vacíos ya no se anotan (los de la v1 no valen)
+COVERAGE_FILE = "coverage.json"
+
+
+def _ranges(days: set[int]) -> list[tuple[int, int]]:
+    """Ordinales -> rangos [a, b] consecutivos."""
+    out: list[tuple[int, int]] = []
+    for o in sorted(days):
+        if out and o == out[-1][1] + 1:
+            out[-1] = (out[-1][0], o)
+        else:
+            out.append((o, o))
+    return out
+
+
+class StationCoverage:
+    """Días cubiertos y meses ya revisados, por estación."""
+
+    def __init__(self, path: Path, window: tuple[int, int]):
+        self.path = path
+        self.window = tuple(window)
+        self._checked: dict[str, set[str]] = {}
+        self._days: dict[str, set[int]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path, window: tuple[int, int]) -> StationCoverage:
+        cov = cls(path, window)
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cov
+        if raw.get("format") != COVERAGE_FORMAT or tuple(raw.get("window", ())) != cov.window:
+            return cov
+        for station_id, entry in raw.get("stations", {}).items():
+            cov._checked[station_id] = set(entry.get("months", []))
+            cov._days[station_id] = {
+                o
+                for a, b in entry.get("ranges", [])
+                for o in range(date.fromisoformat(a).toordinal(), date.fromisoformat(b).toordinal() + 1)
+            }
+        return cov
+
+    def known(self, station_id: str, year: int, month: int) -> bool:
+        with self._lock:
+            return f"{year:04d}-{month:02d}" in self._checked.get(station_id, ())
+
+    def covers(self, station_id: str, d: date) -> Optional[bool]:
+        """True / False si el mes de `d` ya está revisado; None si se desconoce."""
+        with self._lock:
+            if f"{d.year:04d}-{d.month:02d}" not in self._checked.get(station_id, ()):
+                return None
+            return d.toordinal() in self._days.get(station_id, ())
+
+    def record(self, station_id: str, year: int, month: int, data: HourlyMonth) -> bool:
+        """
+        Anota un mes, solo si está cerrado (los recientes aún pueden cambiar) y trae
+        observaciones (vacío puede ser una descarga fallida).
+        """
+        if not cacheable(year, month) or not len(data):
+            return False
+        lo, hi = self.window
+        hours = (data.time - data.time.astype("datetime64[D]")).astype(np.int64)
+        ok = ~np.isnan(data.temp) & ~np.isnan(data.rhum) & (hours >= lo) & (hours <= hi)
+        days = np.unique(data.time[ok].astype("datetime64[D]")).tolist()
+        with self._lock:
+            self._checked.setdefault(station_id, set()).add(f"{year:04d}-{month:02d}")
+            self._days.setdefault(station_id, set()).update(d.toordinal() for d in days)
+            self._dirty = True
+        return True
+
+    def ranges(self, station_id: str) -> list[tuple[date, date]]:
+        with self._lock:
+            days = set(self._days.get(station_id, ()))
+        return [(date.fromordinal(a), date.fromordinal(b)) for a, b in _ranges(days)]
+
+    def months(self, station_id: str) -> list[str]:
+        with self._lock:
+            return sorted(self._checked.get(station_id, ()))
+
+    def save(self) -> bool:
+        """Escribe el índice si ha cambiado (escritura atómica)."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            raw = {
+                "format": COVERAGE_FORMAT,
+                "window": list(self.window),
+                "stations": {
+                    sid: {
+                        "months": sorted(self._checked.get(sid, ())),
+                        "ranges": [
+                            [date.fromordinal(a).isoformat(), date.fromordinal(b).isoformat()]
+                            for a, b in _ranges(self._days.get(sid, set()))
+                        ],
+                    }
+                    for sid in sorted(self._checked)
+                },
+            }
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".coverage-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(raw, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            return False
+        return True
+
+
+_coverage: dict[tuple[Path, tuple[int, int]], StationCoverage] = {}
+_coverage_lock = threading.Lock()
+
+
+def get_coverage(window: tuple[int, int]) -> Optional[StationCoverage]:
+    """Índice compartido del directorio de caché actual (None si la caché está desactivada)."""
+    if not cache_enabled():
+        return None
+    path = cache_dir() / COVERAGE_FILE
+    key = (path, tuple(window))
+    with _coverage_lock:
+        cov = _coverage.get(key)
+        if cov is None:
+            cov = _coverage[key] = StationCoverage.load(path, window)
+        return cov
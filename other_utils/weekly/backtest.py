@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from other_utils.weekly.types import Apuesta_Primitiva, Apuesta_Euromillones
+from other_utils.weekly.bitmask import combo_masks, euro_masks, match_counts, primitiva_masks
+from other_utils.weekly.kernel import HistArraysPrimitiva, HistArraysEuro
+from other_utils.weekly.timeline import HistoryTimeline
+from other_utils.weekly.engine import (
+    TOL_OPTIONS,
+    ScoreTarget,
+    apuestas_primitiva_for_targets,
+    apuestas_euro_for_targets,
+)
+
+
+# -----------------------------
+# Backtest walk-forward
+# -----------------------------
+#
+# Reproduce el método semanal sobre todo el histórico:
+#   - cada semana (lunes..domingo) se puntúa solo con los sorteos anteriores a su lunes
+#   - el "forecast" de cada sorteo es la meteo guardada en SorteoInfluencers
+#     (T, RH, AH y valor lunar del propio sorteo)
+#   - se cuentan los aciertos de cada combinación contra el sorteo real
+# Las semanas se reparten en bloques entre procesos; el histórico viaja una sola
+# vez a cada proceso (initializer), que monta su HistoryTimeline. Cada semana
+# puntúa sobre el prefijo [0, inicio de semana) sin copiar filas, y los rankings
+# globales salen de los recuentos acumulados.
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_WEEKS = 64
+
+
+@dataclass(frozen=True)
+class BacktestDraw:
+    fecha: date
+    frac: float
+    combinaciones: tuple[tuple[int, ...], ...]
+    num_hits: tuple[int, ...]         # aciertos de números por combinación
+    extra: tuple[int, ...]            # reintegro/estrellas de la apuesta
+    extra_hits: tuple[int, ...]       # Primitiva: (1|0,) reintegro; Euro: estrellas por combinación
+
+
+@dataclass(frozen=True)
+class BacktestWeek:
+    week_start: date
+    history_rows: int                 # sorteos disponibles al generar la semana
+    draws: tuple[BacktestDraw, ...]
+
+
+@dataclass(frozen=True)
+class BacktestSummary:
+    game: str
+    weeks: int
+    draws: int
+    combinaciones: int
+    num_hits: dict[int, int]          # nº aciertos -> nº combinaciones
+    extra_hits: dict[int, int]
+    skipped: int                      # sorteos sin meteo o sin histórico previo
+
+
+# -----------------------------
+# Semanas
+# -----------------------------
+
+def week_starts(fecha: np.ndarray) -> np.ndarray:
+    """Lunes (datetime64[D]) de la semana de cada fecha. 1970-01-01 fue jueves."""
+    days = fecha.astype("datetime64[D]").astype(np.int64)
+    return (days - (days + 3) % 7).astype("datetime64[D]")
+
+
+def _monday(d: np.datetime64) -> date:
+    return week_starts(np.array([d]))[0].item()
+
+
+def _week_groups(hist) -> list[tuple[np.datetime64, int, int]]:
+    """(lunes, primera fila, fila final) por semana; el histórico viene ordenado por fecha."""
+    if len(hist) == 0:
+        return []
+    mondays = week_starts(hist.fecha)
+    cuts = np.flatnonzero(mondays[1:] != mondays[:-1]) + 1
+    starts = np.concatenate(([0], cuts))
+    ends = np.concatenate((cuts, [len(hist)]))
+    return [(mondays[s], int(s), int(e)) for s, e in zip(starts, ends)]
+
+
+def _has_weather(hist, rows: slice) -> np.ndarray:
+    return ~(
+        np.isnan(hist.temp[rows]) | np.isnan(hist.rh[rows])
+        | np.isnan(hist.ah[rows]) | np.isnan(hist.moon_val[rows])
+    )
+
+
+def _targets_for_rows(
+        hist,
+        rows: np.ndarray,
+        tol_options: tuple[float, ...],
+) -> list[ScoreTarget]:
+    """Targets fecha x tolerancia con la meteo guardada de cada sorteo como forecast."""
+    bins = hist.moon_bin[rows]
+    targets: list[ScoreTarget] = []
+    for r, mb in zip(rows, bins):
+        d = hist.fecha[r].item()
+        T, RH, AH = float(hist.temp[r]), float(hist.rh[r]), float(hist.ah[r])
+        targets.extend(ScoreTarget(d, T, RH, AH, int(mb), frac) for frac in tol_options)
+    return targets
+
+
+# -----------------------------
+# Una semana
+# -----------------------------
+
+def _hits_primitiva(hist: HistArraysPrimitiva, r: int, d: date, ap: Apuesta_Primitiva, frac: float) -> BacktestDraw:
+    re = int(hist.re[r])
+    hits = match_counts(primitiva_masks(ap), combo_masks(hist.nums[r])[0])
+    return BacktestDraw(
+        fecha=d,
+        frac=frac,
+        combinaciones=ap.combinaciones,
+        num_hits=tuple(hits.tolist()),
+        extra=(ap.reintegro,),
+        extra_hits=(int(re >= 0 and ap.reintegro == re),),
+    )
+
+
+def _hits_euro(hist: HistArraysEuro, r: int, d: date, ap: Apuesta_Euromillones, frac: float) -> BacktestDraw:
+    nums, stars = euro_masks(ap)
+    return BacktestDraw(
+        fecha=d,
+        frac=frac,
+        combinaciones=tuple(n for n, _ in ap.combinaciones),
+        num_hits=tuple(match_counts(nums, combo_masks(hist.nums[r])[0]).tolist()),
+        extra=tuple(s for _, st in ap.combinaciones for s in st),
+        extra_hits=tuple(match_counts(stars, combo_masks(hist.stars[r])[0]).tolist()),
+    )
+
+
+def backtest_week(
+        timeline: HistoryTimeline,
+        *,
+        start: int,
+        end: int,
+        tol_options: tuple[float, ...] = TOL_OPTIONS,
+        cutoff: Optional[float] = None,
+) -> Optional[BacktestWeek]:
+    """
+    Genera las apuestas de los sorteos hist[start:end] (una semana) usando solo
+    hist[:start] y las compara con el resultado real. None si no hay histórico previo.
+    """
+    if start == 0:
+        return None
+
+    hist = timeline.hist
+    rows = np.arange(start, end)[_has_weather(hist, slice(start, end))]
+    targets = _targets_for_rows(hist, rows, tol_options)
+
+    if isinstance(hist, HistArraysPrimitiva):
+        generated = apuestas_primitiva_for_targets(
+            targets,
+            hist_p=timeline.index,
+            tol_options=tol_options,
+            global_nums_rank=timeline.ranked("nums", start),
+            global_re_rank=timeline.ranked("re", start),
+            cutoff=cutoff,
+            end=start,
+        )
+        hits = _hits_primitiva
+    else:
+        generated = apuestas_euro_for_targets(
+            targets,
+            hist_e=timeline.index,
+            tol_options=tol_options,
+            global_nums_rank=timeline.ranked("nums", start),
+            global_stars_rank=timeline.ranked("stars", start),
+            cutoff=cutoff,
+            end=start,
+        )
+        hits = _hits_euro
+
+    # una apuesta por fecha con meteo; se cruza con el sorteo real de esa fila
+    by_date = {d: (ap, frac) for d, ap, frac in generated}
+    draws = []
+    for r in rows:
+        d = hist.fecha[r].item()
+        if d in by_date:
+            ap, frac = by_date[d]
+            draws.append(hits(hist, int(r), d, ap, frac))
+
+    return BacktestWeek(
+        week_start=_monday(hist.fecha[start]),
+        history_rows=start,
+        draws=tuple(draws),
+    )
+
+
+# -----------------------------
+# Pool de procesos
+# -----------------------------
+
+_WORKER_TIMELINE: Optional[HistoryTimeline] = None
+_WORKER_OPTS: tuple[tuple[float, ...], Optional[float]] = (TOL_OPTIONS, None)
+
+
+def _init_worker(hist, tol_options: tuple[float, ...], cutoff: Optional[float]) -> None:
+    global _WORKER_TIMELINE, _WORKER_OPTS
+    _WORKER_TIMELINE = HistoryTimeline.build(hist)
+    _WORKER_OPTS = (tol_options, cutoff)
+
+
+def _run_chunk(bounds: Sequence[tuple[int, int]]) -> list[Optional[BacktestWeek]]:
+    tol_options, cutoff = _WORKER_OPTS
+    return [
+        backtest_week(_WORKER_TIMELINE, start=s, end=e, tol_options=tol_options, cutoff=cutoff)
+        for s, e in bounds
+    ]
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run_backtest(
+        hist: HistArraysPrimitiva | HistArraysEuro,
+        *,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        tol_options: tuple[float, ...] = TOL_OPTIONS,
+        cutoff: Optional[float] = None,
+        workers: Optional[int] = None,
+        chunk_weeks: int = DEFAULT_CHUNK_WEEKS,
+) -> list[BacktestWeek]:
+    """
+    Backtest walk-forward de todas las semanas con lunes en [start, end].
+    workers=1 ejecuta en el propio proceso; None usa os.cpu_count().
+    Los resultados salen en orden cronológico.
+    """
+    groups = _week_groups(hist)
+    if start is not None:
+        groups = [g for g in groups if g[0] >= np.datetime64(start, "D")]
+    if end is not None:
+        groups = [g for g in groups if g[0] <= np.datetime64(end, "D")]
+    bounds = [(s, e) for _, s, e in groups]
+
+    workers = workers or os.cpu_count() or 1
+    chunk_weeks = max(1, chunk_weeks)
+    log.info(
+        "Backtest: %d semanas, %d sorteos de histórico, workers=%d, chunk=%d",
+        len(bounds), len(hist), workers, chunk_weeks,
+    )
+
+    if workers <= 1 or len(bounds) <= chunk_weeks:
+        _init_worker(hist, tol_options, cutoff)
+        results = _run_chunk(bounds)
+    else:
+        results = []
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(hist, tol_options, cutoff),
+        ) as pool:
+            for part in pool.map(_run_chunk, _chunks(bounds, chunk_weeks)):
+                results.extend(part)
+
+    return [w for w in results if w is not None]
+
+
+# -----------------------------
+# Resumen
+# -----------------------------
+
+def summarize(game: str, weeks: Iterable[BacktestWeek], hist=None) -> BacktestSummary:
+    """Distribución de aciertos; `hist` (opcional) para contar los sorteos saltados."""
+    weeks = list(weeks)
+    num_hits: Counter[int] = Counter()
+    extra_hits: Counter[int] = Counter()
+    n_draws = 0
+    n_combos = 0
+    for w in weeks:
+        for dr in w.draws:
+            n_draws += 1
+            n_combos += len(dr.num_hits)
+            num_hits.update(dr.num_hits)
+            extra_hits.update(dr.extra_hits)
+
+    skipped = 0
+    if hist is not None and weeks:
+        first = np.datetime64(weeks[0].week_start, "D")
+        last = np.datetime64(weeks[-1].week_start, "D") + np.timedelta64(7, "D")
+        in_range = int(np.count_nonzero((hist.fecha >= first) & (hist.fecha < last)))
+        skipped = in_range - n_draws
+
+    return BacktestSummary(
+        game=game,
+        weeks=len(weeks),
+        draws=n_draws,
+        combinaciones=n_combos,
+        num_hits=dict(sorted(num_hits.items())),
+        extra_hits=dict(sorted(extra_hits.items())),
+        skipped=skipped,
+    )
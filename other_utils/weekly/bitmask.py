@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from other_utils.weekly.types import Apuesta_Primitiva, Apuesta_Euromillones
+
+
+# -----------------------------
+# Combinaciones como máscaras de bits
+# -----------------------------
+#
+# Una combinación de números (6 de 49 en Primitiva, 5 de 50 en Euromillones) se
+# codifica como un uint64 con el bit n encendido por cada número n; las estrellas
+# (1..12) van en su propia máscara. Así:
+#   - aciertos entre dos combinaciones = popcount(a & b)
+#   - aciertos de M apuestas contra N sorteos = una operación (M, N) de NumPy
+# np.bitwise_count existe desde NumPy 2.0 (mínimo del proyecto).
+
+_ONE = np.uint64(1)
+
+
+def combo_mask(nums: Iterable[int]) -> int:
+    """Máscara (int de Python) de una combinación de números o de estrellas."""
+    m = 0
+    for n in nums:
+        m |= 1 << int(n)
+    return m
+
+
+def mask_numbers(mask: int) -> tuple[int, ...]:
+    """Inversa de combo_mask: números ordenados de una máscara."""
+    mask = int(mask)
+    return tuple(n for n in range(64) if mask >> n & 1)
+
+
+def combo_masks(values: np.ndarray) -> np.ndarray:
+    """Máscaras uint64 (N,) de una matriz (N, k) de números (p.ej. hist.nums o hist.stars)."""
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if values.ndim == 1:
+        values = values.reshape(1, -1)
+    bits = np.left_shift(_ONE, values.astype(np.uint64))
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def masks_of(combos: Sequence[Sequence[int]]) -> np.ndarray:
+    """Máscaras uint64 de una lista de combinaciones (tuplas de ints)."""
+    return combo_masks(np.array([tuple(c) for c in combos]))
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    return np.bitwise_count(np.asarray(masks, dtype=np.uint64))
+
+
+def match_counts(bets: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """
+    Aciertos (M, N) uint8 de M máscaras de apuesta contra N máscaras de sorteo.
+    Con un escalar en cualquiera de los dos lados, la dimensión correspondiente desaparece.
+    """
+    bets = np.asarray(bets, dtype=np.uint64)
+    draws = np.asarray(draws, dtype=np.uint64)
+    if bets.ndim == 0 or draws.ndim == 0:
+        return np.bitwise_count(bets & draws)
+    return np.bitwise_count(bets[:, None] & draws[None, :])
+
+
+# -----------------------------
+# Apuestas e histórico
+# -----------------------------
+
+def primitiva_masks(ap: Apuesta_Primitiva) -> np.ndarray:
+    """(5,) uint64, una máscara por combinación."""
+    return masks_of(ap.combinaciones)
+
+
+def euro_masks(ap: Apuesta_Euromillones) -> tuple[np.ndarray, np.ndarray]:
+    """((2,) números, (2,) estrellas) uint64, una máscara por combinación."""
+    nums = masks_of([n for n, _ in ap.combinaciones])
+    stars = masks_of([s for _, s in ap.combinaciones])
+    return nums, stars
+
+
+def history_masks(hist) -> dict[str, np.ndarray]:
+    """Máscaras por sorteo de las columnas de combinación del histórico ("nums", "stars")."""
+    out = {"nums": combo_masks(hist.nums)}
+    if hasattr(hist, "stars"):
+        out["stars"] = combo_masks(hist.stars)
+    return out
+
+
+def best_matches(bets: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """Máximo de aciertos de cada apuesta contra todo el histórico: (M,) uint8."""
+    if len(draws) == 0:
+        return np.zeros(len(bets), dtype=np.uint8)
+    return match_counts(bets, draws).max(axis=1)
+
+
+def match_histogram(bets: np.ndarray, draws: np.ndarray, k: int) -> np.ndarray:
+    """(M, k + 1): cuántos sorteos del histórico comparten 0..k números con cada apuesta."""
+    m = match_counts(bets, draws)
+    return (m[:, :, None] == np.arange(k + 1)).sum(axis=1)
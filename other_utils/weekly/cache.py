@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from datetime import date
+from typing import Any, Optional
+
+from other_utils.weekly.types import Apuesta_Primitiva, Apuesta_Euromillones, WeeklyResult
+
+
+# -----------------------------
+# Caché persistente de WeeklyResult
+# -----------------------------
+#
+# El resultado semanal solo depende de:
+#   - la ventana semanal de `today`
+#   - la fecha del último sorteo guardado de cada juego
+#   - la previsión (T, RH) de las fechas pendientes
+#   - el histórico con sus influencers: (versión, filas, última fecha) de
+#     HistoryFeaturesVersion, que cambia también al corregir sorteos ya guardados
+#   - method_version (y el cutoff del kernel, si se usa)
+# La clave es un hash de exactamente eso; el valor, el WeeklyResult en JSON,
+# guardado en la tabla WeeklyResultCache de la propia base de datos.
+
+log = logging.getLogger(__name__)
+
+WEEKLY_CACHE_MAX_ENTRIES = 64
+
+
+def weekly_cache_enabled() -> bool:
+    """SANTILOTO_WEEKLY_CACHE=0 desactiva la caché (p.ej. para depurar el motor)."""
+    return os.environ.get("SANTILOTO_WEEKLY_CACHE", "1") != "0"
+
+
+def _iso(d: Optional[date]) -> Optional[str]:
+    return d.isoformat() if d is not None else None
+
+
+def _forecast_values(dates: list[date], fc_map: dict[date, Any]) -> list[list[Any]]:
+    out: list[list[Any]] = []
+    for d in dates:
+        day = fc_map.get(d)
+        temp = getattr(day, "temp_mean_c", None)
+        rh = getattr(day, "rh_mean_pct", None)
+        out.append([d.isoformat(), temp, rh])
+    return out
+
+
+def weekly_cache_key(
+        *,
+        week_start: date,
+        week_end: date,
+        last_primitiva: Optional[date],
+        last_euromillones: Optional[date],
+        prim_dates: list[date],
+        euro_dates: list[date],
+        fc_primitiva: dict[date, Any],
+        fc_euromillones: dict[date, Any],
+        method_version: str,
+        cutoff: Optional[float] = None,
+        history: Optional[dict[str, Any]] = None,
+) -> str:
+    """Hash (sha256) de las entradas de las que depende el WeeklyResult."""
+    inputs = {
+        "week": [week_start.isoformat(), week_end.isoformat()],
+        "last": [_iso(last_primitiva), _iso(last_euromillones)],
+        "forecast": {
+            "Primitiva": _forecast_values(prim_dates, fc_primitiva),
+            "Euromillones": _forecast_values(euro_dates, fc_euromillones),
+        },
+        "method_version": method_version,
+        "cutoff": cutoff,
+        "history": {k: list(v) if v is not None else None for k, v in sorted((history or {}).items())},
+    }
+    raw = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# (De)serialización
+# -----------------------------
+
+def weekly_result_to_json(result: WeeklyResult) -> str:
+    payload = {
+        "primitiva_dates": [d.isoformat() for d in result.primitiva_dates],
+        "euromillones_dates": [d.isoformat() for d in result.euromillones_dates],
+        "apuestas_primitiva": [
+            [d.isoformat(), [list(c) for c in ap.combinaciones], ap.reintegro]
+            for d, ap in result.apuestas_primitiva
+        ],
+        "apuestas_euromillones": [
+            [d.isoformat(), [[list(nums), list(stars)] for nums, stars in ap.combinaciones]]
+            for d, ap in result.apuestas_euromillones
+        ],
+        "week_start": _iso(result.week_start),
+        "week_end": _iso(result.week_end),
+        "tol_primitiva": result.tol_primitiva,
+        "tol_euro": result.tol_euro,
+        "method_version": result.method_version,
+    }
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def weekly_result_from_json(raw: str) -> WeeklyResult:
+    p = json.loads(raw)
+
+    def _d(v: Optional[str]) -> Optional[date]:
+        return date.fromisoformat(v) if v is not None else None
+
+    return WeeklyResult(
+        primitiva_dates=tuple(date.fromisoformat(d) for d in p["primitiva_dates"]),
+        euromillones_dates=tuple(date.fromisoformat(d) for d in p["euromillones_dates"]),
+        apuestas_primitiva=tuple(
+            (
+                date.fromisoformat(d),
+                Apuesta_Primitiva(combinaciones=tuple(tuple(c) for c in combos), reintegro=re),
+            )
+            for d, combos, re in p["apuestas_primitiva"]
+        ),
+        apuestas_euromillones=tuple(
+            (
+                date.fromisoformat(d),
+                Apuesta_Euromillones(
+                    combinaciones=tuple((tuple(nums), tuple(stars)) for nums, stars in combos)
+                ),
+            )
+            for d, combos in p["apuestas_euromillones"]
+        ),
+        week_start=_d(p["week_start"]),
+        week_end=_d(p["week_end"]),
+        tol_primitiva=p["tol_primitiva"],
+        tol_euro=p["tol_euro"],
+        method_version=p["method_version"],
+    )
+
+
+# -----------------------------
+# Lectura / escritura vía DBManager
+# -----------------------------
+
+def load_cached_weekly(db, key: str) -> Optional[WeeklyResult]:
+    if not weekly_cache_enabled():
+        return None
+    raw = db.obtener_weekly_cache(key)
+    if raw is None:
+        return None
+    try:
+        return weekly_result_from_json(raw)
+    except (ValueError, KeyError, TypeError) as e:
+        log.warning("Entrada de caché semanal ilegible (%s): %s", key[:12], e)
+        return None
+
+
+def store_cached_weekly(db, key: str, result: WeeklyResult) -> bool:
+    if not weekly_cache_enabled():
+        return False
+    return db.guardar_weekly_cache(
+        key,
+        weekly_result_to_json(result),
+        week_start=_iso(result.week_start),
+        method_version=result.method_version,
+        max_entries=WEEKLY_CACHE_MAX_ENTRIES,
+    )
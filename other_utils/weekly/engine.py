@@ -1,16 +1,29 @@
 from __future__ import annotations
 
 import logging
-from dataclasses import dataclass
+import os
 from datetime import datetime, date, timedelta, time
 import math
-from typing import Iterable, Optional, Any
+from typing import NamedTuple, Optional, Any, Sequence
 
 from db_utils.db_management import DBManager
 from other_utils.fase_lunar import obtener_valor_fase_lunar
 from other_utils.weekly.types import Apuesta_Primitiva, Apuesta_Euromillones
-from other_utils.weekly.forecast import forecast_map_for_city, calc_abs_humidity
+from other_utils.weekly.forecast import forecast_maps_for_cities, calc_abs_humidity
 from other_utils.weekly.types import WeeklyResult
+from other_utils.weekly.cache import weekly_cache_key, load_cached_weekly, store_cached_weekly
+from other_utils.weekly.kernel import (
+    HistArraysPrimitiva,
+    HistArraysEuro,
+    MoonBinIndex,
+    ScoreMatrix,
+    history_arrays,
+    ranked_totals,
+    score_primitiva_arrays,
+    score_euro_arrays,
+    score_batch,
+    truncation_report,
+)
 from other_utils.humidity_meteostat import CITY
 
 
@@ -20,6 +33,11 @@ from other_utils.humidity_meteostat import CITY
 
 log = logging.getLogger(__name__)
 
+METHOD_VERSION = "v1"
+
+# fracciones de tolerancia: se usa la primera que produce apuesta
+TOL_OPTIONS: tuple[float, ...] = (0.10, 0.15)
+
 
 # -----------------------------
 # Helper: convertir a date lo que devuelve SQLite
@@ -125,127 +143,175 @@ def pending_draw_dates(today: date) -> dict[str, list[date]]:
     return {"Primitiva": primitiva, "Euromillones": euro}
 
 
-# -----------------------------
-# DB read: histórico + influencers
-# -----------------------------
-
-@dataclass(frozen=True)
-class HistRowPrimitiva:
-    n: tuple[int, int, int, int, int, int]
-    re: int
-    temp: float
-    rh: float
-    ah: float
-    moon_val: float
-
-
-@dataclass(frozen=True)
-class HistRowEuro:
-    n: tuple[int, int, int, int, int]
-    e: tuple[int, int]
-    temp: float
-    rh: float
-    ah: float
-    moon_val: float
-
-
 # -----------------------------
 # Ranking: contextual + fallback global
 # -----------------------------
 
-def global_rank_counts(values: Iterable[int]) -> dict[int, float]:
-    """Fallback global: score = frecuencia."""
-    counts: dict[int, float] = {}
-    for v in values:
-        counts[v] = counts.get(v, 0.0) + 1.0
-    return counts
-
-
 def sort_score_dict(d: dict[int, float]) -> dict[int, float]:
     """Devuelve dict ordenado por score desc (inserción ya ordenada)."""
     return dict(sorted(d.items(), key=lambda kv: kv[1], reverse=True))
 
 
 def score_primitiva_for_target(
-        history: list[HistRowPrimitiva],
+        history: HistArraysPrimitiva | MoonBinIndex,
         *,
         target_temp: float,
         target_rh: float,
         target_ah: float,
         target_moon_bin: int,
         frac: float,
+        cutoff: float | None = None,
+        end: int | None = None,
 ) -> tuple[dict[int, float], dict[int, float]]:
     """
     Devuelve (score_numeros, score_reintegro) para un target (un sorteo futuro).
     Filtra por luna_bin exacto. Meteo entra como score gaussiano.
+    El cálculo se hace en columnas NumPy (ver kernel.py).
+    Con `cutoff` se usa el kernel truncado: se ignoran las filas a más de
+    cutoff·tol en temperatura, RH o AH.
+    Con `end` solo puntúan las filas [0, end) del histórico (ver HistoryTimeline.cutoff_index).
     """
-    s_nums: dict[int, float] = {}
-    s_re: dict[int, float] = {}
-
     tT = tol_temp(target_temp, frac)
     tRH = tol_rh(target_rh, frac)
     tAH = tol_ah(target_ah, frac)
 
-    for row in history:
-        if moon_bin_8(row.moon_val) != target_moon_bin:
-            continue
-
-        score_row = (
-                gauss_score(row.temp - target_temp, tT) *
-                gauss_score(row.rh - target_rh, tRH) *
-                gauss_score(row.ah - target_ah, tAH)
-        )
-
-        if score_row <= 0.0:
-            continue
-
-        for num in row.n:
-            s_nums[num] = s_nums.get(num, 0.0) + score_row
-
-        # reintegro (0..9)
-        s_re[row.re] = s_re.get(row.re, 0.0) + score_row
-
-    return sort_score_dict(s_nums), sort_score_dict(s_re)
+    return score_primitiva_arrays(
+        history,
+        target_temp=target_temp,
+        target_rh=target_rh,
+        target_ah=target_ah,
+        target_moon_bin=target_moon_bin,
+        tols=(tT, tRH, tAH),
+        cutoff=cutoff,
+        end=end,
+    )
 
 
 def score_euro_for_target(
-        history: list[HistRowEuro],
+        history: HistArraysEuro | MoonBinIndex,
         *,
         target_temp: float,
         target_rh: float,
         target_ah: float,
         target_moon_bin: int,
         frac: float,
+        cutoff: float | None = None,
+        end: int | None = None,
 ) -> tuple[dict[int, float], dict[int, float]]:
     """
     Devuelve (score_numeros, score_estrellas) para un target (un sorteo futuro).
     """
-    s_nums: dict[int, float] = {}
-    s_stars: dict[int, float] = {}
-
     tT = tol_temp(target_temp, frac)
     tRH = tol_rh(target_rh, frac)
     tAH = tol_ah(target_ah, frac)
 
-    for row in history:
-        if moon_bin_8(row.moon_val) != target_moon_bin:
-            continue
+    return score_euro_arrays(
+        history,
+        target_temp=target_temp,
+        target_rh=target_rh,
+        target_ah=target_ah,
+        target_moon_bin=target_moon_bin,
+        tols=(tT, tRH, tAH),
+        cutoff=cutoff,
+        end=end,
+    )
 
-        score_row = (
-                gauss_score(row.temp - target_temp, tT) *
-                gauss_score(row.rh - target_rh, tRH) *
-                gauss_score(row.ah - target_ah, tAH)
-        )
 
-        if score_row <= 0.0:
-            continue
+class ScoreTarget(NamedTuple):
+    """Un target de scoring: sorteo futuro + contexto + tolerancia."""
+    d: date
+    temp: float
+    rh: float
+    ah: float
+    moon_bin: int
+    frac: float
+
+
+def _target_tols(t: ScoreTarget) -> tuple[float, float, float]:
+    return tol_temp(t.temp, t.frac), tol_rh(t.rh, t.frac), tol_ah(t.ah, t.frac)
+
 
-        for num in row.n:
-            s_nums[num] = s_nums.get(num, 0.0) + score_row
-        for st in row.e:
-            s_stars[st] = s_stars.get(st, 0.0) + score_row
+def _batch_inputs(targets: Sequence[ScoreTarget]) -> dict[str, Any]:
+    return {
+        "temps": [t.temp for t in targets],
+        "rhs": [t.rh for t in targets],
+        "ahs": [t.ah for t in targets],
+        "moon_bins": [t.moon_bin for t in targets],
+        "tols": [_target_tols(t) for t in targets],
+    }
 
-    return sort_score_dict(s_nums), sort_score_dict(s_stars)
+
+def score_primitiva_targets(
+        history: HistArraysPrimitiva | MoonBinIndex,
+        targets: Sequence[ScoreTarget],
+        *,
+        cutoff: float | None = None,
+        end: int | None = None,
+) -> tuple[ScoreMatrix, ScoreMatrix]:
+    """
+    Versión por lotes de score_primitiva_for_target: todos los targets
+    (fechas x tolerancias) en una sola pasada por el histórico.
+    Devuelve matrices targets x números y targets x reintegro;
+    `.ranking(i)` da el dict ordenado del target i.
+    """
+    index = MoonBinIndex.of(history)
+    nums, re = score_batch(index, ("nums", "re"), cutoff=cutoff, end=end, **_batch_inputs(targets))
+    return nums, re
+
+
+def score_euro_targets(
+        history: HistArraysEuro | MoonBinIndex,
+        targets: Sequence[ScoreTarget],
+        *,
+        cutoff: float | None = None,
+        end: int | None = None,
+) -> tuple[ScoreMatrix, ScoreMatrix]:
+    """Versión por lotes de score_euro_for_target (números, estrellas)."""
+    index = MoonBinIndex.of(history)
+    nums, stars = score_batch(index, ("nums", "stars"), cutoff=cutoff, end=end, **_batch_inputs(targets))
+    return nums, stars
+
+
+def log_truncation_reports(
+        history: HistArraysPrimitiva | HistArraysEuro | MoonBinIndex,
+        targets: Sequence[ScoreTarget],
+        *,
+        cutoff: float,
+        top_n: int,
+        end: int | None = None,
+) -> None:
+    """Registra (nivel DEBUG) cuánto cambia el ranking del kernel truncado frente al exacto."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    for t in targets:
+        rep = truncation_report(
+            history,
+            target_temp=t.temp, target_rh=t.rh, target_ah=t.ah,
+            target_moon_bin=t.moon_bin,
+            tols=_target_tols(t),
+            cutoff=cutoff,
+            top_n=top_n,
+            end=end,
+        )
+        log.debug(
+            "Kernel truncado %s frac=%.2f k=%.1f: filas %d/%d, peso %.4f, top%d %.2f, mismo ranking=%s",
+            t.d.isoformat(), t.frac, cutoff, rep.rows_truncated, rep.rows_exact,
+            rep.weight_kept, rep.top_n, rep.top_overlap, rep.same_ranking,
+        )
+
+
+def kernel_cutoff_from_env() -> Optional[float]:
+    """
+    Cutoff del kernel truncado (en múltiplos de tol), desde SANTILOTO_KERNEL_CUTOFF.
+    Sin la variable se usa el kernel gaussiano exacto.
+    """
+    raw = os.environ.get("SANTILOTO_KERNEL_CUTOFF")
+    if not raw:
+        return None
+    cutoff = float(raw)
+    if cutoff <= 0:
+        raise ValueError(f"SANTILOTO_KERNEL_CUTOFF debe ser > 0: {raw!r}")
+    return cutoff
 
 
 def merge_scores_sum(dicts: list[dict[int, float]]) -> dict[int, float]:
@@ -398,31 +464,54 @@ def target_context_for_date(
     return T, RH, AH, moon_bin
 
 
-def _compute_primitiva_for_dates(
+def _targets_for_dates(
         *,
         dates: list[date],
-        hist_p,
-        fc_map,
-        tol_options: tuple[float, float],
-        global_nums_rank: dict,
-        global_re_rank: dict,
-) -> tuple[list[tuple[date, Apuesta_Primitiva]], Optional[float]]:
-    apuestas: list[tuple[date, Apuesta_Primitiva]] = []
-    tol_used: Optional[float] = tol_options[0] if dates else None
-
+        fc_map: dict[date, Any],
+        tol_options: tuple[float, ...],
+) -> list[ScoreTarget]:
+    """Targets fecha x tolerancia; el target (i, j) queda en la posición i * len(tol_options) + j."""
+    targets: list[ScoreTarget] = []
     for d in dates:
         T, RH, AH, mb = target_context_for_date(d=d, fc_map=fc_map)
+        targets.extend(ScoreTarget(d, T, RH, AH, mb, frac) for frac in tol_options)
+    return targets
 
+
+def apuestas_primitiva_for_targets(
+        targets: Sequence[ScoreTarget],
+        *,
+        hist_p: HistArraysPrimitiva | MoonBinIndex,
+        tol_options: tuple[float, ...],
+        global_nums_rank: dict,
+        global_re_rank: dict,
+        cutoff: Optional[float] = None,
+        end: Optional[int] = None,
+) -> list[tuple[date, Apuesta_Primitiva, float]]:
+    """
+    Apuesta por fecha a partir de targets fecha x tolerancia (ver _targets_for_dates).
+    Devuelve (fecha, apuesta, frac usada); la frac es la primera que da apuesta o,
+    si ninguna, la última (fallback global).
+    Con `end` solo se usa el histórico [0, end) (los rankings globales los pasa el caller).
+    """
+    out: list[tuple[date, Apuesta_Primitiva, float]] = []
+    if not targets:
+        return out
+
+    # todas las fechas y tolerancias en una sola pasada
+    m_nums, m_re = score_primitiva_targets(hist_p, targets, cutoff=cutoff, end=end)
+    if cutoff is not None:
+        log_truncation_reports(hist_p, targets, cutoff=cutoff, top_n=30, end=end)
+
+    n_tol = len(tol_options)
+    for i in range(len(targets) // n_tol):
+        d = targets[i * n_tol].d
         ap_list: list[Apuesta_Primitiva] = []
         used_frac = tol_options[-1]
 
-        for frac in tol_options:
-            s_nums, s_re = score_primitiva_for_target(
-                hist_p,
-                target_temp=T, target_rh=RH, target_ah=AH,
-                target_moon_bin=mb,
-                frac=frac,
-            )
+        for j, frac in enumerate(tol_options):
+            t = i * n_tol + j
+            s_nums, s_re = m_nums.ranking(t), m_re.ranking(t)
             ap_list = build_apuestas_primitiva(
                 weekly_nums_rank=s_nums,
                 weekly_re_rank=s_re,
@@ -443,37 +532,39 @@ def _compute_primitiva_for_dates(
             used_frac = tol_options[-1]
 
         if ap_list:
-            apuestas.append((d, ap_list[0]))
-            tol_used = used_frac if tol_used is None else max(tol_used, used_frac)
+            out.append((d, ap_list[0], used_frac))
 
-    return apuestas, (tol_used if dates else None)
+    return out
 
 
-def _compute_euro_for_dates(
+def apuestas_euro_for_targets(
+        targets: Sequence[ScoreTarget],
         *,
-        dates: list[date],
-        hist_e,
-        fc_map,
-        tol_options: tuple[float, float],
+        hist_e: HistArraysEuro | MoonBinIndex,
+        tol_options: tuple[float, ...],
         global_nums_rank: dict,
         global_stars_rank: dict,
-) -> tuple[list[tuple[date, Apuesta_Euromillones]], Optional[float]]:
-    apuestas: list[tuple[date, Apuesta_Euromillones]] = []
-    tol_used: Optional[float] = tol_options[0] if dates else None
-
-    for d in dates:
-        T, RH, AH, mb = target_context_for_date(d=d, fc_map=fc_map)
-
+        cutoff: Optional[float] = None,
+        end: Optional[int] = None,
+) -> list[tuple[date, Apuesta_Euromillones, float]]:
+    """Equivalente a apuestas_primitiva_for_targets para Euromillones."""
+    out: list[tuple[date, Apuesta_Euromillones, float]] = []
+    if not targets:
+        return out
+
+    m_nums, m_st = score_euro_targets(hist_e, targets, cutoff=cutoff, end=end)
+    if cutoff is not None:
+        log_truncation_reports(hist_e, targets, cutoff=cutoff, top_n=10, end=end)
+
+    n_tol = len(tol_options)
+    for i in range(len(targets) // n_tol):
+        d = targets[i * n_tol].d
         ap_list: list[Apuesta_Euromillones] = []
         used_frac = tol_options[-1]
 
-        for frac in tol_options:
-            s_nums, s_st = score_euro_for_target(
-                hist_e,
-                target_temp=T, target_rh=RH, target_ah=AH,
-                target_moon_bin=mb,
-                frac=frac,
-            )
+        for j, frac in enumerate(tol_options):
+            t = i * n_tol + j
+            s_nums, s_st = m_nums.ranking(t), m_st.ranking(t)
             ap_list = build_apuestas_euromillones(
                 weekly_nums_rank=s_nums,
                 weekly_stars_rank=s_st,
@@ -494,16 +585,83 @@ def _compute_euro_for_dates(
             used_frac = tol_options[-1]
 
         if ap_list:
-            apuestas.append((d, ap_list[0]))
-            tol_used = used_frac if tol_used is None else max(tol_used, used_frac)
+            out.append((d, ap_list[0], used_frac))
+
+    return out
+
+
+def _max_frac(
+        generated: list[tuple[date, Any, float]],
+        tol_options: tuple[float, ...],
+) -> Optional[float]:
+    tol_used: Optional[float] = tol_options[0]
+    for _, _, frac in generated:
+        tol_used = frac if tol_used is None else max(tol_used, frac)
+    return tol_used
+
+
+def _compute_primitiva_for_dates(
+        *,
+        dates: list[date],
+        hist_p,
+        fc_map,
+        tol_options: tuple[float, float],
+        global_nums_rank: dict,
+        global_re_rank: dict,
+        cutoff: Optional[float] = None,
+) -> tuple[list[tuple[date, Apuesta_Primitiva]], Optional[float]]:
+    if not dates:
+        return [], None
+
+    targets = _targets_for_dates(dates=dates, fc_map=fc_map, tol_options=tol_options)
+    generated = apuestas_primitiva_for_targets(
+        targets,
+        hist_p=hist_p,
+        tol_options=tol_options,
+        global_nums_rank=global_nums_rank,
+        global_re_rank=global_re_rank,
+        cutoff=cutoff,
+    )
+    return [(d, ap) for d, ap, _ in generated], _max_frac(generated, tol_options)
+
+
+def _compute_euro_for_dates(
+        *,
+        dates: list[date],
+        hist_e,
+        fc_map,
+        tol_options: tuple[float, float],
+        global_nums_rank: dict,
+        global_stars_rank: dict,
+        cutoff: Optional[float] = None,
+) -> tuple[list[tuple[date, Apuesta_Euromillones]], Optional[float]]:
+    if not dates:
+        return [], None
 
-    return apuestas, (tol_used if dates else None)
+    targets = _targets_for_dates(dates=dates, fc_map=fc_map, tol_options=tol_options)
+    generated = apuestas_euro_for_targets(
+        targets,
+        hist_e=hist_e,
+        tol_options=tol_options,
+        global_nums_rank=global_nums_rank,
+        global_stars_rank=global_stars_rank,
+        cutoff=cutoff,
+    )
+    return [(d, ap) for d, ap, _ in generated], _max_frac(generated, tol_options)
+
+
+def _last_draw_dates(db: DBManager) -> tuple[Optional[date], Optional[date]]:
+    """Fecha del último sorteo guardado de (Primitiva, Euromillones)."""
+    last_p = _to_date_sql(db.fecha_ultimo_resultado("Primitiva", "fecha"))
+    last_e = _to_date_sql(db.fecha_ultimo_resultado("Euromillones", "fecha"))
+    return last_p, last_e
 
 
 def _future_pending_dates(
         *,
         db: DBManager,
         today: date,
+        last_dates: Optional[tuple[Optional[date], Optional[date]]] = None,
 ) -> tuple[list[date], list[date]]:
     """
     Devuelve (prim_dates, euro_dates) futuras pendientes,
@@ -511,8 +669,7 @@ def _future_pending_dates(
     """
     pending = pending_draw_dates(today)
 
-    last_p = _to_date_sql(db.fecha_ultimo_resultado("Primitiva", "fecha"))
-    last_e = _to_date_sql(db.fecha_ultimo_resultado("Euromillones", "fecha"))
+    last_p, last_e = last_dates if last_dates is not None else _last_draw_dates(db)
 
     prim_dates = [d for d in pending["Primitiva"] if last_p is None or d > last_p]
     euro_dates = [d for d in pending["Euromillones"] if last_e is None or d > last_e]
@@ -520,9 +677,14 @@ def _future_pending_dates(
     return prim_dates, euro_dates
 
 
-def _load_histories(db: DBManager):
-    """Carga históricos una sola vez."""
-    return db.load_history_primitiva(), db.load_history_euromillones()
+def _load_histories(db: DBManager) -> tuple[MoonBinIndex, MoonBinIndex]:
+    """
+    Carga históricos una sola vez, ya en columnas NumPy e indexados por bin lunar:
+    cada target solo recorre las filas de su bin.
+    """
+    hist_p = MoonBinIndex.build(db.load_history_primitiva())
+    hist_e = MoonBinIndex.build(db.load_history_euromillones())
+    return hist_p, hist_e
 
 
 def _global_ranks_from_hist(hist_p, hist_e) -> tuple[dict, dict, dict, dict]:
@@ -531,18 +693,20 @@ def _global_ranks_from_hist(hist_p, hist_e) -> tuple[dict, dict, dict, dict]:
       - primitiva: números, reintegro
       - euromillones: números, estrellas
     """
-    global_p_nums = sort_score_dict(global_rank_counts(num for r in hist_p for num in r.n))
-    global_p_re = sort_score_dict(global_rank_counts(r.re for r in hist_p if r.re is not None))
-    global_e_nums = sort_score_dict(global_rank_counts(num for r in hist_e for num in r.n))
-    global_e_stars = sort_score_dict(global_rank_counts(st for r in hist_e for st in r.e))
+    hist_p = history_arrays(hist_p)
+    hist_e = history_arrays(hist_e)
+
+    global_p_nums = ranked_totals(hist_p.nums)
+    global_p_re = ranked_totals(hist_p.re[hist_p.re >= 0])
+    global_e_nums = ranked_totals(hist_e.nums)
+    global_e_stars = ranked_totals(hist_e.stars)
     return global_p_nums, global_p_re, global_e_nums, global_e_stars
 
 
 def _forecast_maps() -> tuple[dict, dict]:
-    """Forecast map por ciudad (date -> meteo)."""
-    fc_madrid = forecast_map_for_city(CITY["MADRID"])
-    fc_paris = forecast_map_for_city(CITY["PARIS"])
-    return fc_madrid, fc_paris
+    """Forecast map por ciudad (date -> meteo); todas las ciudades de CITY en paralelo."""
+    maps = forecast_maps_for_cities(CITY)
+    return maps["MADRID"], maps["PARIS"]
 
 
 def compute_weekly_apuestas(
@@ -559,26 +723,55 @@ def compute_weekly_apuestas(
       - ranking contextual con frac=0.10
       - si faltan candidatos: frac=0.15
       - si aún faltan: fallback global histórico
+
+    El resultado se memoiza en la base de datos (ver cache.py): con la misma
+    semana, últimos sorteos, versión del histórico (HistoryFeaturesVersion),
+    previsión y method_version no se recalcula.
     """
     # 1) fechas pendientes
-    prim_dates, euro_dates = _future_pending_dates(db=db, today=today)
+    last_dates = _last_draw_dates(db)
+    prim_dates, euro_dates = _future_pending_dates(db=db, today=today, last_dates=last_dates)
+    week_start, week_end = _start_end_week_window(today)
 
     log.info("Pendientes Primitiva: %s", [d.isoformat() for d in prim_dates])
     log.info("Pendientes Euromillones: %s", [d.isoformat() for d in euro_dates])
 
-    # 2) cargar histórico (una vez)
-    hist_p, hist_e = _load_histories(db)
-
-    # 3) fallback global rankings
-    global_p_nums, global_p_re, global_e_nums, global_e_stars = _global_ranks_from_hist(hist_p, hist_e)
-
-    # 4) forecast window por ciudad (una vez)
+    # 2) forecast window por ciudad (una vez)
     #    (map date -> (temp_mean, rh_mean))
     fc_madrid, fc_paris = _forecast_maps()
 
-    # 5) construir scores por sorteo futuro y sumar a ranking semanal
+    tol_options = TOL_OPTIONS
+    cutoff = kernel_cutoff_from_env()
 
-    tol_options = (0.10, 0.15)
+    # 3) caché: mismas entradas -> mismo resultado. Sin versión del histórico (base
+    #    antigua en solo lectura) no se puede saber si cambió: no se usa la caché.
+    history = {juego: db.obtener_version_historico(juego) for juego in ("Primitiva", "Euromillones")}
+    use_cache = all(v is not None for v in history.values())
+    cache_key = weekly_cache_key(
+        week_start=week_start,
+        week_end=week_end,
+        last_primitiva=last_dates[0],
+        last_euromillones=last_dates[1],
+        prim_dates=prim_dates,
+        euro_dates=euro_dates,
+        fc_primitiva=fc_madrid,
+        fc_euromillones=fc_paris,
+        method_version=METHOD_VERSION,
+        cutoff=cutoff,
+        history=history,
+    )
+    cached = load_cached_weekly(db, cache_key) if use_cache else None
+    if cached is not None:
+        log.info("WeeklyResult desde caché (%s)", cache_key[:12])
+        return cached
+
+    # 4) cargar histórico (una vez)
+    hist_p, hist_e = _load_histories(db)
+
+    # 5) fallback global rankings
+    global_p_nums, global_p_re, global_e_nums, global_e_stars = _global_ranks_from_hist(hist_p, hist_e)
+
+    # 6) construir scores por sorteo futuro y sumar a ranking semanal
 
     # Primitiva (Madrid) - por fecha
 
@@ -589,6 +782,7 @@ def compute_weekly_apuestas(
         tol_options=tol_options,
         global_nums_rank=global_p_nums,
         global_re_rank=global_p_re,
+        cutoff=cutoff,
     )
 
     # Euromillones (Paris) - por fecha
@@ -600,11 +794,10 @@ def compute_weekly_apuestas(
         tol_options=tol_options,
         global_nums_rank=global_e_nums,
         global_stars_rank=global_e_stars,
+        cutoff=cutoff,
     )
 
-    week_start, week_end = _start_end_week_window(today)
-
-    return WeeklyResult(
+    result = WeeklyResult(
         primitiva_dates=tuple(prim_dates),
         euromillones_dates=tuple(euro_dates),
         apuestas_primitiva=tuple(apuestas_primitiva),
@@ -613,7 +806,11 @@ def compute_weekly_apuestas(
         week_end=week_end,
         tol_primitiva=tol_p_used if prim_dates else None,
         tol_euro=tol_e_used if euro_dates else None,
-        method_version="v1",
+        method_version=METHOD_VERSION,
     )
 
+    if use_cache:
+        store_cached_weekly(db, cache_key, result)
+    return result
+
 
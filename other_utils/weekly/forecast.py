@@ -1,20 +1,32 @@
 from __future__ import annotations
 
-from typing import Any, Iterable, TypedDict
+from typing import Any, Iterable, Mapping, Optional
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, date
 from dataclasses import dataclass
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from math import exp
 
+import numpy as np
+
 # from other_utils.prevision_temp_hr import fetch_hourly_temp_rh, daily_window_means_from_hourly, calc_abs_humidity
 
 from other_utils.humidity_meteostat import CityCfg  #, CITY
+from other_utils.weekly.forecast_cache import forecast_cache_enabled, shared_forecast_cache
 
 FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
 
+# (conexión, lectura) en segundos, por ciudad; SANTILOTO_FORECAST_TIMEOUT cambia la lectura
+FORECAST_CONNECT_TIMEOUT = 5.0
+FORECAST_READ_TIMEOUT = 20.0
+FORECAST_RETRIES = 2
+
 
 @dataclass(frozen=True)
 class Location:
@@ -34,18 +46,45 @@ class WindowDailyAvg:
     n_samples: int
 
 
-class _DayBucket(TypedDict):
-    temp: list[float]
-    rh: list[float]
-    hours: set[int]
+# -----------------------------
+# Sesión HTTP compartida
+# -----------------------------
+# Una sola requests.Session para todo el proceso: reutiliza conexiones (keep-alive)
+# entre ciudades y entre peticiones de la API, y reintenta con espera creciente los
+# fallos de conexión y las respuestas 429/5xx de Open-Meteo.
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def forecast_session() -> requests.Session:
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            retry = Retry(
+                total=FORECAST_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSION = session
+        return _SESSION
 
 
-def _mean(values: Iterable[float]) -> float | None:
-    vals = [v for v in values if v is not None]
-    return round((sum(vals) / len(vals)), 2) if vals else None
+def forecast_timeout() -> tuple[float, float]:
+    raw = os.environ.get("SANTILOTO_FORECAST_TIMEOUT")
+    try:
+        read = float(raw) if raw else FORECAST_READ_TIMEOUT
+    except ValueError:
+        read = FORECAST_READ_TIMEOUT
+    return FORECAST_CONNECT_TIMEOUT, read
 
 
-def fetch_hourly_temp_rh(city: CityCfg, *, days: int = 7) -> dict:
+def fetch_hourly_temp_rh(city: CityCfg, *, days: int = 7, timeout: Optional[tuple[float, float]] = None) -> dict:
     """
     Devuelve previsión horaria (arrays paralelos).
     Útil si luego tú agregas o consumes por horas.
@@ -57,7 +96,7 @@ def fetch_hourly_temp_rh(city: CityCfg, *, days: int = 7) -> dict:
         "forecast_days": days,
         "hourly": "temperature_2m,relative_humidity_2m",
     }
-    r = requests.get(FORECAST_URL, params=params, timeout=20)
+    r = forecast_session().get(FORECAST_URL, params=params, timeout=timeout or forecast_timeout())
     r.raise_for_status()
     data = r.json()
 
@@ -69,62 +108,143 @@ def fetch_hourly_temp_rh(city: CityCfg, *, days: int = 7) -> dict:
     }
 
 
-def daily_window_means_from_hourly(
+def _parse_times(time: list[str]) -> np.ndarray:
+    """'YYYY-MM-DDTHH:MM' -> datetime64[m] (hora local tal cual viene en el texto)."""
+    if time and (time[0].endswith("Z") or time[0][-6:-5] in ("+", "-")):
+        # con desplazamiento horario ('...+02:00', 'Z') NumPy pasaría a UTC: se queda la hora local
+        return np.array(
+            [datetime.fromisoformat(t).replace(tzinfo=None) for t in time], dtype="datetime64[m]"
+        )
+    return np.asarray(time, dtype="datetime64[m]")
+
+
+_HOUR_BITS = np.left_shift(np.int64(1), np.arange(24, dtype=np.int64))
+
+
+def _window_means(
+    day_idx: np.ndarray,
+    hour: np.ndarray,
+    temp: np.ndarray,
+    rh: np.ndarray,
+    days: list[str],
+    start_hour: int,
+    end_hour: int,
+) -> list[WindowDailyAvg]:
+    n = len(days)
+    m = (hour >= start_hour) & (hour <= end_hour)
+    idx = day_idx[m]
+
+    # horas vistas por día como máscara de 24 bits
+    seen = np.zeros((n, 24), dtype=bool)
+    seen[idx, hour[m]] = True
+    hour_masks = seen.astype(np.int64) @ _HOUR_BITS
+
+    def means(values: np.ndarray) -> list:
+        v = values[m]
+        ok = ~np.isnan(v)
+        vi = idx[ok]
+        # agrupa por día sin cambiar el orden de las filas dentro de cada día y suma
+        # cada grupo con sum() de Python (np.bincount suma sin compensar y el redondeo
+        # a 2 decimales puede caer del otro lado)
+        order = np.argsort(vi, kind="stable")
+        count = np.bincount(vi, minlength=n)
+        groups = np.split(v[ok][order], np.cumsum(count)[:-1])
+        return [
+            round(sum(g.tolist()) / c, 2) if c else None
+            for g, c in zip(groups, count.tolist())
+        ]
+
+    temp_mean = means(temp)
+    rh_mean = means(rh)
+
+    hours_of: dict[int, list[int]] = {}
+    out: list[WindowDailyAvg] = []
+    for i, hm in enumerate(hour_masks.tolist()):
+        if not hm:
+            continue
+        hours = hours_of.get(hm)
+        if hours is None:
+            hours = hours_of[hm] = [h for h in range(24) if hm >> h & 1]
+        out.append(
+            WindowDailyAvg(
+                date=days[i],
+                hours_used=list(hours),
+                temp_mean_c=temp_mean[i],
+                rh_mean_pct=rh_mean[i],
+                n_samples=len(hours),
+            )
+        )
+    return out
+
+
+def daily_window_means_multi(
     *,
     time: list[str],
     temperature_2m: list[float],
     relative_humidity_2m: list[float],
-    start_hour: int = 18,
-    end_hour: int = 23,
-) -> list[WindowDailyAvg]:
+    windows: Iterable[tuple[int, int]],
+) -> dict[tuple[int, int], list[WindowDailyAvg]]:
     """
-    Agrega por día la media de temperatura y humedad relativa en la ventana horaria [start_hour, end_hour].
-    Se asume que 'time' viene en hora local si has llamado a Open-Meteo con timezone=<zona>.
-    Formato esperado en 'time': 'YYYY-MM-DDTHH:MM' (Open-Meteo típico).
+    daily_window_means_from_hourly para varias ventanas [start_hour, end_hour] a la vez
+    (p.ej. (18, 23), (0, 23), (20, 22)): las fechas se parsean una sola vez y cada
+    ventana es una máscara + agrupación por día.
 
-    Devuelve una lista ordenada por fecha.
+    Los valores None (huecos de Open-Meteo) no cuentan en la media; la hora sí cuenta
+    en hours_used / n_samples, igual que en la versión por filas.
     """
     if not (len(time) == len(temperature_2m) == len(relative_humidity_2m)):
         raise ValueError("Arrays hourly desalineados")
 
-    buckets: dict[str, _DayBucket] = {}
-
-    for t, temp, rh in zip(time, temperature_2m, relative_humidity_2m):
-        dt = datetime.fromisoformat(t)
-        h = dt.hour
-
-        if start_hour <= h <= end_hour:
-            d = dt.date().isoformat()
+    t = _parse_times(time)
+    day = t.astype("datetime64[D]")
+    hour = ((t - day).astype(np.int64) // 60).astype(np.intp)
+    if len(day) and np.all(day[1:] >= day[:-1]):
+        # lo normal (serie ordenada): índice de día por desplazamiento, sin ordenar
+        day_idx = (day - day[0]).astype(np.intp)
+        days = np.arange(day[0], day[-1] + np.timedelta64(1, "D"))
+    else:
+        days, day_idx = np.unique(day, return_inverse=True)
 
-            if d not in buckets:
-                buckets[d] = {
-                    "temp": [],
-                    "rh": [],
-                    "hours": set(),
-                }
+    # None -> NaN
+    temp = np.array(temperature_2m, dtype=np.float64)
+    rh = np.array(relative_humidity_2m, dtype=np.float64)
 
-            buckets[d]["temp"].append(temp)
-            buckets[d]["rh"].append(rh)
-            buckets[d]["hours"].add(h)
+    day_str = np.datetime_as_string(days, unit="D").tolist()
+    return {
+        (start_hour, end_hour): _window_means(day_idx, hour, temp, rh, day_str, start_hour, end_hour)
+        for start_hour, end_hour in windows
+    }
 
-    out: list[WindowDailyAvg] = []
 
-    for d in sorted(buckets.keys()):
-        bucket = buckets[d]
+def daily_window_means_from_hourly(
+    *,
+    time: list[str],
+    temperature_2m: list[float],
+    relative_humidity_2m: list[float],
+    start_hour: int = 18,
+    end_hour: int = 23,
+) -> list[WindowDailyAvg]:
+    """
+    Agrega por día la media de temperatura y humedad relativa en la ventana horaria [start_hour, end_hour].
+    Se asume que 'time' viene en hora local si has llamado a Open-Meteo con timezone=<zona>.
+    Formato esperado en 'time': 'YYYY-MM-DDTHH:MM' (Open-Meteo típico).
 
-        hours: list[int] = sorted(bucket["hours"])
+    Devuelve una lista ordenada por fecha.
+    """
+    window = (start_hour, end_hour)
+    return daily_window_means_multi(
+        time=time,
+        temperature_2m=temperature_2m,
+        relative_humidity_2m=relative_humidity_2m,
+        windows=[window],
+    )[window]
 
-        out.append(
-            WindowDailyAvg(
-                date=d,
-                hours_used=hours,                 # ✔ list[int]
-                temp_mean_c=_mean(bucket["temp"]),
-                rh_mean_pct=_mean(bucket["rh"]),
-                n_samples=len(hours),
-            )
-        )
 
-    return out
+def cached_hourly_temp_rh(city: CityCfg, *, days: int = 7) -> dict:
+    """fetch_hourly_temp_rh a través de la caché del proceso (ver forecast_cache.py)."""
+    if not forecast_cache_enabled():
+        return fetch_hourly_temp_rh(city, days=days)
+    return shared_forecast_cache(fetch_hourly_temp_rh).get(city, days=days)
 
 
 def fetch_window_daily_means(city: CityCfg, *, days: int = 7, start_hour: int = 18, end_hour: int = 23):
@@ -171,9 +291,9 @@ def forecast_map_for_city(
         if p.exists():
             hourly = json.loads(p.read_text(encoding="utf-8"))
         else:
-            hourly = fetch_hourly_temp_rh(citycfg, days=window_days)
+            hourly = cached_hourly_temp_rh(citycfg, days=window_days)
     else:
-        hourly = fetch_hourly_temp_rh(citycfg, days=window_days)
+        hourly = cached_hourly_temp_rh(citycfg, days=window_days)
 
     daily = daily_window_means_from_hourly(
         time=hourly["time"],
@@ -185,3 +305,27 @@ def forecast_map_for_city(
 
     return {date.fromisoformat(d.date): d for d in daily}
 
+
+def forecast_maps_for_cities(
+    cities: Mapping[str, CityCfg],
+    *,
+    window_days: int = 7,
+    start_hour: int = 18,
+    end_hour: int = 23,
+) -> dict[str, dict[date, Any]]:
+    """
+    forecast_map_for_city de todas las ciudades a la vez (un hilo por ciudad): la
+    latencia es la de la ciudad más lenta, no la suma. Si alguna falla, se relanza
+    su excepción (como en la versión secuencial).
+    """
+    if not cities:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(cities), thread_name_prefix="forecast") as pool:
+        futures = {
+            name: pool.submit(
+                forecast_map_for_city, cfg,
+                window_days=window_days, start_hour=start_hour, end_hour=end_hour,
+            )
+            for name, cfg in cities.items()
+        }
+        return {name: fut.result() for name, fut in futures.items()}
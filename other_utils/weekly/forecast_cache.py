@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+from zoneinfo import ZoneInfo
+
+
+# -----------------------------
+# Caché de la previsión horaria (Open-Meteo)
+# -----------------------------
+#
+# Cada /weekly (y cada main.py) pedía la previsión de Madrid y París a Open-Meteo:
+# dos peticiones bloqueantes de hasta 20 s. Open-Meteo solo cambia la previsión cuando
+# entra una pasada nueva del modelo (del orden de una por hora), así que se guarda la
+# respuesta por (ciudad, días) en memoria y en disco:
+#   - edad < ttl                 -> se sirve sin ir a la red
+#   - ttl <= edad < ttl + stale  -> se sirve la copia y se refresca en segundo plano
+#   - más vieja o sin copia      -> se pide (y si la red falla, se sirve la copia vieja
+#                                   si tiene menos de max_age)
+#
+# Una copia cuyo primer día es anterior a hoy (hora local de la ciudad) no se sirve
+# nunca, ni como copia vieja: le falta el último día de la semana y
+# target_context_for_date no encontraría su previsión.
+#
+#   SANTILOTO_FORECAST_CACHE=0          desactiva la caché
+#   SANTILOTO_FORECAST_CACHE_DIR        directorio (por defecto ~/.cache/santiloto/forecast)
+#   SANTILOTO_FORECAST_TTL              segundos (por defecto 3600)
+#   SANTILOTO_FORECAST_STALE            segundos extra sirviendo copia vieja (por defecto 21600)
+#   SANTILOTO_FORECAST_MAX_AGE          edad máxima de la copia si falla la red (por defecto 86400)
+
+log = logging.getLogger(__name__)
+
+FORECAST_CACHE_FORMAT = 1
+DEFAULT_TTL = 3600
+DEFAULT_STALE = 6 * 3600
+DEFAULT_MAX_AGE = 24 * 3600
+
+Fetch = Callable[..., dict]
+
+
+def forecast_cache_enabled() -> bool:
+    return os.environ.get("SANTILOTO_FORECAST_CACHE", "1") != "0"
+
+
+def _env_seconds(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    try:
+        return int(raw) if raw else default
+    except ValueError:
+        log.warning("%s=%r no es un número de segundos; uso %s", name, raw, default)
+        return default
+
+
+class ForecastCache:
+    """Respuestas de fetch(city, days=...) por (city.key, days), con TTL y stale-while-revalidate."""
+
+    def __init__(
+            self,
+            fetch: Fetch,
+            *,
+            ttl: int = DEFAULT_TTL,
+            stale: int = DEFAULT_STALE,
+            max_age: int = DEFAULT_MAX_AGE,
+            directory: Optional[Path] = None,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale = stale
+        self.max_age = max_age
+        self.directory = directory
+        self.clock = clock
+        self._mem: dict[tuple[str, int], tuple[float, dict]] = {}
+        self._refreshing: set[tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, fetch: Fetch) -> ForecastCache:
+        raw = os.environ.get("SANTILOTO_FORECAST_CACHE_DIR")
+        return cls(
+            fetch,
+            ttl=_env_seconds("SANTILOTO_FORECAST_TTL", DEFAULT_TTL),
+            stale=_env_seconds("SANTILOTO_FORECAST_STALE", DEFAULT_STALE),
+            max_age=_env_seconds("SANTILOTO_FORECAST_MAX_AGE", DEFAULT_MAX_AGE),
+            directory=Path(raw) if raw else Path.home() / ".cache" / "santiloto" / "forecast",
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    # --- disco ---
+
+    def _path(self, key: tuple[str, int]) -> Optional[Path]:
+        return None if self.directory is None else self.directory / f"{key[0]}-{key[1]}d.json"
+
+    def _load(self, key: tuple[str, int]) -> Optional[tuple[float, dict]]:
+        p = self._path(key)
+        if p is None:
+            return None
+        try:
+            raw = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if raw.get("format") != FORECAST_CACHE_FORMAT:
+            return None
+        return float(raw["fetched_at"]), raw["hourly"]
+
+    def _save(self, key: tuple[str, int], fetched_at: float, hourly: dict) -> None:
+        p = self._path(key)
+        if p is None:
+            return
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=f".{p.stem}-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"format": FORECAST_CACHE_FORMAT, "fetched_at": fetched_at, "hourly": hourly}, f)
+            os.replace(tmp, p)
+        except OSError as e:
+            log.warning("No se pudo guardar la previsión en caché (%s): %s", p, e)
+
+    # --- acceso ---
+
+    def _entry(self, key: tuple[str, int]) -> Optional[tuple[float, dict]]:
+        with self._lock:
+            entry = self._mem.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                with self._lock:
+                    self._mem.setdefault(key, entry)
+        return entry
+
+    def _current(self, city, entry: tuple[float, dict]) -> bool:
+        """La copia empieza hoy o después (hora local de la ciudad)."""
+        times = entry[1].get("time") or []
+        today = datetime.fromtimestamp(self.clock(), ZoneInfo(city.timezone)).date()
+        return bool(times) and times[0][:10] >= today.isoformat()
+
+    def _fetch_and_store(self, city, days: int) -> dict:
+        key = (city.key, days)
+        hourly = self.fetch(city, days=days)
+        fetched_at = self.clock()
+        with self._lock:
+            self._mem[key] = (fetched_at, hourly)
+        self._save(key, fetched_at, hourly)
+        return hourly
+
+    def _refresh(self, city, days: int) -> None:
+        key = (city.key, days)
+        try:
+            self._fetch_and_store(city, days)
+            self._count("refreshes")
+        except Exception as e:
+            self._count("errors")
+            log.warning("Refresco de previsión %s falló: %s", city.key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, city, days: int) -> None:
+        key = (city.key, days)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(
+            target=self._refresh, args=(city, days), name=f"forecast-{city.key}", daemon=True
+        ).start()
+
+    def get(self, city, *, days: int = 7) -> dict:
+        key = (city.key, days)
+        entry = self._entry(key)
+        if entry is not None and not self._current(city, entry):
+            entry = None  # de un día anterior: no vale ni como copia de reserva
+        if entry is not None:
+            age = self.clock() - entry[0]
+            if age < self.ttl:
+                self._count("hits")
+                return entry[1]
+            if age < self.ttl + self.stale:
+                self._count("stale_hits")
+                self._refresh_in_background(city, days)
+                return entry[1]
+
+        self._count("misses")
+        try:
+            return self._fetch_and_store(city, days)
+        except Exception as e:
+            if entry is None or self.clock() - entry[0] >= self.max_age:
+                raise
+            self._count("errors")
+            log.warning("Previsión %s: la red falló (%s); uso la copia de hace %.0f s",
+                        city.key, e, self.clock() - entry[0])
+            return entry[1]
+
+
+_CACHE: Optional[ForecastCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def shared_forecast_cache(fetch: Fetch) -> ForecastCache:
+    """
+    Caché del proceso (la comparten todas las peticiones de la API).
+
+    Se crea en la primera llamada con ese `fetch` y los SANTILOTO_FORECAST_* de ese
+    momento; las llamadas siguientes devuelven la misma instancia y no vuelven a leer
+    el entorno. Pedirla con otro `fetch` es un error (ValueError): serviría las
+    respuestas del primero, también las guardadas en disco.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ForecastCache.from_env(fetch)
+        elif _CACHE.fetch is not fetch:
+            raise ValueError(
+                f"shared_forecast_cache ya existe con fetch={_CACHE.fetch!r}; no se puede pedir con {fetch!r}"
+            )
+        return _CACHE
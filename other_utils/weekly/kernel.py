@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from db_utils.history_store import HistArrays, HistArraysPrimitiva, HistArraysEuro
+
+
+# -----------------------------
+# Índice por bin lunar
+# -----------------------------
+
+@dataclass(frozen=True, eq=False)
+class MoonBinIndex:
+    """
+    Histórico particionado en los 8 bins lunares, con el bin ya calculado.
+    Cada bucket conserva el orden original de las filas (orden estable), así que
+    puntuar un bucket da exactamente lo mismo que filtrar el histórico completo.
+
+    `end` (opcional) limita cualquier consulta a las filas originales [0, end):
+    como row_ids es creciente dentro de cada bucket, eso es un prefijo del bucket
+    (una vista, sin copiar). Con el histórico ordenado por fecha, es "as of".
+    """
+    hist: HistArrays                  # histórico original (orden de carga)
+    buckets: tuple[HistArrays, ...]   # len=8, vistas sobre una única copia reordenada
+    row_ids: tuple[np.ndarray, ...]   # posición original de cada fila de cada bucket
+    cache: dict = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.hist)
+
+    def bucket_len(self, moon_bin: int, end: int | None = None) -> int:
+        """Filas del bucket con posición original < end."""
+        if end is None:
+            return len(self.buckets[moon_bin])
+        return int(np.searchsorted(self.row_ids[moon_bin], end, side="left"))
+
+    def bucket(self, moon_bin: int, end: int | None = None) -> HistArrays:
+        if end is None:
+            return self.buckets[moon_bin]
+        return self.buckets[moon_bin].select(slice(0, self.bucket_len(moon_bin, end)))
+
+    def temp_sorted(self, moon_bin: int) -> tuple[np.ndarray, np.ndarray]:
+        """(orden, temperaturas ordenadas) del bucket, para buscar vecinos por bisección."""
+        key = (moon_bin, "temp_sorted")
+        if key not in self.cache:
+            t = self.buckets[moon_bin].temp.astype(np.float64)
+            order = np.argsort(t, kind="stable")
+            self.cache[key] = (order, t[order])
+        return self.cache[key]
+
+    def temp_window(self, moon_bin: int, lo: float, hi: float, end: int | None = None) -> np.ndarray:
+        """Filas del bucket con lo <= temp <= hi (y anteriores a end), en orden original."""
+        order, sorted_t = self.temp_sorted(moon_bin)
+        a = np.searchsorted(sorted_t, lo, side="left")
+        b = np.searchsorted(sorted_t, hi, side="right")
+        rows = np.sort(order[a:b])
+        if end is not None:
+            rows = rows[:np.searchsorted(rows, self.bucket_len(moon_bin, end))]
+        return rows
+
+    def first_seen(self, moon_bin: int, column: str, size: int) -> np.ndarray:
+        """Primera aparición de cada valor de una columna en todo el bucket; se calcula una vez."""
+        key = (moon_bin, column, size)
+        if key not in self.cache:
+            values = _column_2d(self.buckets[moon_bin], column)
+            self.cache[key] = _first_seen(values, np.arange(len(values)), size)
+        return self.cache[key]
+
+    @classmethod
+    def of(cls, history: HistArrays | MoonBinIndex) -> MoonBinIndex:
+        return history if isinstance(history, MoonBinIndex) else cls.build(history)
+
+    @classmethod
+    def build(cls, hist: HistArrays) -> MoonBinIndex:
+        bins = hist.moon_bin
+        order = np.argsort(bins, kind="stable")
+        by_bin = hist.select(order)
+        offsets = np.searchsorted(bins[order], np.arange(9))
+
+        buckets = tuple(by_bin.select(slice(offsets[b], offsets[b + 1])) for b in range(8))
+        row_ids = tuple(order[offsets[b]:offsets[b + 1]] for b in range(8))
+        return cls(hist=hist, buckets=buckets, row_ids=row_ids)
+
+
+def history_arrays(history: HistArrays | MoonBinIndex) -> HistArrays:
+    """Histórico en columnas (orden de carga), indexado o no."""
+    if isinstance(history, MoonBinIndex):
+        return history.hist
+    return history
+
+
+def moon_bucket(history: HistArrays | MoonBinIndex, moon_bin: int, end: int | None = None) -> HistArrays:
+    """Filas del bin lunar `moon_bin` (entre las [0, end)): del índice si existe, filtrando si no."""
+    if isinstance(history, MoonBinIndex):
+        return history.bucket(moon_bin, end)
+    if end is not None:
+        history = history.select(slice(0, end))
+    return history.select(np.flatnonzero(history.moon_bin == moon_bin))
+
+
+# -----------------------------
+# Kernel vectorizado
+# -----------------------------
+
+def row_weights(
+        temp: np.ndarray,
+        rh: np.ndarray,
+        ah: np.ndarray,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        tols: tuple[float, float, float],
+) -> np.ndarray:
+    """
+    Peso gaussiano por fila: exp(-zT²)·exp(-zRH²)·exp(-zAH²).
+    Un único np.exp sobre la matriz (3, N); el producto se hace en el mismo orden
+    que gauss_score. Las columnas float32 se operan en float64.
+    """
+    tT, tRH, tAH = tols
+    z = np.empty((3, len(temp)), dtype=np.float64)
+    np.divide(np.subtract(temp, target_temp, dtype=np.float64), tT, out=z[0])
+    np.divide(np.subtract(rh, target_rh, dtype=np.float64), tRH, out=z[1])
+    np.divide(np.subtract(ah, target_ah, dtype=np.float64), tAH, out=z[2])
+    e = np.exp(-(z * z))
+    return e[0] * e[1] * e[2]
+
+
+def ranked_totals(
+        values: np.ndarray,
+        weights: np.ndarray | None = None,
+) -> dict[int, float]:
+    """
+    Suma `weights` por cada valor de `values` (N,) o (N, k) con np.bincount y
+    devuelve un dict ordenado por score desc. Los empates se resuelven por orden
+    de primera aparición, igual que sort_score_dict sobre un dict acumulado fila a fila.
+    """
+    flat = values.ravel()
+    if flat.size == 0:
+        return {}
+    if weights is not None and values.ndim == 2:
+        weights = np.repeat(weights, values.shape[1])
+    totals = np.bincount(flat, weights=weights)
+    uniq, first = np.unique(flat, return_index=True)
+    order = np.lexsort((first, -totals[uniq]))
+    keys = uniq[order]
+    return dict(zip(keys.tolist(), totals[keys].astype(np.float64).tolist()))
+
+
+def _within_cutoff(
+        bucket: HistArrays,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        tols: tuple[float, float, float],
+        cutoff: float,
+) -> np.ndarray:
+    tT, tRH, tAH = tols
+    return (
+        (np.abs(np.subtract(bucket.temp, target_temp, dtype=np.float64)) <= cutoff * tT)
+        & (np.abs(np.subtract(bucket.rh, target_rh, dtype=np.float64)) <= cutoff * tRH)
+        & (np.abs(np.subtract(bucket.ah, target_ah, dtype=np.float64)) <= cutoff * tAH)
+    )
+
+
+def neighbours(
+        history: HistArrays | MoonBinIndex,
+        moon_bin: int,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        tols: tuple[float, float, float],
+        cutoff: float | None = None,
+        end: int | None = None,
+) -> HistArrays:
+    """
+    Filas candidatas para un target. Sin cutoff es el bucket lunar completo.
+    Con cutoff (kernel truncado) solo las filas a <= cutoff·tol en T, RH y AH;
+    con índice los candidatos salen de una bisección sobre la temperatura.
+    `end` restringe a las filas originales [0, end).
+    """
+    if cutoff is None:
+        return moon_bucket(history, moon_bin, end)
+
+    kT = cutoff * tols[0]
+    if isinstance(history, MoonBinIndex):
+        rows = history.temp_window(moon_bin, target_temp - kT, target_temp + kT, end)
+        bucket = history.bucket(moon_bin).select(rows)
+    else:
+        bucket = moon_bucket(history, moon_bin, end)
+
+    keep = _within_cutoff(
+        bucket,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols, cutoff=cutoff,
+    )
+    return bucket.select(np.flatnonzero(keep))
+
+
+def _bucket_weights(
+        bucket: HistArrays,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        tols: tuple[float, float, float],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Devuelve (máscara de filas con peso > 0, pesos de esas filas) dentro del bucket."""
+    w = row_weights(
+        bucket.temp, bucket.rh, bucket.ah,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols,
+    )
+    keep = w > 0.0
+    return keep, w[keep]
+
+
+def score_primitiva_arrays(
+        hist: HistArraysPrimitiva | MoonBinIndex,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        target_moon_bin: int,
+        tols: tuple[float, float, float],
+        cutoff: float | None = None,
+        end: int | None = None,
+) -> tuple[dict[int, float], dict[int, float]]:
+    bucket = neighbours(
+        hist, target_moon_bin,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols, cutoff=cutoff, end=end,
+    )
+    keep, w = _bucket_weights(
+        bucket,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols,
+    )
+    s_nums = ranked_totals(bucket.nums[keep], w)
+
+    # reintegro (0..9); los sorteos sin reintegro no puntúan
+    re = bucket.re[keep]
+    has_re = re >= 0
+    s_re = ranked_totals(re[has_re], w[has_re])
+    return s_nums, s_re
+
+
+def score_euro_arrays(
+        hist: HistArraysEuro | MoonBinIndex,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        target_moon_bin: int,
+        tols: tuple[float, float, float],
+        cutoff: float | None = None,
+        end: int | None = None,
+) -> tuple[dict[int, float], dict[int, float]]:
+    bucket = neighbours(
+        hist, target_moon_bin,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols, cutoff=cutoff, end=end,
+    )
+    keep, w = _bucket_weights(
+        bucket,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols,
+    )
+    return ranked_totals(bucket.nums[keep], w), ranked_totals(bucket.stars[keep], w)
+
+
+@dataclass(frozen=True)
+class TruncationReport:
+    """Diferencia entre el kernel exacto y el truncado para un target."""
+    cutoff: float
+    rows_exact: int       # filas del bin lunar
+    rows_truncated: int   # filas dentro de cutoff·tol
+    weight_kept: float    # fracción del peso total que conserva el kernel truncado
+    top_n: int
+    top_overlap: float    # |top_n exacto ∩ top_n truncado| / top_n
+    same_ranking: bool    # mismo orden completo de números
+
+
+def truncation_report(
+        history: HistArrays | MoonBinIndex,
+        *,
+        target_temp: float,
+        target_rh: float,
+        target_ah: float,
+        target_moon_bin: int,
+        tols: tuple[float, float, float],
+        cutoff: float,
+        top_n: int,
+        end: int | None = None,
+) -> TruncationReport:
+    """Compara el ranking de números del kernel exacto con el del truncado."""
+    bucket = moon_bucket(history, target_moon_bin, end)
+    keep, w = _bucket_weights(
+        bucket,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols,
+    )
+    inside = _within_cutoff(
+        bucket,
+        target_temp=target_temp, target_rh=target_rh, target_ah=target_ah,
+        tols=tols, cutoff=cutoff,
+    )
+    inside_kept = inside[keep]
+
+    exact = list(ranked_totals(bucket.nums[keep], w))
+    trunc = list(ranked_totals(bucket.nums[keep][inside_kept], w[inside_kept]))
+
+    total = float(w.sum())
+    top_exact, top_trunc = set(exact[:top_n]), set(trunc[:top_n])
+    return TruncationReport(
+        cutoff=cutoff,
+        rows_exact=len(bucket),
+        rows_truncated=int(inside.sum()),
+        weight_kept=float(w[inside_kept].sum()) / total if total > 0 else 1.0,
+        top_n=top_n,
+        top_overlap=len(top_exact & top_trunc) / top_n if top_n else 1.0,
+        same_ranking=exact == trunc,
+    )
+
+
+# -----------------------------
+# Scoring por lotes (varios targets a la vez)
+# -----------------------------
+
+_NOT_SEEN = np.iinfo(np.int64).max
+
+
+@dataclass(frozen=True, eq=False)
+class ScoreMatrix:
+    """
+    Scores de varios targets: fila = target, columna = número (o reintegro/estrella).
+    `present` marca los valores que aparecen en alguna fila con peso > 0 y
+    `first_seen` su orden de primera aparición, para desempatar como ranked_totals.
+    """
+    scores: np.ndarray      # (T, K) float
+    present: np.ndarray     # (T, K) bool
+    first_seen: np.ndarray  # (T, K) int
+
+    def __len__(self) -> int:
+        return self.scores.shape[0]
+
+    def ranking(self, t: int) -> dict[int, float]:
+        """Ranking del target `t` en el mismo formato que score_*_for_target."""
+        keys = np.flatnonzero(self.present[t])
+        order = np.lexsort((self.first_seen[t, keys], -self.scores[t, keys]))
+        keys = keys[order]
+        return dict(zip(keys.tolist(), self.scores[t, keys].tolist()))
+
+
+def _column_2d(hist: HistArrays, column: str) -> np.ndarray:
+    values = getattr(hist, column)
+    return values.reshape(len(values), -1)
+
+
+def _column_size(hist: HistArrays, column: str) -> int:
+    values = getattr(hist, column)
+    return int(values.max()) + 1 if values.size else 0
+
+
+def _first_seen(values: np.ndarray, rows: np.ndarray, size: int) -> np.ndarray:
+    """Clave de primera aparición (fila * k + posición) de cada valor en `rows`."""
+    k = values.shape[1]
+    keys = (rows[:, None] * k + np.arange(k)).ravel()
+    flat = values[rows].ravel()
+    valid = flat >= 0
+    first = np.full(size, _NOT_SEEN, dtype=np.int64)
+    np.minimum.at(first, flat[valid], keys[valid])
+    return first
+
+
+def _bincount_rows(values: np.ndarray, weights: np.ndarray, size: int) -> np.ndarray:
+    """
+    Totales (T, size) de los pesos (T, R) por cada valor de `values` (R, k).
+    Un único np.bincount con un desplazamiento por target: cada total se acumula
+    fila a fila en el orden del histórico, igual que ranked_totals (un producto
+    matricial sumaría en otro orden y los casi empates podrían cambiar de puesto).
+    Los valores negativos (reintegro nulo) se ignoran.
+    """
+    n_t = len(weights)
+    valid = values >= 0
+    flat = values[valid]                                 # (V,) en orden fila, posición
+    row = np.broadcast_to(np.arange(len(values))[:, None], values.shape)[valid]
+    keys = (np.arange(n_t)[:, None] * size + flat[None, :]).ravel()
+    totals = np.bincount(keys, weights=weights[:, row].ravel(), minlength=n_t * size)
+    return totals.reshape(n_t, size)
+
+
+def batch_weights(
+        bucket: HistArrays,
+        temps: np.ndarray,
+        rhs: np.ndarray,
+        ahs: np.ndarray,
+        tols: np.ndarray,
+) -> np.ndarray:
+    """Pesos (T, R) de T targets contra las R filas del bucket, por broadcasting."""
+    z = np.empty((3, len(temps), len(bucket)), dtype=np.float64)
+    np.divide(bucket.temp[None, :] - temps[:, None], tols[:, 0, None], out=z[0])
+    np.divide(bucket.rh[None, :] - rhs[:, None], tols[:, 1, None], out=z[1])
+    np.divide(bucket.ah[None, :] - ahs[:, None], tols[:, 2, None], out=z[2])
+    e = np.exp(-(z * z))
+    return e[0] * e[1] * e[2]
+
+
+def score_batch(
+        index: MoonBinIndex,
+        columns: tuple[str, ...],
+        *,
+        temps: np.ndarray,
+        rhs: np.ndarray,
+        ahs: np.ndarray,
+        moon_bins: np.ndarray,
+        tols: np.ndarray,
+        cutoff: float | None = None,
+        end: int | None = None,
+        chunk_size: int = 256,
+) -> tuple[ScoreMatrix, ...]:
+    """
+    Puntúa T targets de una vez. Por cada bin lunar se calcula la matriz de pesos
+    targets x filas y los totales de cada columna ("nums", "re", "stars") salen de
+    np.bincount, sumando fila a fila en el mismo orden que ranked_totals (mismos
+    scores bit a bit que puntuar cada target por separado). Devuelve una ScoreMatrix
+    por columna.
+
+    Con `cutoff` (kernel truncado) los targets de cada bin se agrupan por temperatura
+    y cada grupo solo recorre la ventana de filas que lo cubre (bisección); dentro de
+    ella, las filas fuera de cutoff·tol en T, RH o AH pesan 0.
+
+    Con `end` solo cuentan las filas originales [0, end): prefijos de cada bucket,
+    sin copiar el histórico.
+    """
+    temps = np.asarray(temps, dtype=np.float64)
+    rhs = np.asarray(rhs, dtype=np.float64)
+    ahs = np.asarray(ahs, dtype=np.float64)
+    moon_bins = np.asarray(moon_bins, dtype=np.int64)
+    tols = np.asarray(tols, dtype=np.float64).reshape(-1, 3)
+
+    n = len(temps)
+    sizes = [_column_size(index.hist, c) for c in columns]
+    scores = [np.zeros((n, k), dtype=np.float64) for k in sizes]
+    present = [np.zeros((n, k), dtype=bool) for k in sizes]
+    first = [np.full((n, k), _NOT_SEEN, dtype=np.int64) for k in sizes]
+
+    for b in np.unique(moon_bins).tolist():
+        n_b = index.bucket_len(b, end)
+        if n_b == 0:
+            continue
+        bucket = index.bucket(b, end)
+        targets_b = np.flatnonzero(moon_bins == b)
+        if cutoff is not None:
+            targets_b = targets_b[np.argsort(temps[targets_b], kind="stable")]
+        firsts = [index.first_seen(b, c, k) for c, k in zip(columns, sizes)]
+        values = [_column_2d(bucket, c) for c in columns]
+
+        for start in range(0, len(targets_b), chunk_size):
+            t = targets_b[start:start + chunk_size]
+            if cutoff is None:
+                rows = np.arange(len(bucket))
+                sub = bucket
+            else:
+                k = cutoff * tols[t]
+                rows = index.temp_window(
+                    b, float((temps[t] - k[:, 0]).min()), float((temps[t] + k[:, 0]).max()), end,
+                )
+                sub = bucket.select(rows)
+
+            w = batch_weights(sub, temps[t], rhs[t], ahs[t], tols[t])
+            if cutoff is not None:
+                inside = (
+                    (np.abs(sub.temp[None, :] - temps[t][:, None]) <= k[:, 0, None])
+                    & (np.abs(sub.rh[None, :] - rhs[t][:, None]) <= k[:, 1, None])
+                    & (np.abs(sub.ah[None, :] - ahs[t][:, None]) <= k[:, 2, None])
+                )
+                w = np.where(inside, w, 0.0)
+
+            pos = w > 0.0
+            all_rows = pos.all(axis=1) if cutoff is None else np.zeros(len(t), dtype=bool)
+
+            for ci, first_all in enumerate(firsts):
+                values_rows = values[ci] if cutoff is None else values[ci][rows]
+                scores[ci][t] = _bincount_rows(values_rows, w, sizes[ci])
+                present[ci][t] = _bincount_rows(values_rows, pos.astype(np.float64), sizes[ci]) > 0.0
+                first[ci][t[all_rows]] = first_all
+                for j in np.flatnonzero(~all_rows):
+                    first[ci][t[j]] = _first_seen(values[ci], rows[pos[j]], sizes[ci])
+
+    return tuple(ScoreMatrix(scores=s, present=p, first_seen=f) for s, p, f in zip(scores, present, first))
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional, Sequence
+
+import numpy as np
+
+from db_utils.history_store import HistArrays
+from other_utils.weekly.bitmask import combo_mask, combo_masks
+from other_utils.weekly.types import Apuesta_Primitiva, Apuesta_Euromillones
+
+
+# -----------------------------
+# Índice de combinaciones premiadas en el histórico
+# -----------------------------
+#
+# Para cada sorteo pasado se guardan, como máscaras de bits, la combinación completa
+# (k números) y sus k subconjuntos de k-1 números:
+#   - Primitiva: 6 y 5 aciertos
+#   - Euromillones: 5 y 4 aciertos (solo números; las estrellas del sorteo se anotan)
+# Comprobar una combinación es 1 + k búsquedas en un dict: O(1) por combinación.
+# Cada máscara apunta a todos los sorteos (por fecha) en que salió: en Euromillones
+# las estrellas acertadas se miran en cada uno de ellos, no solo en el primero.
+
+
+@dataclass(frozen=True)
+class PrizeMatch:
+    aciertos: int            # k o k-1
+    row: int                 # fila del histórico del primer sorteo que coincide
+    fecha: date
+    rows: tuple[int, ...]    # filas de todos los sorteos con esos aciertos, por fecha
+
+
+@dataclass(frozen=True, eq=False)
+class PrizeIndex:
+    fecha: np.ndarray                # (N,) datetime64[D], ordenado
+    stars: Optional[np.ndarray]      # (N, 2) en Euromillones, None en Primitiva
+    k: int
+    full: dict[int, tuple[int, ...]]   # máscara k números -> filas
+    sub: dict[int, tuple[int, ...]]    # máscara k-1 números -> filas
+
+    def __len__(self) -> int:
+        return len(self.fecha)
+
+    def _match(self, rows: tuple[int, ...], aciertos: int) -> PrizeMatch:
+        return PrizeMatch(aciertos=aciertos, row=rows[0], fecha=self.fecha[rows[0]].item(), rows=rows)
+
+    def check(self, combo: Sequence[int]) -> Optional[PrizeMatch]:
+        """Mejor coincidencia (k o k-1 aciertos) de una combinación con el histórico."""
+        m = combo_mask(combo)
+        rows = self.full.get(m)
+        if rows is not None:
+            return self._match(rows, self.k)
+        rows = [r for s in (m ^ (1 << int(n)) for n in combo) for r in self.sub.get(s, ())]
+        if rows:
+            return self._match(tuple(sorted(rows)), self.k - 1)
+        return None
+
+    def stars_hits(self, match: PrizeMatch, stars: Sequence[int]) -> tuple[int, int]:
+        """
+        (estrellas acertadas, fila) del mejor de los sorteos de `match`; a igualdad,
+        el primero por fecha (solo Euromillones).
+        """
+        if self.stars is None:
+            raise TypeError("El índice no tiene estrellas (no es de Euromillones)")
+        combo = set(int(s) for s in stars)
+        hits = [len(combo.intersection(self.stars[r].tolist())) for r in match.rows]
+        best = int(np.argmax(hits))
+        return hits[best], match.rows[best]
+
+    def check_primitiva(self, ap: Apuesta_Primitiva) -> list[Optional[PrizeMatch]]:
+        return [self.check(c) for c in ap.combinaciones]
+
+    def check_euromillones(self, ap: Apuesta_Euromillones) -> list[Optional[PrizeMatch]]:
+        return [self.check(nums) for nums, _ in ap.combinaciones]
+
+    @classmethod
+    def build(cls, fecha: np.ndarray, nums: np.ndarray, stars: Optional[np.ndarray] = None) -> PrizeIndex:
+        """Índice sobre sorteos ordenados por fecha: nums (N, k), stars (N, 2) opcional."""
+        n, k = nums.shape
+        nums = nums.astype(np.uint64)
+        full = combo_masks(nums)
+        # quitar un número = apagar su bit
+        sub = full[:, None] ^ np.left_shift(np.uint64(1), nums)
+        return cls(
+            fecha=fecha,
+            stars=stars,
+            k=k,
+            full=_rows_by_mask(full, np.arange(n)),
+            sub=_rows_by_mask(sub.ravel(), np.repeat(np.arange(n), k)),
+        )
+
+    @classmethod
+    def of(cls, hist: HistArrays) -> PrizeIndex:
+        """Índice sobre un histórico en columnas (solo sorteos con influencers)."""
+        return cls.build(hist.fecha, hist.nums, getattr(hist, "stars", None))
+
+    @classmethod
+    def from_records(cls, rows: Sequence[Sequence], k: int) -> PrizeIndex:
+        """
+        Filas (fecha, n1..nk[, e1, e2]) de Primitiva/Euromillones ordenadas por fecha.
+        Las filas con algún número NULL se descartan.
+        """
+        if not rows:
+            return cls.build(np.zeros(0, dtype="datetime64[D]"), np.zeros((0, k), dtype=np.uint8))
+        m = np.array([r[1:] for r in rows], dtype=np.float64)
+        ok = ~np.isnan(m).any(axis=1)
+        fecha = np.array([str(r[0])[:10] for r in rows], dtype="datetime64[D]")[ok]
+        m = m[ok].astype(np.uint8)
+        return cls.build(fecha, m[:, :k], m[:, k:k + 2] if m.shape[1] > k else None)
+
+
+def _rows_by_mask(masks: np.ndarray, rows: np.ndarray) -> dict[int, tuple[int, ...]]:
+    """Máscara -> filas en que aparece, en orden (rows llega ordenado)."""
+    order = np.argsort(masks, kind="stable")
+    uniq, start = np.unique(masks[order], return_index=True)
+    groups = np.split(rows[order], start[1:])
+    return dict(zip(uniq.tolist(), (tuple(g.tolist()) for g in groups)))
+
+
+# -----------------------------
+# Filas para PremiadosPrimi / PremiadosEuro
+# -----------------------------
+
+def premiados_primitiva_rows(
+        index: PrizeIndex,
+        apuestas: Sequence[tuple[date, Apuesta_Primitiva]],
+        signatures: Sequence[str],
+) -> list[tuple]:
+    """(target_date, signature, combo_idx, mask, aciertos, fecha_sorteo) de cada combinación premiada."""
+    out: list[tuple] = []
+    for (d, ap), sig in zip(apuestas, signatures):
+        for ci, (combo, m) in enumerate(zip(ap.combinaciones, index.check_primitiva(ap)), start=1):
+            if m is not None:
+                out.append((d.isoformat(), sig, ci, combo_mask(combo), m.aciertos, m.fecha.isoformat()))
+    return out
+
+
+def premiados_euro_rows(
+        index: PrizeIndex,
+        apuestas: Sequence[tuple[date, Apuesta_Euromillones]],
+        signatures: Sequence[str],
+) -> list[tuple]:
+    """
+    (target_date, signature, combo_idx, mask, aciertos, estrellas, fecha_sorteo) por combinación
+    premiada: de los sorteos con esos aciertos en números, el de más estrellas acertadas.
+    """
+    if index.stars is None:
+        raise TypeError("premiados_euro_rows necesita un índice de Euromillones")
+    out: list[tuple] = []
+    for (d, ap), sig in zip(apuestas, signatures):
+        for ci, ((nums, stars), m) in enumerate(zip(ap.combinaciones, index.check_euromillones(ap)), start=1):
+            if m is not None:
+                hits, row = index.stars_hits(m, stars)
+                out.append((
+                    d.isoformat(), sig, ci, combo_mask(nums), m.aciertos,
+                    hits, index.fecha[row].item().isoformat(),
+                ))
+    return out
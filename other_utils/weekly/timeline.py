@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+from other_utils.weekly.kernel import (
+    HistArrays,
+    HistArraysPrimitiva,
+    MoonBinIndex,
+    _column_2d,
+    _column_size,
+    _first_seen,
+)
+
+
+# -----------------------------
+# Histórico "as of" una fecha
+# -----------------------------
+#
+# El histórico viene ordenado por fecha (load_history_* hace ORDER BY fecha), así que
+# "los sorteos anteriores a X" son siempre las filas [0, end) con end = bisección de X.
+# Sobre eso:
+#   - recuentos acumulados por valor: counts[c][end] son las frecuencias globales
+#     hasta end, y counts[c][b] - counts[c][a] las de cualquier tramo; O(1) por consulta
+#   - primera aparición global de cada valor: en un prefijo coincide con la del prefijo,
+#     así que los desempates de ranked_totals salen sin recorrer nada
+#   - el MoonBinIndex completo, que acepta `end` para puntuar sin copiar filas
+
+
+def _counts(values: np.ndarray, size: int) -> np.ndarray:
+    """(N + 1, size) int32: fila i = apariciones de cada valor en las filas [0, i)."""
+    n = len(values)
+    out = np.zeros((n + 1, size), dtype=np.int32)
+    r, c = np.nonzero(values >= 0)
+    np.add.at(out[1:], (r, values[r, c]), 1)
+    np.cumsum(out, axis=0, out=out)
+    return out
+
+
+@dataclass(frozen=True, eq=False)
+class HistoryTimeline:
+    """Histórico ordenado por fecha + recuentos acumulados por columna."""
+    index: MoonBinIndex
+    counts: dict[str, np.ndarray]       # columna -> (N + 1, K) acumulados
+    first_seen: dict[str, np.ndarray]   # columna -> (K,) primera aparición (fila * k + pos)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def hist(self) -> HistArrays:
+        return self.index.hist
+
+    def cutoff_index(self, d: date) -> int:
+        """Número de sorteos estrictamente anteriores a `d` (= `end` para puntuar as of d)."""
+        return int(np.searchsorted(self.hist.fecha, np.datetime64(d, "D"), side="left"))
+
+    def totals(self, column: str, end: int, start: int = 0) -> np.ndarray:
+        """Apariciones de cada valor de `column` en las filas [start, end)."""
+        c = self.counts[column]
+        return c[end] if start == 0 else c[end] - c[start]
+
+    def ranked(self, column: str, end: int) -> dict[int, float]:
+        """
+        ranked_totals(column[:end]) sin recontar: frecuencia desc y, a igualdad,
+        orden de primera aparición. Los reintegros nulos no cuentan.
+        """
+        totals = self.counts[column][end]
+        keys = np.flatnonzero(totals > 0)
+        order = np.lexsort((self.first_seen[column][keys], -totals[keys]))
+        keys = keys[order]
+        return dict(zip(keys.tolist(), totals[keys].astype(np.float64).tolist()))
+
+    def as_of(self, d: date) -> HistoryAsOf:
+        return HistoryAsOf(timeline=self, end=self.cutoff_index(d))
+
+    @classmethod
+    def build(cls, history: HistArrays | MoonBinIndex) -> HistoryTimeline:
+        index = MoonBinIndex.of(history)
+        hist = index.hist
+        if len(hist) > 1 and np.any(hist.fecha[1:] < hist.fecha[:-1]):
+            raise ValueError("HistoryTimeline necesita el histórico ordenado por fecha")
+
+        columns = ("nums", "re") if isinstance(hist, HistArraysPrimitiva) else ("nums", "stars")
+        counts: dict[str, np.ndarray] = {}
+        first_seen: dict[str, np.ndarray] = {}
+        for c in columns:
+            values = _column_2d(hist, c).astype(np.int64)
+            size = _column_size(hist, c)
+            counts[c] = _counts(values, size)
+            first_seen[c] = _first_seen(values, np.arange(len(values)), size)
+        return cls(index=index, counts=counts, first_seen=first_seen)
+
+
+@dataclass(frozen=True)
+class HistoryAsOf:
+    """Vista del histórico con solo los sorteos anteriores a una fecha (filas [0, end))."""
+    timeline: HistoryTimeline
+    end: int
+
+    @property
+    def index(self) -> MoonBinIndex:
+        # el índice completo; las funciones de scoring reciben `end=self.end`
+        return self.timeline.index
+
+    @property
+    def hist(self) -> HistArrays:
+        return self.timeline.hist.select(slice(0, self.end))
+
+    def totals(self, column: str) -> np.ndarray:
+        return self.timeline.totals(column, self.end)
+
+    def ranked(self, column: str) -> dict[int, float]:
+        return self.timeline.ranked(column, self.end)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import argparse
+import logging
+
+from constants import DBFILE
+from db_utils.db_management import DBManager
+from other_utils.humidity_meteostat import EVENING_METHOD
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description=f"Recalcula las filas de SorteoInfluencers con method distinto de {EVENING_METHOD!r}."
+    )
+    p.add_argument("--db", default=DBFILE)
+    p.add_argument("--dry-run", action="store_true", help="solo cuenta las filas a recalcular")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    with DBManager(args.db) as db:
+        antiguas = db.obtener_fechas_influencers_a_recalcular()
+        print(f"Filas con otro método: {len(antiguas)}")
+        if args.dry_run or not antiguas:
+            return
+        db.sync_sorteo_influencers(recalcular=True)
+        print(f"Quedan con otro método: {len(db.obtener_fechas_influencers_a_recalcular())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from datetime import date
+
+from constants import DBFILE
+from db_utils.db_management import DBManager
+from other_utils.weekly.backtest import DEFAULT_CHUNK_WEEKS, run_backtest, summarize
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Backtest walk-forward del método semanal.")
+    p.add_argument("--db", default=DBFILE)
+    p.add_argument("--game", choices=("primitiva", "euromillones", "both"), default="both")
+    p.add_argument("--start", type=date.fromisoformat, default=None, help="YYYY-MM-DD")
+    p.add_argument("--end", type=date.fromisoformat, default=None, help="YYYY-MM-DD")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--chunk", type=int, default=DEFAULT_CHUNK_WEEKS)
+    p.add_argument("--cutoff", type=float, default=None)
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    with DBManager(args.db) as db:
+        hists = {}
+        if args.game in ("primitiva", "both"):
+            hists["Primitiva"] = db.load_history_primitiva()
+        if args.game in ("euromillones", "both"):
+            hists["Euromillones"] = db.load_history_euromillones()
+
+    for game, hist in hists.items():
+        t0 = time.perf_counter()
+        weeks = run_backtest(
+            hist,
+            start=args.start,
+            end=args.end,
+            cutoff=args.cutoff,
+            workers=args.workers,
+            chunk_weeks=args.chunk,
+        )
+        s = summarize(game, weeks, hist)
+        print(f"== {game} ({time.perf_counter() - t0:.1f}s)")
+        print(f"semanas: {s.weeks}  sorteos: {s.draws}  combinaciones: {s.combinaciones}  saltados: {s.skipped}")
+        print("aciertos números:", s.num_hits)
+        print("aciertos reintegro:" if game == "Primitiva" else "aciertos estrellas:", s.extra_hits)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def loto_db(tmp_path):
+    """Base con las tablas de sorteos y SorteoInfluencers (sin tablas derivadas)."""
+    path = tmp_path / "loto.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Primitiva (
+          fecha TEXT PRIMARY KEY,
+          n1 INTEGER, n2 INTEGER, n3 INTEGER, n4 INTEGER, n5 INTEGER, n6 INTEGER, re INTEGER
+        );
+        CREATE TABLE Euromillones (
+          fecha TEXT PRIMARY KEY,
+          n1 INTEGER, n2 INTEGER, n3 INTEGER, n4 INTEGER, n5 INTEGER, e1 INTEGER, e2 INTEGER
+        );
+        CREATE TABLE SorteoInfluencers (
+          juego TEXT NOT NULL, fecha DATE NOT NULL, ciudad TEXT NOT NULL,
+          temp_media REAL, rhum_media REAL, ahum_media REAL,
+          luna_phase_value REAL, luna_fase TEXT,
+          source TEXT, station_id TEXT, method TEXT, ingested_at TEXT,
+          PRIMARY KEY (juego, fecha)
+        );
+    """)
+    conn.close()
+    return path
@@ -0,0 +1,96 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from db_utils.history_store import HistArraysEuro, HistArraysPrimitiva
+from other_utils.weekly.backtest import backtest_week, run_backtest, summarize, week_starts
+from other_utils.weekly.timeline import HistoryTimeline
+
+
+def _rows(game: str, n: int = 240, seed: int = 7) -> list[tuple]:
+    """Sorteos en días alternos (2004-01-05 es lunes) con meteo y luna aleatorias."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        fecha = date.fromordinal(date(2004, 1, 5).toordinal() + 2 * i).isoformat()
+        if game == "Primitiva":
+            combo = (*sorted(rng.choice(np.arange(1, 50), 6, replace=False).tolist()), int(rng.integers(0, 10)))
+        else:
+            combo = (*sorted(rng.choice(np.arange(1, 51), 5, replace=False).tolist()),
+                     *sorted(rng.choice(np.arange(1, 13), 2, replace=False).tolist()))
+        meteo = (float(rng.uniform(-5, 35)), float(rng.uniform(20, 100)), float(rng.uniform(1, 20)),
+                 float(rng.uniform(0, 28)))
+        rows.append((fecha, *combo, *meteo))
+    return rows
+
+
+CLS = {"Primitiva": HistArraysPrimitiva, "Euromillones": HistArraysEuro}
+
+
+def _alterar_desde(rows: list[tuple], game: str, fecha: date, seed: int) -> list[tuple]:
+    """Cambia los números de los sorteos desde `fecha` (incluida) y la meteo de las semanas siguientes."""
+    rng = np.random.default_rng(seed)
+    lunes_siguiente = date.fromordinal(fecha.toordinal() + 7)
+    out = []
+    for row in rows:
+        d = date.fromisoformat(row[0])
+        if d < fecha:
+            out.append(row)
+            continue
+        otro = _rows(game, n=1, seed=int(rng.integers(1 << 30)))[0]
+        meteo = row[8:] if d < lunes_siguiente else otro[8:]
+        out.append((row[0], *otro[1:8], *meteo))
+    return out
+
+
+def _apuestas(week):
+    return [(dr.fecha, dr.frac, dr.combinaciones, dr.extra) for dr in week.draws]
+
+
+@pytest.mark.parametrize("game", ["Primitiva", "Euromillones"])
+def test_semana_solo_usa_sorteos_anteriores(game):
+    rows = _rows(game)
+    hist = CLS[game].from_records(rows)
+    weeks = run_backtest(hist, workers=1)
+    assert weeks
+
+    for week in weeks[1::9]:
+        assert week.history_rows == int(np.count_nonzero(hist.fecha < np.datetime64(week.week_start, "D")))
+        assert all(dr.fecha >= week.week_start for dr in week.draws)
+
+        # con otros resultados desde el lunes (y otra meteo desde la semana siguiente)
+        # las apuestas de la semana son las mismas
+        alterado = CLS[game].from_records(_alterar_desde(rows, game, week.week_start, seed=week.history_rows))
+        timeline = HistoryTimeline.build(alterado)
+        end = week.history_rows + len(week.draws)
+        otra = backtest_week(timeline, start=week.history_rows, end=end)
+        assert _apuestas(otra) == _apuestas(week)
+
+
+def test_aciertos_contra_el_sorteo_real():
+    rows = _rows("Primitiva")
+    hist = HistArraysPrimitiva.from_records(rows)
+    by_date = {date.fromisoformat(r[0]): r for r in rows}
+    weeks = run_backtest(hist, workers=1)
+    for week in weeks:
+        for dr in week.draws:
+            real = by_date[dr.fecha]
+            assert dr.num_hits == tuple(len(set(c) & set(real[1:7])) for c in dr.combinaciones)
+            assert dr.extra_hits == (int(dr.extra[0] == real[7]),)
+
+    summary = summarize("Primitiva", weeks, hist)
+    assert summary.draws == sum(len(w.draws) for w in weeks)
+    assert summary.draws + summary.skipped == int(np.count_nonzero(
+        hist.fecha >= np.datetime64(weeks[0].week_start, "D")
+    ))
+
+
+def test_procesos_igual_que_en_serie():
+    hist = HistArraysEuro.from_records(_rows("Euromillones", n=120))
+    assert run_backtest(hist, workers=2, chunk_weeks=8) == run_backtest(hist, workers=1)
+
+
+def test_week_starts_lunes():
+    fechas = np.array(["2026-02-02", "2026-02-07", "2026-02-08", "2026-02-09"], dtype="datetime64[D]")
+    assert week_starts(fechas).astype(str).tolist() == ["2026-02-02"] * 3 + ["2026-02-09"]
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from db_utils.history_store import HistArraysEuro
+from other_utils.weekly.bitmask import (
+    best_matches,
+    combo_mask,
+    combo_masks,
+    euro_masks,
+    history_masks,
+    mask_numbers,
+    masks_of,
+    match_counts,
+    match_histogram,
+    popcount,
+)
+from other_utils.weekly.types import Apuesta_Euromillones
+
+
+def _combos(rng: random.Random, n: int, k: int, top: int) -> list[tuple[int, ...]]:
+    return [tuple(sorted(rng.sample(range(1, top + 1), k))) for _ in range(n)]
+
+
+def test_mascara_ida_y_vuelta():
+    rng = random.Random(9)
+    for combo in _combos(rng, 50, 6, 49) + _combos(rng, 50, 2, 12):
+        m = combo_mask(combo)
+        assert mask_numbers(m) == combo
+        assert int(popcount(np.uint64(m))) == len(combo)
+    assert combo_masks(np.array(_combos(rng, 5, 5, 50))).dtype == np.uint64
+
+
+def test_aciertos_igual_que_interseccion_de_conjuntos():
+    rng = random.Random(10)
+    for k, top in [(6, 49), (5, 50), (2, 12)]:
+        bets = _combos(rng, 40, k, top)
+        draws = _combos(rng, 300, k, top)
+        got = match_counts(masks_of(bets), masks_of(draws))
+        assert got.shape == (40, 300)
+        expected = [[len(set(a) & set(b)) for b in draws] for a in bets]
+        assert got.tolist() == expected
+
+        # escalar en un lado
+        assert match_counts(masks_of(bets), combo_mask(draws[0])).tolist() == [row[0] for row in expected]
+
+        assert best_matches(masks_of(bets), masks_of(draws)).tolist() == [max(row) for row in expected]
+        hist = match_histogram(masks_of(bets), masks_of(draws), k)
+        assert hist.tolist() == [[row.count(i) for i in range(k + 1)] for row in expected]
+
+
+def test_sin_historico():
+    bets = masks_of([(1, 2, 3, 4, 5, 6)])
+    assert best_matches(bets, np.zeros(0, dtype=np.uint64)).tolist() == [0]
+
+
+def test_apuesta_euro_e_historico():
+    ap = Apuesta_Euromillones(combinaciones=(((1, 2, 3, 4, 5), (1, 12)), ((10, 20, 30, 40, 50), (3, 4))))
+    hist = HistArraysEuro.from_records([
+        ("2026-01-02", 1, 2, 3, 40, 50, 1, 4, 20.0, 50.0, 8.0, 10.0),
+        ("2026-01-09", 6, 7, 8, 9, 10, 11, 12, 20.0, 50.0, 8.0, 10.0),
+    ])
+    nums, stars = euro_masks(ap)
+    masks = history_masks(hist)
+    assert match_counts(nums, masks["nums"]).tolist() == [[3, 0], [2, 1]]
+    assert match_counts(stars, masks["stars"]).tolist() == [[1, 1], [1, 0]]
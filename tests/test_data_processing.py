@@ -0,0 +1,63 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from db_utils.db_management import DBManager
+from lotto_analysis.data_processing import analizar_primitiva, load_euromillones_data, load_primitiva_data
+from other_utils.fase_lunar import obtener_fase_lunar
+
+# pocas fechas seguidas: no salen las cuatro fases
+PRIMITIVA_ROWS = [
+    ("2026-01-01", 1, 2, 3, 4, 5, 6, 7, None),
+    ("2026-01-03", 7, 8, 9, 10, 11, 12, 13, 4),
+    ("2026-01-05", 1, 8, 15, 22, 29, 36, 43, 4),
+]
+EURO_ROWS = [
+    ("2026-01-02", 1, 2, 3, 4, 5, 1, 2),
+    ("2026-01-06", 6, 7, 8, 9, 10, 3, 4),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "loto.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY, n1 INTEGER, n2 INTEGER, n3 INTEGER, n4 INTEGER,
+                                n5 INTEGER, n6 INTEGER, compl INTEGER, re INTEGER);
+        CREATE TABLE Euromillones (fecha TEXT PRIMARY KEY, n1 INTEGER, n2 INTEGER, n3 INTEGER,
+                                   n4 INTEGER, n5 INTEGER, e1 INTEGER, e2 INTEGER);
+    """)
+    conn.executemany("INSERT INTO Primitiva VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", PRIMITIVA_ROWS)
+    conn.executemany("INSERT INTO Euromillones VALUES (?, ?, ?, ?, ?, ?, ?, ?)", EURO_ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _por_filas(df: pd.DataFrame) -> pd.DataFrame:
+    """La versión anterior: obtener_fase_lunar fecha a fecha."""
+    old = df.drop(columns="fase_lunar")
+    old["fase_lunar"] = old["fecha"].apply(obtener_fase_lunar)
+    return old
+
+
+def test_primitiva_igual_que_por_filas(db_path):
+    df = load_primitiva_data(DBManager(db_path))
+    pd.testing.assert_frame_equal(df, _por_filas(df))
+    assert not isinstance(df["fase_lunar"].dtype, pd.CategoricalDtype)
+    assert df["fase_lunar"].nunique() < 4
+
+
+def test_euromillones_igual_que_por_filas(db_path):
+    df = load_euromillones_data(DBManager(db_path))
+    pd.testing.assert_frame_equal(df, _por_filas(df))
+
+
+def test_analisis_solo_con_fases_observadas(db_path):
+    df = load_primitiva_data(DBManager(db_path))
+    frecuencias = df.groupby(["fase_lunar", "tipo_numero"])["numero"].value_counts()
+    assert (frecuencias > 0).all()
+    assert set(frecuencias.index.get_level_values("fase_lunar")) == set(df["fase_lunar"])
+    pd.testing.assert_frame_equal(analizar_primitiva(df), analizar_primitiva(_por_filas(df)))
@@ -0,0 +1,115 @@
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from db_utils import db_management
+from db_utils.db_management import DBManager
+from other_utils import humidity_meteostat as hm
+from other_utils.humidity_meteostat import EVENING_METHOD, DailyAtmosphericState
+
+
+@pytest.fixture(autouse=True)
+def sin_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("SANTILOTO_WEATHER_CACHE", "0")
+    monkeypatch.setenv("SANTILOTO_LUNAR_TABLE_DIR", str(tmp_path))
+
+
+def _tarde(days):
+    t = np.array([f"{d.isoformat()}T{h:02d}" for d in days for h in range(18, 24)], dtype="datetime64[h]")
+    return pd.DataFrame(
+        {"temp": np.full(len(t), 10.0), "rhum": np.full(len(t), 60.0)},
+        index=pd.DatetimeIndex(t, name="time"),
+    )
+
+
+def test_solo_se_buscan_las_fechas_de_sorteo(monkeypatch):
+    # la estación principal no tiene el 4 (día sin sorteo): no se baja a la siguiente
+    llamadas = []
+
+    def fetch(station_id, start, end):
+        llamadas.append(station_id)
+        return _tarde([date(2020, 3, 3), date(2020, 3, 5)])
+
+    monkeypatch.setattr(hm, "fetch_hourly", fetch)
+    got = hm.get_evening_states("MADRID", [date(2020, 3, 5), date(2020, 3, 3), date(2020, 3, 3)])
+    assert list(got) == [date(2020, 3, 3), date(2020, 3, 5)]
+    assert {station for _, station in got.values()} == {"08222"}
+    assert llamadas == ["08222"]
+
+
+def test_sorteo_sin_datos_prueba_la_siguiente_estacion(monkeypatch):
+    def fetch(station_id, start, end):
+        return _tarde([date(2020, 3, 3)] if station_id == "08222" else [date(2020, 3, 5)])
+
+    monkeypatch.setattr(hm, "fetch_hourly", fetch)
+    got = hm.get_evening_states("MADRID", [date(2020, 3, 3), date(2020, 3, 5)])
+    assert {d: s for d, (_, s) in got.items()} == {date(2020, 3, 3): "08222", date(2020, 3, 5): "08221"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "loto.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY, n1 INTEGER);
+        CREATE TABLE Euromillones (fecha TEXT PRIMARY KEY, n1 INTEGER);
+        CREATE TABLE SorteoInfluencers (
+          juego TEXT NOT NULL, fecha DATE NOT NULL, ciudad TEXT NOT NULL,
+          temp_media REAL, rhum_media REAL, ahum_media REAL,
+          luna_phase_value REAL, luna_fase TEXT,
+          source TEXT, station_id TEXT, method TEXT, ingested_at TEXT,
+          PRIMARY KEY (juego, fecha)
+        );
+        INSERT INTO Primitiva VALUES ('2020-03-03', 1), ('2020-03-05', 1);
+        INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media, method) VALUES
+          ('Primitiva', '2020-03-03', 'Madrid', 1.0, 'hourly_mean_18_23'),
+          ('Primitiva', '2020-03-05', 'Madrid', 2.0, '{EVENING_METHOD}');
+    """)
+    conn.close()
+    return path
+
+
+def _filas(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT fecha, temp_media, method FROM SorteoInfluencers").fetchall()
+        return {fecha: (temp, method) for fecha, temp, method in rows}
+    finally:
+        conn.close()
+
+
+def test_filas_v1_y_v2_no_se_mezclan(db_path, monkeypatch, capsys):
+    pedidas = []
+
+    def estados(city, fechas):
+        pedidas.extend(fechas)
+        return {d: (DailyAtmosphericState(20.0, 50.0, 8.0), "08222") for d in fechas}
+
+    monkeypatch.setattr(db_management, "get_evening_states", estados)
+    with DBManager(db_path) as db:
+        # las filas v1 no son pendientes: el sync normal no las toca
+        assert db.obtener_fechas_pendientes_influencers() == []
+        assert db.obtener_fechas_influencers_a_recalcular() == [("Primitiva", date(2020, 3, 3), "Madrid")]
+        assert db.sync_sorteo_influencers()
+        assert pedidas == []
+        assert "1 filas de SorteoInfluencers con method distinto" in capsys.readouterr().out
+
+        assert db.sync_sorteo_influencers(recalcular=True)
+        assert db.obtener_fechas_influencers_a_recalcular() == []
+        assert db.sync_sorteo_influencers()
+        assert "method distinto" not in capsys.readouterr().out
+
+    # solo se recalcula la fila v1; la v2 se queda como estaba
+    assert pedidas == [date(2020, 3, 3)]
+    assert _filas(db_path) == {
+        "2020-03-03": (20.0, EVENING_METHOD),
+        "2020-03-05": (2.0, EVENING_METHOD),
+    }
+
+
+def test_station_limit_esta_obsoleto(db_path):
+    with DBManager(db_path) as db, pytest.warns(DeprecationWarning):
+        db.sync_sorteo_influencers(station_limit=6)
@@ -0,0 +1,93 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from other_utils.humidity_meteostat import CITY
+from other_utils.weekly import forecast_cache
+from other_utils.weekly.forecast_cache import ForecastCache, shared_forecast_cache
+
+MADRID = CITY["MADRID"]
+TZ = ZoneInfo(MADRID.timezone)
+
+
+def _ts(s: str) -> float:
+    return datetime.fromisoformat(s).replace(tzinfo=TZ).timestamp()
+
+
+class FakeFetch:
+    """fetch(city, days=...) que devuelve una previsión que empieza el día local de `now`."""
+
+    def __init__(self, now):
+        self.now = now
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self, city, days=7):
+        self.calls += 1
+        if self.fail:
+            raise OSError("red caída")
+        day = datetime.fromtimestamp(self.now[0], TZ).date().isoformat()
+        return {"time": [f"{day}T00:00"], "n": self.calls}
+
+
+def _cache(tmp_path, now, fetch, **kw):
+    return ForecastCache(fetch, ttl=3600, stale=6 * 3600, directory=tmp_path, clock=lambda: now[0], **kw)
+
+
+def test_fresh_entry_is_served_without_fetching(tmp_path):
+    now = [_ts("2026-02-07T12:00")]
+    fetch = FakeFetch(now)
+    cache = _cache(tmp_path, now, fetch)
+    first = cache.get(MADRID)
+    now[0] += 60
+    assert cache.get(MADRID) is first
+    assert fetch.calls == 1
+
+
+def test_stale_entry_from_previous_day_is_refetched(tmp_path):
+    # Sábado a las 22:00; el domingo a la 01:00 la copia sigue dentro de ttl + stale
+    now = [_ts("2026-02-07T22:00")]
+    fetch = FakeFetch(now)
+    cache = _cache(tmp_path, now, fetch)
+    cache.get(MADRID)
+    now[0] = _ts("2026-02-08T01:00")
+    hourly = cache.get(MADRID)
+    assert hourly["time"][0].startswith("2026-02-08")
+    assert fetch.calls == 2
+    assert cache.stats["stale_hits"] == 0
+
+
+def test_previous_day_entry_is_not_an_error_fallback(tmp_path):
+    now = [_ts("2026-02-07T22:00")]
+    fetch = FakeFetch(now)
+    _cache(tmp_path, now, fetch).get(MADRID)
+    now[0] = _ts("2026-02-08T01:00")
+    fetch.fail = True
+    with pytest.raises(OSError):
+        _cache(tmp_path, now, fetch).get(MADRID)
+
+
+def test_error_fallback_is_capped_by_max_age(tmp_path):
+    now = [_ts("2026-02-07T00:30")]
+    fetch = FakeFetch(now)
+    cache = _cache(tmp_path, now, fetch, max_age=12 * 3600)
+    cache.get(MADRID)
+    fetch.fail = True
+
+    now[0] = _ts("2026-02-07T10:00")  # más vieja que ttl + stale, más joven que max_age
+    assert cache.get(MADRID)["n"] == 1
+    now[0] = _ts("2026-02-07T13:00")
+    with pytest.raises(OSError):
+        cache.get(MADRID)
+
+
+def test_shared_cache_rejects_a_different_fetch(tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast_cache, "_CACHE", None)
+    monkeypatch.setenv("SANTILOTO_FORECAST_CACHE_DIR", str(tmp_path))
+    now = [_ts("2026-02-07T00:30")]
+    fetch = FakeFetch(now)
+    cache = shared_forecast_cache(fetch)
+    assert shared_forecast_cache(fetch) is cache
+    with pytest.raises(ValueError):
+        shared_forecast_cache(FakeFetch(now))
@@ -0,0 +1,79 @@
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from other_utils.weekly.forecast import (
+    WindowDailyAvg,
+    daily_window_means_from_hourly,
+    daily_window_means_multi,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "forecast"
+WINDOWS = [(18, 23), (0, 23), (20, 22), (7, 7)]
+
+
+def _mean(values):
+    vals = [v for v in values if v is not None]
+    return round((sum(vals) / len(vals)), 2) if vals else None
+
+
+def _por_filas(time, temperature_2m, relative_humidity_2m, start_hour, end_hour):
+    """La agregación anterior: fromisoformat por hora y listas por día."""
+    buckets = {}
+    for t, temp, rh in zip(time, temperature_2m, relative_humidity_2m):
+        dt = datetime.fromisoformat(t)
+        if start_hour <= dt.hour <= end_hour:
+            b = buckets.setdefault(dt.date().isoformat(), {"temp": [], "rh": [], "hours": set()})
+            b["temp"].append(temp)
+            b["rh"].append(rh)
+            b["hours"].add(dt.hour)
+    return [
+        WindowDailyAvg(
+            date=d,
+            hours_used=sorted(b["hours"]),
+            temp_mean_c=_mean(b["temp"]),
+            rh_mean_pct=_mean(b["rh"]),
+            n_samples=len(b["hours"]),
+        )
+        for d, b in sorted(buckets.items())
+    ]
+
+
+def _serie_aleatoria(rng: random.Random) -> dict:
+    start = datetime(2025, 12, 28) + timedelta(hours=rng.randrange(48))
+    time = [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(rng.randrange(1, 24 * 12))]
+    time += rng.sample(time, k=min(len(time), rng.randrange(4)))   # horas repetidas
+    if rng.random() < 0.3:
+        rng.shuffle(time)
+    return {
+        "time": time,
+        "temperature_2m": [None if rng.random() < 0.1 else round(rng.uniform(-8, 38), 1) for _ in time],
+        "relative_humidity_2m": [None if rng.random() < 0.1 else rng.randrange(5, 101) for _ in time],
+    }
+
+
+@pytest.mark.parametrize("city", ["madrid", "paris"])
+def test_ventanas_igual_que_por_filas_en_fixtures(city):
+    hourly = json.loads((FIXTURES / f"{city}.json").read_text())
+    got = daily_window_means_multi(**hourly, windows=WINDOWS)
+    for w in WINDOWS:
+        assert got[w] == _por_filas(**hourly, start_hour=w[0], end_hour=w[1])
+
+
+def test_ventanas_igual_que_por_filas_con_huecos_y_repetidas():
+    rng = random.Random(23)
+    for _ in range(200):
+        hourly = _serie_aleatoria(rng)
+        got = daily_window_means_multi(**hourly, windows=WINDOWS)
+        for w in WINDOWS:
+            assert got[w] == _por_filas(**hourly, start_hour=w[0], end_hour=w[1])
+
+
+def test_una_ventana_y_desalineados():
+    hourly = json.loads((FIXTURES / "madrid.json").read_text())
+    assert daily_window_means_from_hourly(**hourly) == _por_filas(**hourly, start_hour=18, end_hour=23)
+    with pytest.raises(ValueError):
+        daily_window_means_from_hourly(time=["2026-02-07T18:00"], temperature_2m=[], relative_humidity_2m=[])
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from db_utils.db_management import DBManager
+from db_utils.history_features import FEATURE_TABLES, join_sql, load_sql
+
+
+def _sql(path, *sentencias):
+    conn = sqlite3.connect(path)
+    try:
+        for s in sentencias:
+            conn.execute(s)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _estado(db, juego):
+    """(filas de la tabla de features, filas del JOIN, versión)."""
+    features = db._ejecutar_consulta(load_sql(juego))
+    join = db._ejecutar_consulta(join_sql(juego))
+    return features, join, db.obtener_version_historico(juego)[0]
+
+
+@pytest.fixture
+def db(loto_db):
+    _sql(
+        loto_db,
+        "INSERT INTO Primitiva VALUES ('2026-01-03', 1, 2, 3, 4, 5, 6, 7)",
+        "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media, rhum_media, ahum_media, luna_phase_value)"
+        " VALUES ('Primitiva', '2026-01-03', 'Madrid', 10.0, 60.0, 5.5, 3.6)",
+        "INSERT INTO Euromillones VALUES ('2026-01-02', 1, 2, 3, 4, 5, 1, 2)",
+        "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media, rhum_media, ahum_media, luna_phase_value)"
+        " VALUES ('Euromillones', '2026-01-02', 'Paris', 5.0, 80.0, 5.0, 29.0)",
+    )
+    with DBManager(loto_db) as db:
+        assert len(db.load_history_primitiva()) == 1  # crea tablas y triggers con la carga inicial
+        assert len(db.load_history_euromillones()) == 1
+        yield db
+
+
+def test_carga_inicial_igual_que_join(db):
+    for juego in FEATURE_TABLES:
+        features, join, _ = _estado(db, juego)
+        assert features == join and len(features) == 1
+    # bin lunar saturado en 7 (luna 29.0)
+    assert db._ejecutar_consulta("SELECT moon_bin FROM HistoryFeaturesEuromillones") == [(7,)]
+
+
+@pytest.mark.parametrize("cambio, filas", [
+    # sorteo nuevo sin influencers: no entra hasta que los tenga
+    (["INSERT INTO Primitiva VALUES ('2026-01-07', 7, 8, 9, 10, 11, 12, 0)"], 1),
+    (["INSERT INTO Primitiva VALUES ('2026-01-07', 7, 8, 9, 10, 11, 12, 0)",
+      "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media, luna_phase_value)"
+      " VALUES ('Primitiva', '2026-01-07', 'Madrid', 8.0, 7.0)"], 2),
+    # corrección de números y de influencers
+    (["UPDATE Primitiva SET n6 = 49 WHERE fecha = '2026-01-03'"], 1),
+    (["UPDATE SorteoInfluencers SET temp_media = 12.5, luna_phase_value = 20.0"
+      " WHERE juego = 'Primitiva' AND fecha = '2026-01-03'"], 1),
+    # cambio de fecha del sorteo: la fila vieja sale y, sin influencers, la nueva no entra
+    (["UPDATE Primitiva SET fecha = '2026-01-04' WHERE fecha = '2026-01-03'"], 0),
+    (["DELETE FROM SorteoInfluencers WHERE juego = 'Primitiva'"], 0),
+    (["DELETE FROM Primitiva"], 0),
+])
+def test_triggers_mantienen_features_y_version(db, loto_db, cambio, filas):
+    features_antes, _, antes = _estado(db, "Primitiva")
+    _, _, antes_euro = _estado(db, "Euromillones")
+
+    _sql(loto_db, *cambio)
+
+    features, join, version = _estado(db, "Primitiva")
+    assert features == join
+    assert len(features) == filas
+    # la versión sube con cualquier cambio de las features, y solo entonces
+    assert (version > antes) == (features != features_antes)
+    # el otro juego no se entera
+    assert _estado(db, "Euromillones")[2] == antes_euro
+
+
+def test_upsert_de_influencers_por_dbmanager(db):
+    fila = {
+        "juego": "Primitiva", "fecha": "2026-01-03", "ciudad": "Madrid",
+        "temp_media": 15.0, "rhum_media": 40.0, "ahum_media": 5.2,
+        "luna_phase_value": 14.0, "luna_fase": "llena",
+        "source": "meteostat", "station_id": "08222", "method": "m",
+    }
+    assert db.upsert_sorteo_influencers([fila])
+    features, join, _ = _estado(db, "Primitiva")
+    assert features == join
+    assert features[0][8] == 15.0 and features[0][-1] == 4
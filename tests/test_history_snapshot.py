@@ -0,0 +1,86 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from db_utils.db_management import DBManager
+from db_utils.history_snapshot import snapshot_dir
+
+
+@pytest.fixture(autouse=True)
+def con_instantanea(monkeypatch):
+    monkeypatch.delenv("SANTILOTO_HISTORY_SNAPSHOT", raising=False)
+
+
+def _sql(path, *sentencias):
+    conn = sqlite3.connect(path)
+    try:
+        for s in sentencias:
+            conn.execute(s)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _sorteo(fecha, n6=6, temp=10.0):
+    return (
+        f"INSERT INTO Primitiva VALUES ('{fecha}', 1, 2, 3, 4, 5, {n6}, 7)",
+        "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media, rhum_media, ahum_media, luna_phase_value)"
+        f" VALUES ('Primitiva', '{fecha}', 'Madrid', {temp}, 60.0, 5.5, 3.6)",
+    )
+
+
+def _entradas(path):
+    return sorted(p.name for p in snapshot_dir(path).glob("Primitiva-*"))
+
+
+def _carga(path):
+    with DBManager(path) as db:
+        return db.load_history_primitiva()
+
+
+def test_segunda_carga_sale_de_la_instantanea(loto_db):
+    _sql(loto_db, *_sorteo("2026-01-03"))
+    primera = _carga(loto_db)
+    assert not isinstance(primera.nums, np.memmap)
+    assert len(_entradas(loto_db)) == 1
+
+    segunda = _carga(loto_db)
+    assert isinstance(segunda.nums, np.memmap)
+    assert segunda.nums.tolist() == primera.nums.tolist()
+
+
+@pytest.mark.parametrize("cambio", [
+    _sorteo("2026-01-10", n6=9),                                      # sorteo nuevo
+    ("UPDATE Primitiva SET n6 = 49 WHERE fecha = '2026-01-03'",),      # misma fecha y nº de filas
+    ("UPDATE SorteoInfluencers SET temp_media = 30.0 WHERE fecha = '2026-01-03'",),
+    ("DELETE FROM SorteoInfluencers WHERE fecha = '2026-01-07'",),
+])
+def test_cambio_en_la_base_rehace_la_instantanea(loto_db, cambio):
+    _sql(loto_db, *_sorteo("2026-01-03"), *_sorteo("2026-01-07"))
+    _carga(loto_db)
+    _carga(loto_db)  # ya desde la instantánea
+    antes = _entradas(loto_db)
+
+    _sql(loto_db, *cambio)
+
+    with DBManager(loto_db) as db:
+        hist = db.load_history_primitiva()
+        filas = db._ejecutar_consulta(
+            "SELECT d.fecha, d.n6, si.temp_media FROM Primitiva d"
+            " JOIN SorteoInfluencers si ON si.juego = 'Primitiva' AND si.fecha = d.fecha ORDER BY d.fecha"
+        )
+    assert [str(f) for f in hist.fecha] == [f for f, _, _ in filas]
+    assert hist.nums[:, 5].tolist() == [n6 for _, n6, _ in filas]
+    assert hist.temp.tolist() == [t for _, _, t in filas]
+
+    # la nueva sustituye a la vieja
+    despues = _entradas(loto_db)
+    assert len(despues) == 1 and despues != antes
+
+
+def test_desactivada(loto_db, monkeypatch):
+    monkeypatch.setenv("SANTILOTO_HISTORY_SNAPSHOT", "0")
+    _sql(loto_db, *_sorteo("2026-01-03"))
+    _carga(loto_db)
+    assert not snapshot_dir(loto_db).exists()
@@ -0,0 +1,67 @@
+from datetime import date
+
+import numpy as np
+
+from db_utils.history_store import HistArraysEuro, HistArraysPrimitiva
+from other_utils.weekly.engine import moon_bin_8
+
+
+def _rows_primitiva(n: int = 200, seed: int = 1) -> list[tuple]:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        nums = sorted(rng.choice(np.arange(1, 50), 6, replace=False).tolist())
+        re = None if i % 17 == 0 else int(rng.integers(0, 10))
+        luna = 28.0 if i == 3 else round(float(rng.uniform(0, 28)), 3)
+        rows.append((
+            date.fromordinal(730120 + i).isoformat(), *nums, re,
+            float(rng.uniform(-5, 35)), float(rng.uniform(20, 100)), float(rng.uniform(1, 20)), luna,
+        ))
+    return rows
+
+
+def test_primitiva_from_records_igual_que_filas():
+    rows = _rows_primitiva()
+    hist = HistArraysPrimitiva.from_records(rows)
+
+    assert len(hist) == len(rows)
+    for i, (fecha, n1, n2, n3, n4, n5, n6, re, temp, rh, ah, luna) in enumerate(rows):
+        assert hist.fecha[i].item() == date.fromisoformat(fecha)
+        assert hist.nums[i].tolist() == [n1, n2, n3, n4, n5, n6]
+        assert int(hist.re[i]) == (-1 if re is None else re)
+        # meteo y luna en float32 (lo que pide el almacén compacto)
+        assert hist.temp[i] == np.float32(temp)
+        assert hist.rh[i] == np.float32(rh)
+        assert hist.ah[i] == np.float32(ah)
+        assert hist.moon_val[i] == np.float32(luna)
+        # el bin se calcula con el valor sin redondear a float32
+        assert int(hist.moon_bin[i]) == moon_bin_8(luna)
+
+
+def test_euro_from_records_con_columna_moon_bin():
+    rng = np.random.default_rng(2)
+    rows = [
+        ("2004-02-13", 1, 12, 23, 34, 45, 2, 9, 11.5, 70.0, 7.25, 3.4, 0),
+        ("2004-02-20", 5, 6, 7, 8, 50, 1, 12, None, 64.0, None, 27.9, 7),
+        *[
+            (f"2004-03-{d:02d}", *sorted(rng.choice(np.arange(1, 51), 5, replace=False).tolist()),
+             *sorted(rng.choice(np.arange(1, 13), 2, replace=False).tolist()),
+             20.0, 50.0, 8.0, 10.5, 3)
+            for d in range(1, 21)
+        ],
+    ]
+    hist = HistArraysEuro.from_records(rows)
+
+    assert hist.nums.dtype == np.uint8 and hist.stars.dtype == np.uint8
+    for i, row in enumerate(rows):
+        assert str(hist.fecha[i]) == row[0]
+        assert hist.nums[i].tolist() == list(row[1:6])
+        assert hist.stars[i].tolist() == list(row[6:8])
+        assert int(hist.moon_bin[i]) == row[12]
+    # meteo NULL -> NaN
+    assert np.isnan(hist.temp[1]) and np.isnan(hist.ah[1])
+
+
+def test_from_records_vacio():
+    hist = HistArraysPrimitiva.from_records([])
+    assert len(hist) == 0 and hist.nums.shape == (0, 6)
@@ -0,0 +1,82 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from db_utils import influencers_queue
+from db_utils.db_management import DBManager
+
+
+def _sql(path, *sentencias):
+    conn = sqlite3.connect(path)
+    try:
+        for s in sentencias:
+            conn.execute(s)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _influencers(juego, fecha, ciudad):
+    return (
+        "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media)"
+        f" VALUES ('{juego}', '{fecha}', '{ciudad}', 10.0)"
+    )
+
+
+def _por_join(db):
+    rows = db._ejecutar_consulta(influencers_queue.PENDING_JOIN_SQL) or []
+    return [(juego, date.fromisoformat(fecha), ciudad) for juego, fecha, ciudad in rows]
+
+
+@pytest.fixture
+def db(loto_db):
+    _sql(
+        loto_db,
+        "INSERT INTO Primitiva (fecha) VALUES ('2026-01-03')",
+        "INSERT INTO Primitiva (fecha) VALUES ('2026-01-07')",
+        _influencers("Primitiva", "2026-01-03", "Madrid"),
+    )
+    with DBManager(loto_db) as db:
+        # la primera lectura crea la cola y la rellena con lo que ya faltaba
+        assert db.obtener_fechas_pendientes_influencers() == [("Primitiva", date(2026, 1, 7), "Madrid")]
+        yield db
+
+
+def test_cola_sigue_a_sorteos_e_influencers(db, loto_db):
+    pasos = [
+        # sorteos nuevos entran (a igual fecha, Primitiva antes que Euromillones)
+        (["INSERT INTO Euromillones (fecha) VALUES ('2026-01-09')",
+          "INSERT INTO Primitiva (fecha) VALUES ('2026-01-09')"],
+         [("Primitiva", "2026-01-07", "Madrid"), ("Primitiva", "2026-01-09", "Madrid"),
+          ("Euromillones", "2026-01-09", "Paris")]),
+        # con influencers salen
+        ([_influencers("Primitiva", "2026-01-07", "Madrid"), _influencers("Euromillones", "2026-01-09", "Paris")],
+         [("Primitiva", "2026-01-09", "Madrid")]),
+        # sin influencers vuelven
+        (["DELETE FROM SorteoInfluencers WHERE juego = 'Primitiva' AND fecha = '2026-01-03'"],
+         [("Primitiva", "2026-01-03", "Madrid"), ("Primitiva", "2026-01-09", "Madrid")]),
+        # cambio de fecha del sorteo
+        (["UPDATE Primitiva SET fecha = '2026-01-10' WHERE fecha = '2026-01-09'"],
+         [("Primitiva", "2026-01-03", "Madrid"), ("Primitiva", "2026-01-10", "Madrid")]),
+        # baja del sorteo
+        (["DELETE FROM Primitiva WHERE fecha = '2026-01-03'"],
+         [("Primitiva", "2026-01-10", "Madrid")]),
+        # influencers que cambian de fecha: la vieja vuelve a faltar, la nueva sale
+        (["UPDATE SorteoInfluencers SET fecha = '2026-01-10' WHERE juego = 'Primitiva' AND fecha = '2026-01-07'"],
+         [("Primitiva", "2026-01-07", "Madrid")]),
+    ]
+    for sentencias, esperado in pasos:
+        _sql(loto_db, *sentencias)
+        pendientes = db.obtener_fechas_pendientes_influencers()
+        assert pendientes == [(j, date.fromisoformat(f), c) for j, f, c in esperado]
+        assert pendientes == _por_join(db)
+
+
+def test_upsert_de_influencers_saca_de_la_cola(db):
+    fila = {
+        "juego": "Primitiva", "fecha": "2026-01-07", "ciudad": "Madrid",
+        "temp_media": 15.0, "method": "m",
+    }
+    assert db.upsert_sorteo_influencers([fila])
+    assert db.obtener_fechas_pendientes_influencers() == []
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+from db_utils.history_store import HistArraysEuro, HistArraysPrimitiva
+from other_utils.weekly.engine import (
+    ScoreTarget,
+    gauss_score,
+    moon_bin_8,
+    score_euro_for_target,
+    score_euro_targets,
+    score_primitiva_for_target,
+    score_primitiva_targets,
+    tol_ah,
+    tol_rh,
+    tol_temp,
+)
+from other_utils.weekly.kernel import MoonBinIndex, ranked_totals
+
+
+def _primitiva(n: int = 600, seed: int = 1) -> HistArraysPrimitiva:
+    rng = np.random.default_rng(seed)
+    re = rng.integers(0, 10, n).astype(np.int8)
+    re[rng.random(n) < 0.05] = -1
+    moon_val = rng.uniform(0, 28, n).astype(np.float32)
+    return HistArraysPrimitiva(
+        fecha=np.datetime64("2000-01-01") + np.arange(n),
+        nums=np.array([rng.choice(np.arange(1, 50), 6, replace=False) for _ in range(n)], dtype=np.uint8),
+        re=re,
+        # temperaturas redondeadas: muchas filas con el mismo peso -> empates exactos
+        temp=np.round(rng.uniform(-5, 35, n)).astype(np.float32),
+        rh=rng.uniform(20, 100, n).astype(np.float32),
+        ah=rng.uniform(1, 20, n).astype(np.float32),
+        moon_val=moon_val,
+        moon_bin=np.clip(moon_val // 3.5, 0, 7).astype(np.int8),
+    )
+
+
+def _euro(n: int = 600, seed: int = 2) -> HistArraysEuro:
+    rng = np.random.default_rng(seed)
+    moon_val = rng.uniform(0, 28, n).astype(np.float32)
+    return HistArraysEuro(
+        fecha=np.datetime64("2004-02-13") + np.arange(n),
+        nums=np.array([rng.choice(np.arange(1, 51), 5, replace=False) for _ in range(n)], dtype=np.uint8),
+        stars=np.array([rng.choice(np.arange(1, 13), 2, replace=False) for _ in range(n)], dtype=np.uint8),
+        temp=rng.uniform(-5, 35, n).astype(np.float32),
+        rh=rng.uniform(20, 100, n).astype(np.float32),
+        ah=rng.uniform(1, 20, n).astype(np.float32),
+        moon_val=moon_val,
+        moon_bin=np.clip(moon_val // 3.5, 0, 7).astype(np.int8),
+    )
+
+
+def _targets(n: int = 120, seed: int = 3) -> list[ScoreTarget]:
+    rng = np.random.default_rng(seed)
+    return [
+        ScoreTarget(
+            d=None,
+            temp=float(rng.choice([round(rng.uniform(-5, 35)), rng.uniform(-30, 50)])),
+            rh=float(rng.uniform(10, 100)),
+            ah=float(rng.uniform(0.5, 25)),
+            moon_bin=int(rng.integers(0, 8)),
+            frac=float(rng.choice([0.01, 0.10, 0.15])),
+        )
+        for _ in range(n)
+    ]
+
+
+def _kw(t: ScoreTarget) -> dict:
+    return dict(target_temp=t.temp, target_rh=t.rh, target_ah=t.ah, target_moon_bin=t.moon_bin, frac=t.frac)
+
+
+@pytest.mark.parametrize("cutoff", [None, 3.0])
+@pytest.mark.parametrize("end", [None, 450])
+def test_score_batch_igual_que_por_target_primitiva(cutoff, end):
+    index = MoonBinIndex.build(_primitiva())
+    targets = _targets()
+    nums, re = score_primitiva_targets(index, targets, cutoff=cutoff, end=end)
+
+    for i, t in enumerate(targets):
+        s_nums, s_re = score_primitiva_for_target(index, **_kw(t), cutoff=cutoff, end=end)
+        # mismo orden y mismos scores bit a bit (no solo aproximados)
+        assert list(nums.ranking(i).items()) == list(s_nums.items())
+        assert list(re.ranking(i).items()) == list(s_re.items())
+
+
+@pytest.mark.parametrize("cutoff", [None, 3.0])
+def test_score_batch_igual_que_por_target_euro(cutoff):
+    index = MoonBinIndex.build(_euro())
+    targets = _targets(seed=4)
+    nums, stars = score_euro_targets(index, targets, cutoff=cutoff)
+
+    for i, t in enumerate(targets):
+        s_nums, s_stars = score_euro_for_target(index, **_kw(t), cutoff=cutoff)
+        assert list(nums.ranking(i).items()) == list(s_nums.items())
+        assert list(stars.ranking(i).items()) == list(s_stars.items())
+
+
+def _por_filas(hist, t: ScoreTarget, columns: tuple[str, ...]) -> list[dict[int, float]]:
+    """El bucle anterior al kernel: fila a fila, con gauss_score y dicts."""
+    tT, tRH, tAH = tol_temp(t.temp, t.frac), tol_rh(t.rh, t.frac), tol_ah(t.ah, t.frac)
+    out: list[dict[int, float]] = [{} for _ in columns]
+    for i in range(len(hist)):
+        if moon_bin_8(float(hist.moon_val[i])) != t.moon_bin:
+            continue
+        w = (
+            gauss_score(float(hist.temp[i]) - t.temp, tT)
+            * gauss_score(float(hist.rh[i]) - t.rh, tRH)
+            * gauss_score(float(hist.ah[i]) - t.ah, tAH)
+        )
+        if w <= 0.0:
+            continue
+        for scores, c in zip(out, columns):
+            for v in np.atleast_1d(getattr(hist, c)[i]).tolist():
+                if v >= 0:
+                    scores[v] = scores.get(v, 0.0) + w
+    return [dict(sorted(d.items(), key=lambda kv: kv[1], reverse=True)) for d in out]
+
+
+def _same_ranking(got: dict[int, float], expected: dict[int, float]) -> None:
+    # mismo orden (empates incluidos); np.exp y math.exp pueden diferir en el último bit
+    assert list(got) == list(expected)
+    assert list(got.values()) == pytest.approx(list(expected.values()), rel=1e-12)
+
+
+def test_score_for_target_igual_que_bucle_por_filas():
+    hp, he = _primitiva(), _euro()
+    for t in _targets(60):
+        for got, expected in zip(score_primitiva_for_target(hp, **_kw(t)), _por_filas(hp, t, ("nums", "re"))):
+            _same_ranking(got, expected)
+        for got, expected in zip(score_euro_for_target(he, **_kw(t)), _por_filas(he, t, ("nums", "stars"))):
+            _same_ranking(got, expected)
+
+
+def test_ranked_totals_desempata_por_primera_aparicion():
+    values = np.array([[5, 3], [3, 7], [7, 5], [9, 1]])
+    weights = np.array([1.0, 1.0, 1.0, 0.5])
+
+    totals = ranked_totals(values, weights)
+
+    assert list(totals.items()) == [(5, 2.0), (3, 2.0), (7, 2.0), (9, 0.5), (1, 0.5)]
+    assert list(ranked_totals(np.array([2, 4, 2, 4, 4])).items()) == [(4, 3.0), (2, 2.0)]
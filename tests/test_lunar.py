@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from astral import moon
+
+from other_utils import lunar_table
+from other_utils.fase_lunar import (
+    obtener_fase_lunar,
+    obtener_fases_lunares,
+    obtener_valor_fase_lunar,
+)
+from other_utils.lunar_table import LUNAR_SPAN, astral_phases, build_phase_table, lunar_phase, lunar_phases
+
+
+@pytest.fixture(autouse=True)
+def tabla_en_tmp(tmp_path, monkeypatch):
+    # tabla propia por test: se construye (y se verifica contra astral) en tmp_path
+    monkeypatch.setenv("SANTILOTO_LUNAR_TABLE_DIR", str(tmp_path))
+    monkeypatch.setattr(lunar_table, "_table", None)
+    monkeypatch.setattr(lunar_table, "_phases", None)
+    monkeypatch.setattr(lunar_table, "_phases_list", None)
+
+
+def _fechas(n: int = 3000, seed: int = 25) -> list[datetime]:
+    """Días dentro y fuera de LUNAR_SPAN, a las 00:00 y a horas sueltas."""
+    rng = np.random.default_rng(seed)
+    base = datetime(1900, 1, 1)
+    days = rng.integers(0, 300 * 365, n).tolist()
+    seconds = np.where(rng.random(n) < 0.3, rng.integers(0, 86400, n), 0).tolist()
+    extremos = [datetime.combine(d, datetime.min.time()) for d in LUNAR_SPAN]
+    return extremos + [base + timedelta(days=d, seconds=s) for d, s in zip(days, seconds)]
+
+
+def test_astral_phases_igual_que_moon_phase():
+    fechas = _fechas()
+    expected = np.array([moon.phase(f) for f in fechas])
+    assert np.array_equal(astral_phases(np.array(fechas, dtype="datetime64[s]")), expected)
+
+
+def test_lunar_phases_y_lunar_phase_igual_que_moon_phase():
+    fechas = _fechas()
+    expected = [moon.phase(f) for f in fechas]
+
+    assert lunar_phases(np.array(fechas, dtype="datetime64[s]")).tolist() == expected
+    assert [lunar_phase(f) for f in fechas] == expected
+    assert [lunar_phase(f.date()) for f in fechas[:200]] == [moon.phase(f.date()) for f in fechas[:200]]
+    assert lunar_table.lunar_table_path().exists()
+
+
+def test_build_phase_table_igual_que_moon_phase():
+    start, end = date(2024, 1, 1), date(2024, 12, 31)
+    table = build_phase_table(start, end)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    assert lunar_table._phase_from_elong(table).tolist() == [moon.phase(d) for d in days]
+
+
+def test_obtener_fases_lunares_igual_que_por_fecha():
+    fechas = pd.Series(pd.to_datetime([f.date() for f in _fechas(500)] + [None]))
+
+    valores, nombres = obtener_fases_lunares(fechas)
+
+    esperadas = [obtener_fase_lunar(f.to_pydatetime()) for f in fechas[:-1]]
+    assert list(nombres[:-1]) == esperadas
+    assert [round(v, 3) for v in valores[:-1]] == [obtener_valor_fase_lunar(f.to_pydatetime()) for f in fechas[:-1]]
+    assert np.isnan(valores[-1]) and pd.isna(nombres[-1])
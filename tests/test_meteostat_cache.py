@@ -0,0 +1,44 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from other_utils import meteostat_cache as mc
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SANTILOTO_WEATHER_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("SANTILOTO_WEATHER_CACHE", raising=False)
+    return tmp_path
+
+
+def _age(station_id, year, month, days):
+    p = mc._path(station_id, year, month)
+    t = time.time() - days * 86400
+    os.utime(p, (t, t))
+
+
+def _month(n):
+    t = np.datetime64("2020-03-01T00", "h") + np.arange(n)
+    return mc.HourlyMonth(t, np.full(n, 10.0), np.full(n, 60.0))
+
+
+def test_month_with_data_never_expires():
+    assert mc.save_month("08222", 2020, 3, _month(24))
+    _age("08222", 2020, 3, 365)
+    m = mc.load_month("08222", 2020, 3)
+    assert m is not None and len(m) == 24
+
+
+def test_empty_month_is_retried_after_empty_retry_days():
+    assert mc.save_month("08222", 2020, 3, mc.HourlyMonth.empty())
+    assert len(mc.load_month("08222", 2020, 3)) == 0
+    _age("08222", 2020, 3, mc.EMPTY_RETRY_DAYS + 1)
+    assert mc.load_month("08222", 2020, 3) is None
+
+
+def test_recent_months_are_not_saved():
+    today = np.datetime64("today", "D").astype(object)
+    assert not mc.save_month("08222", today.year, today.month, _month(24))
@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from db_utils import db_management
+from db_utils.db_management import DBManager
+from other_utils.weekly.prizes import PrizeIndex, premiados_euro_rows
+from other_utils.weekly.types import Apuesta_Euromillones
+
+
+EURO_DRAWS = [
+    ("2026-01-02", 1, 2, 3, 4, 5, 1, 2),
+    ("2026-01-09", 1, 2, 3, 4, 5, 7, 8),    # mismos números, otras estrellas
+    ("2026-01-16", 10, 20, 30, 40, 50, 3, 4),
+]
+
+
+def test_euro_stars_checked_on_every_matching_draw():
+    index = PrizeIndex.from_records(EURO_DRAWS, k=5)
+    ap = Apuesta_Euromillones(combinaciones=(((1, 2, 3, 4, 5), (7, 8)), ((10, 20, 30, 40, 49), (3, 9))))
+
+    rows = premiados_euro_rows(index, [(date(2026, 2, 3), ap)], ["sig"])
+
+    assert [r[4:] for r in rows] == [(5, 2, "2026-01-09"), (4, 1, "2026-01-16")]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "loto.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY, n1 INTEGER, n2 INTEGER, n3 INTEGER,
+                                n4 INTEGER, n5 INTEGER, n6 INTEGER, re INTEGER);
+        CREATE TABLE Euromillones (fecha TEXT PRIMARY KEY, n1 INTEGER, n2 INTEGER, n3 INTEGER,
+                                   n4 INTEGER, n5 INTEGER, e1 INTEGER, e2 INTEGER);
+        CREATE TABLE SorteoInfluencers (juego TEXT NOT NULL, fecha DATE NOT NULL, ciudad TEXT NOT NULL,
+                                        temp_media REAL, rhum_media REAL, ahum_media REAL,
+                                        luna_phase_value REAL, PRIMARY KEY (juego, fecha));
+    """)
+    conn.executemany("INSERT INTO Euromillones VALUES (?, ?, ?, ?, ?, ?, ?, ?)", EURO_DRAWS)
+    # el último sorteo aún sin influencers
+    conn.executemany(
+        "INSERT INTO SorteoInfluencers (juego, fecha, ciudad, temp_media) VALUES ('Euromillones', ?, 'Paris', 10.0)",
+        [(d[0],) for d in EURO_DRAWS[:-1]],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_prize_index_built_once_until_draws_change(db_path):
+    db = DBManager(db_path)
+    first = db._indice_premios("Euromillones")
+    assert db._indice_premios("Euromillones") is first
+
+    db.insertar_registros("Euromillones", [{
+        "fecha": "2026-01-23", "n1": 6, "n2": 7, "n3": 8, "n4": 9, "n5": 11, "e1": 1, "e2": 5,
+    }])
+    rebuilt = db._indice_premios("Euromillones")
+    assert rebuilt is not first and len(rebuilt) == 4
+
+
+@pytest.mark.parametrize("fecha", ["2026-01-09", "2026-01-16"])  # con y sin influencers
+def test_prize_index_rebuilt_after_draw_correction(db_path, fecha):
+    db = DBManager(db_path)
+    first = db._indice_premios("Euromillones")
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE Euromillones SET n5 = 49 WHERE fecha = ?", (fecha,))
+    conn.commit()
+    conn.close()
+
+    rebuilt = db._indice_premios("Euromillones")
+    assert rebuilt is not first
+    assert db._indice_premios("Euromillones") is rebuilt
+
+
+def test_old_draws_version_table_and_triggers_dropped(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE SorteosVersion (juego TEXT PRIMARY KEY, version INTEGER NOT NULL);
+        CREATE TRIGGER trg_Euromillones_version_i AFTER INSERT ON Euromillones
+        BEGIN UPDATE SorteosVersion SET version = version + 1 WHERE juego = 'Euromillones'; END;
+    """)
+    conn.close()
+
+    DBManager(db_path)._indice_premios("Euromillones")
+
+    conn = sqlite3.connect(db_path)
+    left = conn.execute(
+        "SELECT name FROM sqlite_master WHERE name IN ('SorteosVersion', 'trg_Euromillones_version_i')"
+    ).fetchall()
+    conn.close()
+    assert left == []
+
+
+def test_prize_index_forgotten_after_rollback(db_path):
+    db = DBManager(db_path)
+    with pytest.raises(RuntimeError):
+        with db, db.transaccion():
+            db.insertar_registros("Euromillones", [{
+                "fecha": "2026-01-23", "n1": 6, "n2": 7, "n3": 8, "n4": 9, "n5": 11, "e1": 1, "e2": 5,
+            }])
+            assert len(db._indice_premios("Euromillones")) == 4
+            raise RuntimeError
+    assert len(db._indice_premios("Euromillones")) == 3
+
+
+def test_registrar_premiados_propagates_errors(db_path, monkeypatch):
+    db = DBManager(db_path)
+    ap = Apuesta_Euromillones(combinaciones=(((1, 2, 3, 4, 5), (7, 8)), ((6, 7, 8, 9, 10), (1, 2))))
+    monkeypatch.setitem(db_management.PRIZE_GAMES, "Euromillones", (5, "n1, n2, n3, n4, n5, e1, e3"))
+
+    assert not db.registrar_premiados_euromillones([(date(2026, 2, 3), ap)], ["sig"])
+    with pytest.raises(sqlite3.Error):
+        with db, db.transaccion():
+            db.registrar_premiados_euromillones([(date(2026, 2, 3), ap)], ["sig"])
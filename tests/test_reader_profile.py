@@ -0,0 +1,79 @@
+import os
+import sqlite3
+
+import pytest
+
+from db_utils.db_management import DBManager
+
+
+def _nueva_en_wal(path):
+    """Base recién creada por un escritor que ya se ha cerrado: sin -wal ni -shm."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY, n1 INTEGER)")
+    conn.execute("INSERT INTO Primitiva VALUES ('2026-02-07', 1)")
+    conn.commit()
+    conn.close()
+    assert not os.path.exists(f"{path}-wal") and not os.path.exists(f"{path}-shm")
+
+
+def test_lector_sobre_base_recien_creada(tmp_path):
+    path = tmp_path / "loto.db"
+    _nueva_en_wal(path)
+    with DBManager(path, profile="reader") as db:
+        assert db.obtener_valores_por_fecha("Primitiva", "2026-02-07", ["n1"]) == [(1,)]
+        with pytest.raises(sqlite3.OperationalError):
+            db.conn.execute("DELETE FROM Primitiva")
+
+
+def test_lector_sin_fichero_falla_sin_crearlo(tmp_path):
+    path = tmp_path / "loto.db"
+    with pytest.raises(sqlite3.OperationalError):
+        with DBManager(path, profile="reader"):
+            pass
+    assert not path.exists()
+
+
+def test_lector_del_pool_ve_lo_que_confirma_un_escritor_ya_cerrado(tmp_path):
+    # el sync semanal abre, escribe, hace checkpoint y cierra entre dos peticiones
+    path = tmp_path / "loto.db"
+    _nueva_en_wal(path)
+    lector = DBManager(path, profile="reader")
+    with lector:
+        assert lector.fecha_ultimo_resultado("Primitiva", "fecha") == "2026-02-07"
+        conn = lector.conn
+
+    escritor = sqlite3.connect(path)
+    escritor.execute("INSERT INTO Primitiva VALUES ('2026-02-11', 2)")
+    escritor.commit()
+    escritor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    escritor.close()
+
+    with lector:
+        assert lector.conn is conn  # la misma conexión del pool
+        assert lector.fecha_ultimo_resultado("Primitiva", "fecha") == "2026-02-11"
+
+
+def test_lector_ve_lo_que_escribe_el_escritor(tmp_path):
+    path = tmp_path / "loto.db"
+    _nueva_en_wal(path)
+    with DBManager(path, profile="reader") as lector:
+        assert lector.fecha_ultimo_resultado("Primitiva", "fecha") == "2026-02-07"
+        with DBManager(path) as escritor:
+            assert escritor.insertar_registros("Primitiva", [{"fecha": "2026-02-11", "n1": 2}])
+        assert lector.fecha_ultimo_resultado("Primitiva", "fecha") == "2026-02-11"
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root escribe aunque el directorio sea de solo lectura")
+def test_lector_en_directorio_de_solo_lectura_falla_al_abrir(tmp_path):
+    carpeta = tmp_path / "ro"
+    carpeta.mkdir()
+    path = carpeta / "loto.db"
+    _nueva_en_wal(path)
+    carpeta.chmod(0o555)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="solo lectura"):
+            with DBManager(path, profile="reader"):
+                pass
+    finally:
+        carpeta.chmod(0o755)
@@ -0,0 +1,42 @@
+import json
+from datetime import date
+
+import numpy as np
+
+from other_utils.meteostat_cache import HourlyMonth
+from other_utils.station_coverage import StationCoverage
+
+WINDOW = (18, 23)
+
+
+def _evening(days):
+    t = np.array([f"2020-03-{d:02d}T19" for d in days], dtype="datetime64[h]")
+    return HourlyMonth(t, np.full(len(days), 10.0), np.full(len(days), 60.0))
+
+
+def test_empty_month_is_not_recorded(tmp_path):
+    cov = StationCoverage(tmp_path / "coverage.json", WINDOW)
+    assert not cov.record("08222", 2020, 3, HourlyMonth.empty())
+    assert not cov.known("08222", 2020, 3)
+    assert cov.covers("08222", date(2020, 3, 5)) is None
+
+
+def test_month_with_data_is_recorded_and_saved(tmp_path):
+    path = tmp_path / "coverage.json"
+    cov = StationCoverage(path, WINDOW)
+    assert cov.record("08222", 2020, 3, _evening([1, 2, 3, 10]))
+    assert cov.save()
+
+    again = StationCoverage.load(path, WINDOW)
+    assert again.covers("08222", date(2020, 3, 2)) is True
+    assert again.covers("08222", date(2020, 3, 5)) is False
+    assert again.ranges("08222") == [(date(2020, 3, 1), date(2020, 3, 3)), (date(2020, 3, 10), date(2020, 3, 10))]
+
+
+def test_index_from_previous_format_is_discarded(tmp_path):
+    path = tmp_path / "coverage.json"
+    path.write_text(json.dumps({
+        "format": 1, "window": list(WINDOW),
+        "stations": {"08222": {"months": ["2020-03"], "ranges": []}},
+    }))
+    assert StationCoverage.load(path, WINDOW).covers("08222", date(2020, 3, 5)) is None
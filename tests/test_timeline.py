@@ -0,0 +1,76 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from db_utils.history_store import HistArraysEuro, HistArraysPrimitiva
+from other_utils.weekly.kernel import ranked_totals
+from other_utils.weekly.timeline import HistoryTimeline
+
+
+def _hist_primitiva(n: int = 150, seed: int = 3) -> HistArraysPrimitiva:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        nums = sorted(rng.choice(np.arange(1, 50), 6, replace=False).tolist())
+        re = None if i % 11 == 0 else int(rng.integers(0, 10))
+        # fechas crecientes separadas 2 o 4 días
+        rows.append((date.fromordinal(731000 + 3 * i + i % 2).isoformat(), *nums, re, 20.0, 50.0, 8.0, 10.0))
+    return HistArraysPrimitiva.from_records(rows)
+
+
+def _hist_euro(n: int = 120, seed: int = 4) -> HistArraysEuro:
+    rng = np.random.default_rng(seed)
+    rows = [
+        (date.fromordinal(732000 + 3 * i).isoformat(),
+         *sorted(rng.choice(np.arange(1, 51), 5, replace=False).tolist()),
+         *sorted(rng.choice(np.arange(1, 13), 2, replace=False).tolist()),
+         20.0, 50.0, 8.0, 10.0)
+        for i in range(n)
+    ]
+    return HistArraysEuro.from_records(rows)
+
+
+def _directo(values: np.ndarray, size: int) -> np.ndarray:
+    flat = values.ravel()
+    return np.bincount(flat[flat >= 0], minlength=size)
+
+
+@pytest.mark.parametrize("hist, columns", [
+    (_hist_primitiva(), ("nums", "re")),
+    (_hist_euro(), ("nums", "stars")),
+])
+def test_recuentos_acumulados_igual_que_contar_el_tramo(hist, columns):
+    tl = HistoryTimeline.build(hist)
+    n = len(hist)
+    for column in columns:
+        values = getattr(hist, column).astype(np.int64)
+        size = tl.counts[column].shape[1]
+        for start, end in [(0, 0), (0, 1), (0, n), (5, 5), (7, 40), (n // 2, n), (n - 1, n)]:
+            assert tl.totals(column, end, start).tolist() == _directo(values[start:end], size).tolist()
+
+
+def test_as_of_igual_que_el_prefijo():
+    hist = _hist_primitiva()
+    tl = HistoryTimeline.build(hist)
+    fechas = hist.fecha.astype(date).tolist()
+    for d in [fechas[0], fechas[1], fechas[60], date.fromordinal(fechas[60].toordinal() + 1), fechas[-1],
+              date(1990, 1, 1), date(2100, 1, 1)]:
+        view = tl.as_of(d)
+        # solo sorteos estrictamente anteriores a d
+        assert view.end == sum(f < d for f in fechas)
+        assert len(view.hist) == view.end
+        assert all(f < d for f in view.hist.fecha.astype(date).tolist())
+
+        for column in ("nums", "re"):
+            values = getattr(hist, column).astype(np.int64)[:view.end]
+            size = tl.counts[column].shape[1]
+            assert view.totals(column).tolist() == _directo(values, size).tolist()
+            # reintegros nulos (-1) fuera
+            assert view.ranked(column) == ranked_totals(values[values >= 0] if column == "re" else values)
+
+
+def test_historico_desordenado():
+    hist = _hist_euro(10)
+    with pytest.raises(ValueError):
+        HistoryTimeline.build(hist.select(np.arange(len(hist))[::-1]))
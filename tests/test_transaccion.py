@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from db_utils.db_management import DBManager
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "loto.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY, n1 INTEGER);
+        CREATE TABLE Euromillones (fecha TEXT PRIMARY KEY, n1 INTEGER);
+        CREATE TRIGGER boom BEFORE INSERT ON Euromillones
+        WHEN NEW.n1 < 0 BEGIN SELECT RAISE(ABORT, 'boom'); END;
+    """)
+    conn.close()
+    return path
+
+
+def _count(path, tabla):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_error_inside_transaccion_rolls_back_every_table(db_path):
+    db = DBManager(db_path)
+    with pytest.raises(sqlite3.Error):
+        with db, db.transaccion():
+            assert db.insertar_registros("Primitiva", [{"fecha": "2026-02-07", "n1": 1}])
+            db.insertar_registros("Euromillones", [{"fecha": "2026-02-06", "n1": -1}])
+    assert _count(db_path, "Primitiva") == 0
+
+
+def test_error_outside_transaccion_returns_false(db_path):
+    db = DBManager(db_path)
+    with db:
+        assert db.insertar_registros("Primitiva", [{"fecha": "2026-02-07", "n1": 1}])
+        assert not db.insertar_registros("Euromillones", [{"fecha": "2026-02-06", "n1": -1}])
+    assert _count(db_path, "Primitiva") == 1
+
+
+def test_schema_creation_does_not_commit_open_transaccion(db_path):
+    db = DBManager(db_path)
+    with pytest.raises(RuntimeError):
+        with db, db.transaccion():
+            db.insertar_registros("Primitiva", [{"fecha": "2026-02-07", "n1": 1}])
+            db.obtener_fechas_pendientes_influencers()  # crea la cola y sus triggers
+            raise RuntimeError
+    assert _count(db_path, "Primitiva") == 0
+
+
+def test_error_in_with_block_keeps_other_managers_transaccion(db_path):
+    outer, inner = DBManager(db_path), DBManager(db_path)
+    with outer.transaccion():
+        outer.insertar_registros("Primitiva", [{"fecha": "2026-02-07", "n1": 1}])
+        with pytest.raises(RuntimeError):
+            with inner:  # misma conexión del pool (mismo hilo y base de datos)
+                raise RuntimeError
+    assert _count(db_path, "Primitiva") == 1
+
+
+def test_error_in_nested_transaccion_of_other_manager_only_undoes_its_writes(db_path):
+    outer, inner = DBManager(db_path), DBManager(db_path)
+    with outer.transaccion():
+        outer.insertar_registros("Primitiva", [{"fecha": "2026-02-07", "n1": 1}])
+        with pytest.raises(sqlite3.Error):
+            with inner.transaccion():
+                inner.insertar_registros("Primitiva", [{"fecha": "2026-02-10", "n1": 2}])
+                inner.insertar_registros("Euromillones", [{"fecha": "2026-02-06", "n1": -1}])
+    assert _count(db_path, "Primitiva") == 1
@@ -0,0 +1,63 @@
+import sqlite3
+
+from db_utils.db_management import DBManager
+
+
+def _traza(db):
+    """Lista que va recogiendo las sentencias que ejecuta la conexión del DBManager."""
+    sentencias = []
+    db.conn.set_trace_callback(sentencias.append)
+    return sentencias
+
+
+def _sin_selects(sentencias):
+    return [s for s in sentencias if not s.lstrip().upper().startswith("SELECT")]
+
+
+def test_acierto_no_escribe(tmp_path):
+    path = tmp_path / "loto.db"
+    with DBManager(path) as db:
+        assert db.guardar_weekly_cache("k", "{}", week_start="2026-02-02", method_version="v1")
+        sentencias = _traza(db)
+        try:
+            assert db.obtener_weekly_cache("k") == "{}"
+            assert db.obtener_weekly_cache("otra") is None
+        finally:
+            db.conn.set_trace_callback(None)
+    assert _sin_selects(sentencias) == []
+
+
+def test_acierto_antiguo_refresca_last_used_at(tmp_path):
+    path = tmp_path / "loto.db"
+    with DBManager(path) as db:
+        assert db.guardar_weekly_cache("k", "{}", week_start="2026-02-02", method_version="v1")
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE WeeklyResultCache SET last_used_at = julianday('now') - 2")
+    conn.commit()
+
+    with DBManager(path) as db:
+        assert db.obtener_weekly_cache("k") == "{}"
+    age = conn.execute("SELECT julianday('now') - last_used_at FROM WeeklyResultCache").fetchone()[0]
+    conn.close()
+    assert age < 1
+
+
+def test_lector_lee_sin_escribir(tmp_path):
+    path = tmp_path / "loto.db"
+    with DBManager(path) as db:
+        assert db.guardar_weekly_cache("k", "{}", week_start="2026-02-02", method_version="v1")
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE WeeklyResultCache SET last_used_at = julianday('now') - 2")
+    conn.commit()
+    conn.close()
+
+    with DBManager(path, profile="reader") as db:
+        assert db.obtener_weekly_cache("k") == "{}"
+        assert not db.guardar_weekly_cache("k2", "{}", week_start=None, method_version="v1")
+
+
+def test_lector_sin_tabla(tmp_path):
+    path = tmp_path / "loto.db"
+    sqlite3.connect(path).execute("CREATE TABLE Primitiva (fecha TEXT PRIMARY KEY)").connection.close()
+    with DBManager(path, profile="reader") as db:
+        assert db.obtener_weekly_cache("k") is None
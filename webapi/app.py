@@ -55,7 +55,7 @@ def health():
 @app.get("/weekly", response_model=WeeklyResponseV1)
 def weekly() -> WeeklyResponseV1:
     today = _today()
-    with DBManager(DBFILE) as db:
+    with DBManager(DBFILE, profile="reader") as db:
         result = generate_weekly(db=db, today=today)
     return _weekly_to_v1(result)
 
@@ -63,7 +63,7 @@ def weekly() -> WeeklyResponseV1:
 @app.get("/weekly.txt")
 def weekly_txt():
     today = _today()
-    with DBManager(DBFILE) as db:
+    with DBManager(DBFILE, profile="reader") as db:
         result = generate_weekly(db=db, today=today)
     txt = format_weekly(result)
     return PlainTextResponse(content=txt, media_type="text/plain; charset=utf-8")
\ No newline at end of file